@@ -0,0 +1,200 @@
+"""Vendored buku DB operations on generated bookmark DBs."""
+import json
+import sqlite3
+
+import pytest
+
+from vimania_uri.buku import BukuDb, import_firefox_json_file, import_html_file
+
+
+def test_searchdb_any(benchmark, bukudb):
+    result = benchmark(bukudb.searchdb, ["python", "article"])
+    assert result
+
+
+def test_searchdb_selective(benchmark, bukudb):
+    assert benchmark(bukudb.searchdb, ["host42", "bookmark 4242"])
+
+
+def test_searchdb_all(benchmark, bukudb):
+    result = benchmark(bukudb.searchdb, ["python", "host7"], all_keywords=True)
+    assert result
+
+
+def test_searchdb_deep(benchmark, bukudb):
+    result = benchmark(bukudb.searchdb, ["host4"], deep=True)
+    assert result
+
+
+def test_searchdb_regex(benchmark, bukudb):
+    result = benchmark(bukudb.searchdb, [r"host1\d\.example"], regex=True)
+    assert result
+
+
+@pytest.fixture
+def fts(bukudb):
+    assert bukudb.enable_fts()
+    yield bukudb
+    bukudb.disable_fts()
+
+
+def test_searchdb_fts_any(benchmark, fts):
+    assert benchmark(fts.searchdb, ["python", "article"])
+
+
+def test_searchdb_fts_selective(benchmark, fts):
+    assert benchmark(fts.searchdb, ["host42", "bookmark 4242"])
+
+
+def test_searchdb_fts_all(benchmark, fts):
+    assert benchmark(fts.searchdb, ["python", "host7"], all_keywords=True)
+
+
+def test_searchdb_fts_deep(benchmark, fts):
+    assert benchmark(fts.searchdb, ["host4"], deep=True)
+
+
+def test_searchdb_fts_rank(benchmark, fts):
+    assert benchmark(fts.searchdb, ["host42", "bookmark 4242"], rank=True)
+
+
+def test_search_by_tag_any(benchmark, bukudb):
+    assert benchmark(bukudb.search_by_tag, "vim, rust")
+
+
+def test_search_by_tag_all(benchmark, bukudb):
+    assert benchmark(bukudb.search_by_tag, "vim + rust")
+
+
+def test_search_by_tag_selective(benchmark, bukudb):
+    assert benchmark(bukudb.search_by_tag, "t42, t43 - vim")
+
+
+def test_get_tag_all(benchmark, bukudb):
+    tags, _ = benchmark(bukudb.get_tag_all)
+    assert len(tags) == 1008
+
+
+@pytest.fixture
+def tag_index(bukudb):
+    assert bukudb.enable_tag_index()
+    yield bukudb
+    bukudb.disable_tag_index()
+
+
+def test_search_by_tag_index_any(benchmark, tag_index):
+    assert benchmark(tag_index.search_by_tag, "vim, rust")
+
+
+def test_search_by_tag_index_all(benchmark, tag_index):
+    assert benchmark(tag_index.search_by_tag, "vim + rust")
+
+
+def test_search_by_tag_index_selective(benchmark, tag_index):
+    assert benchmark(tag_index.search_by_tag, "t42, t43 - vim")
+
+
+def test_get_tag_all_index(benchmark, tag_index):
+    tags, _ = benchmark(tag_index.get_tag_all)
+    assert len(tags) == 1008
+
+
+def test_add_rec(benchmark, bukudb, tmp_path_factory):
+    """One committed insert per round, on a fresh copy: bukudb keeps its size"""
+    copies = []
+
+    def setup():
+        path = str(tmp_path_factory.mktemp("add") / "bookmarks.db")
+        target = sqlite3.connect(path)
+        bukudb.conn.backup(target)
+        target.close()
+        copies.append(BukuDb(dbfile=path))
+        return (copies[-1],), {}
+
+    def add(bdb):
+        assert bdb.add_rec("https://bench.example.com/new", tags_in=",vimania,", fetch=False) != -1
+
+    benchmark.pedantic(add, setup=setup, rounds=20)
+    for bdb in copies:
+        bdb.close()
+    assert bukudb.get_rec_id("https://bench.example.com/new") == -1
+
+
+def test_replace_tag(benchmark, bukudb):
+    # rename a tag on ~3/8 of the bookmarks, and back
+    def rename():
+        assert bukudb.replace_tag("vim", ["editor"])
+        assert bukudb.replace_tag("editor", ["vim"])
+
+    benchmark(rename)
+
+
+def test_import_items(benchmark, tmp_path_factory):
+    """10k browser export items, a tenth of them duplicates with tags to merge"""
+    items = [
+        (f"https://import.example.com/{i % 9000}", f"t{i}", f",folder{i % 50},", None, 0)
+        for i in range(10_000)
+    ]
+
+    def setup():
+        dbfile = str(tmp_path_factory.mktemp("import") / "bookmarks.db")
+        return (BukuDb(dbfile=dbfile),), {}
+
+    def run(bdb):
+        assert bdb.import_items(items) == 9000
+        bdb.close()
+
+    benchmark.pedantic(run, setup=setup, rounds=3)
+
+
+@pytest.fixture(scope="module")
+def bookmarks_html(tmp_path_factory):
+    """Netscape bookmark export with 20k bookmarks in 200 folders"""
+    lines = ["<!DOCTYPE NETSCAPE-Bookmark-file-1>", "<DL><p>"]
+    for f in range(200):
+        lines += [f"<DT><H3>folder{f}</H3>", "<DL><p>"]
+        for i in range(100):
+            lines.append(f'<DT><A HREF="https://f{f}.example.com/{i}" TAGS="a,b">T {i}</A>')
+            lines.append(f"<DD>description {i}")
+        lines.append("</DL><p>")
+    lines.append("</DL><p>")
+    path = tmp_path_factory.mktemp("html") / "bookmarks.html"
+    path.write_text("\n".join(lines), encoding="utf-8")
+    return str(path)
+
+
+def test_import_html_file(benchmark, bookmarks_html):
+    items = benchmark(lambda: list(import_html_file(bookmarks_html, True, None)))
+    assert len(items) == 20_000
+
+
+@pytest.fixture(scope="module")
+def bookmarks_json(tmp_path_factory):
+    """Firefox backup with 20k bookmarks in 200 folders"""
+    folders = [
+        {
+            "title": f"folder{f}",
+            "typeCode": 2,
+            "children": [
+                {"title": f"t{i}", "typeCode": 1, "uri": f"https://f{f}.example.com/{i}"}
+                for i in range(100)
+            ],
+        }
+        for f in range(200)
+    ]
+    path = tmp_path_factory.mktemp("json") / "bookmarks.json"
+    path.write_text(json.dumps({"typeCode": 2, "children": folders}), encoding="utf-8")
+    return str(path)
+
+
+def test_import_firefox_json_file(benchmark, bookmarks_json):
+    items = benchmark(lambda: list(import_firefox_json_file(bookmarks_json, True)))
+    assert len(items) == 20_000
+
+
+@pytest.mark.parametrize("suffix", [".html", ".db"])
+def test_exportdb(benchmark, bukudb, tmp_path_factory, suffix):
+    def setup():
+        return (str(tmp_path_factory.mktemp("export") / ("bookmarks" + suffix)),), {}
+
+    benchmark.pedantic(bukudb.exportdb, setup=setup, rounds=3)
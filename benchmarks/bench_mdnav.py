@@ -0,0 +1,78 @@
+"""Cursor-to-action path: everything vimania runs when `go` is pressed."""
+import pytest
+
+from vimania_uri.md import mdnav
+from vimania_uri.md.link_index import LinkIndex
+from vimania_uri.md.mdnav import JumpToAnchor, check_path, has_scheme, open_uri, parse_uri
+from vimania_uri.md.tokenizer import tokenize
+
+TARGETS = [
+    "https://example.com/page/1?q=1",
+    "notes/file1.md",
+    "./file3.md#section-3",
+    "|filename|./doc5.pdf:12",
+    "$HOME/dir/2.txt",
+    "#heading-6",
+]
+
+
+def cursor_on_reference(corpus):
+    """Cursor on `[ref 1][label1]`, defined at the end: worst case for the scan"""
+    row = 1
+    return row, corpus[row].find("[ref ") + 1
+
+
+def test_parse_line_direct(benchmark, corpus):
+    row = 1  # "text [link 1](notes/file1.md) ..."
+    col = corpus[row].find("[link") + 2
+
+    def run():
+        tokenize.cache_clear()  # cursor moved to a fresh line
+        return mdnav.parse_line((row, col), corpus)
+
+    assert benchmark(run) == "notes/file1.md"
+
+
+def test_parse_line_indirect_scan(benchmark, corpus):
+    cursor = cursor_on_reference(corpus)
+    assert benchmark(mdnav.parse_line, cursor, corpus) == "https://example.com/ref/1"
+
+
+def test_parse_line_indirect_index(benchmark, corpus):
+    cursor = cursor_on_reference(corpus)
+    index = LinkIndex(corpus)
+    assert benchmark(mdnav.parse_line, cursor, corpus, index) == "https://example.com/ref/1"
+
+
+def test_link_index_build(benchmark, corpus):
+    index = benchmark(LinkIndex, corpus)
+    assert len(index) == len(corpus)
+
+
+def test_find_anchor(benchmark, corpus):
+    # last heading of the document, the table is built on every call
+    row = max(i for i, line in enumerate(corpus) if line.startswith("# "))
+    target = "#" + corpus[row][2:].lower().replace(" ", "-")
+    assert benchmark(JumpToAnchor.find_anchor, target, corpus) == row
+
+
+@pytest.mark.parametrize("target", TARGETS)
+def test_parse_uri(benchmark, target):
+    benchmark(parse_uri, target)
+
+
+@pytest.mark.parametrize("target", TARGETS)
+def test_has_scheme(benchmark, target):
+    benchmark(has_scheme, target)
+
+
+@pytest.mark.parametrize("target", TARGETS)
+def test_open_uri(benchmark, target):
+    # builds the action only, nothing is opened
+    benchmark(open_uri, target, open_in_vim_extensions={".md", ".txt"})
+
+
+def test_check_path(benchmark):
+    line = "see https://example.com/page/2?q=2 and $HOME/dir/2.txt"
+    pos = line.find("$HOME") + 3
+    assert benchmark(check_path, line, pos) == ("$HOME/dir/2.txt", 3)
@@ -0,0 +1,67 @@
+import logging
+import random
+import sqlite3
+
+import pytest
+
+from vimania_uri.buku import BukuDb
+
+# the hot paths log on debug level, measure them as in normal operation
+logging.getLogger("vimania-uri").setLevel(logging.WARNING)
+logging.getLogger("buku").setLevel(logging.WARNING)
+
+CORPUS_SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+DB_SIZES = {"10k": 10_000, "100k": 100_000}
+TAGS = ["python", "vim", "markdown", "sqlite", "linux", "rust", "web", "notes"]
+
+
+def make_corpus(n: int) -> list:
+    """Markdown with a link on almost every line, reference definitions at the end"""
+    templates = [
+        "# Heading {i}",
+        "text [link {i}](notes/file{i}.md) more text [ref {i}][label{i}] end",
+        "see https://example.com/page/{i}?q={i} and $HOME/dir/{i}.txt",
+        "- [ ] todo [local](./file{i}.md#section-{i}) and [implicit{i}][]",
+        "plain prose line {i} without any link at all, just words",
+        "{{: #custom-id-{i} }} [pdf](|filename|./doc{i}.pdf:12)",
+    ]
+    lines = [templates[i % len(templates)].format(i=i) for i in range(n)]
+    defs = n // 20
+    lines[n - defs :] = [
+        f"[label{i}]: https://example.com/ref/{i}" for i in range(defs)
+    ]
+    return lines
+
+
+@pytest.fixture(scope="module", params=list(CORPUS_SIZES), ids=list(CORPUS_SIZES))
+def corpus(request):
+    return make_corpus(CORPUS_SIZES[request.param])
+
+
+@pytest.fixture(scope="module", params=list(DB_SIZES), ids=list(DB_SIZES))
+def bukudb(request, tmp_path_factory):
+    """BukuDb with generated bookmarks, bulk loaded with one executemany"""
+    n = DB_SIZES[request.param]
+    dbfile = str(tmp_path_factory.mktemp("buku") / f"bookmarks_{request.param}.db")
+    BukuDb.initdb(dbfile)[0].close()
+
+    rnd = random.Random(n)
+    conn = sqlite3.connect(dbfile)
+    conn.executemany(
+        "INSERT INTO bookmarks(URL, metadata, tags, desc, flags) VALUES (?, ?, ?, ?, 0)",
+        (
+            (
+                f"https://host{i % 500}.example.com/path/{i}",
+                f"title {i} {rnd.choice(TAGS)} article",
+                "," + ",".join(sorted(rnd.sample(TAGS, 3) + [f"t{i % 1000}"])) + ",",
+                f"description of bookmark {i}",
+            )
+            for i in range(n)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+    bdb = BukuDb(dbfile=dbfile)
+    yield bdb
+    bdb.close()
@@ -4,6 +4,7 @@ import os
 import sys
 from pprint import pprint
 
+from vimania_uri.environment import config
 from vimania_uri.vim_.vimania_manager import VimaniaUriManager
 
 try:
@@ -65,7 +66,10 @@ if int(vim.eval("exists('g:vimania_uri_twbm_integration')")):
 else:
     twbm_integrated = False
 
-_log.debug(f"{extensions=}, {twbm_integrated=}")
+if int(vim.eval("exists('g:vimania_uri_notes_root')")):
+    config.vimania_notes_root = vim.eval("g:vimania_uri_notes_root")
+
+_log.debug(f"{extensions=}, {twbm_integrated=}, {config.vimania_notes_root=}")
 
 xUriMgr = VimaniaUriManager(
     plugin_root_dir=plugin_root_dir,
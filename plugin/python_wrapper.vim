@@ -35,6 +35,15 @@ function! GetURLTitle(url)
 endfunction
 command! -nargs=1 GetURLTitle call GetURLTitle(<f-args>)
 
+" sets g:vimania_url_title to a known title or the URL, the title is patched in later
+function! GetURLTitleAsync(url)
+  python3 xUriMgr.get_url_title_async(vim.eval('a:url'))
+endfunction
+
+function! VimaniaUrlTitlePoll(timer)
+  python3 xUriMgr.poll_url_title(vim.eval('a:timer'))
+endfunction
+
 " DEPRECATED
 function! VimaniaEdit(args)
   call TwDebug(printf("Vimania args: %s", a:args))
@@ -64,5 +73,26 @@ endfunction
 command! -nargs=1 VimaniaDeleteTwbm call VimaniaDeleteTwbm(<f-args>)
 "noremap Q :VimaniaDeleteTodo - [ ] todo vimania<CR>
 
+function! VimaniaTwbmPoll(timer)
+  python3 xUriMgr.poll_twbm(vim.eval('a:timer'))
+endfunction
+
+function! VimaniaTwbmFlush()
+  python3 xUriMgr.flush_twbm()
+endfunction
+
+function! VimaniaBacklinks()
+  python3 xUriMgr.backlinks()
+endfunction
+command! -nargs=0 VimaniaBacklinks call VimaniaBacklinks()
+
+function! VimaniaLinkIndexListener(bufnr, start, end, added, changes)
+  python3 xUriMgr.update_link_index(int(vim.eval('a:bufnr')), int(vim.eval('a:start')), int(vim.eval('a:end')), int(vim.eval('a:added')))
+endfunction
+
+function! VimaniaLinkIndexDrop(bufnr)
+  python3 xUriMgr.drop_link_index(int(vim.eval('a:bufnr')))
+endfunction
+
 TwDebug "elapsed time:" . reltimestr(reltime(start_time))
 let g:vimania_uri_wrapper = 1
@@ -25,11 +25,15 @@ endif
 
 augroup Vimania-Uri
  autocmd!
-" removes URL (pattern) from twbm
+" removes URL (pattern) from twbm, all URLs of the deleted lines in one batch
  autocmd TextYankPost *.md
-    \ if len(v:event['regcontents']) == 1 && v:event['regcontents'][0] =~? 'http[s]\=://' && v:event['operator'] == 'd' && ! v:event['visual']
-    \ | call VimaniaDeleteTwbm(v:event['regcontents'][0])
+    \ if v:event['operator'] == 'd' && join(v:event['regcontents'], "\n") =~? 'http[s]\=://'
+    \ | call VimaniaDeleteTwbm(join(v:event['regcontents'], "\n"))
     \ | endif
+" persist bookmarks still queued by goo
+ autocmd VimLeavePre * call VimaniaTwbmFlush()
+" forget link index of wiped buffers
+ autocmd BufWipeout * call VimaniaLinkIndexDrop(str2nr(expand('<abuf>')))
 augroup END
 
 
@@ -46,7 +50,12 @@ function s:PasteMDLink()
     let url = getreg("+")
     "let title = GetURLTitle(url)
     echo(url)
-    call GetURLTitle(url)
+    if has('timers')
+        " insert at once, the title replaces the URL when it arrives
+        call GetURLTitleAsync(url)
+    else
+        call GetURLTitle(url)
+    endif
     "let mdLink = printf("[%s](%s)", title, url)
     let mdLink = printf("[%s](%s)", g:vimania_url_title, url)
     execute "normal! a" . mdLink . "\<Esc>"
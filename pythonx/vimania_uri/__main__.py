@@ -0,0 +1,3 @@
+from vimania_uri.cli import app
+
+app(prog_name="vimania-uri")
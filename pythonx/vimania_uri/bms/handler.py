@@ -1,60 +1,262 @@
+import atexit
+import collections
 import logging
-import re
-from typing import Tuple, Sequence
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Sequence, Tuple
 
-from vimania_uri.buku import BukuDb
+from vimania_uri.buku import SQL_MAX_PARAMS, BukuDb, network_handler
 from vimania_uri.environment import config
 from vimania_uri.exception import VimaniaException
 from vimania_uri.pattern import URL_PATTERN
 
 _log = logging.getLogger("vimania-uri.bms")
 
+TWBM_QUEUE_SIZE = 64
+TWBM_QUEUE_TIMEOUT = 0.5  # seconds to wait for a free slot before saving synchronously
 
-def add_twbm(url: str) -> int:
-    id_ = BukuDb(dbfile=config.dbfile_twbm).add_rec(
-        url=url,
-        # title_in=title,
-        tags_in=",vimania,",
-        # desc=desc,
-        # immutable=0,
-        delay_commit=False,
-        # fetch=(not nofetch),
-    )
-    if id_ == -1:
-        # raise SystemError(f"Error adding {url=} to DB {config.dbfile_twbm}")
-        _log.error(
-            f"Error adding {url=} to DB {config.dbfile_twbm}"
-        )  # TODO: buku.py error handling
-    else:
-        _log.debug(f"Added twbm: {id_=} - {url} to DB {config.dbfile_twbm}")
-    return id_
 
+class TwbmPool:
+    """Long-lived, lazily opened twbm connection shared by all handler calls.
 
-def delete_twbm(line: str) -> Sequence[Tuple[int, str]]:
-    """Delete bookmarks, managed by vimania (tag: vimania)"""
-    # match = URL_PATTERN.match(line)
-    urls = []
-    matches = re.finditer(URL_PATTERN, line)
-    for match in matches:
-        url = match.group()
-        id_ = BukuDb(dbfile=config.dbfile_twbm).get_rec_id(url=url)  # exact match, error resilient
+    Opening a BukuDb runs makedirs/exists checks, connects and executes the schema
+    DDL. The pool does this once and reuses the connection until the configured
+    DB file changes (other path, or file replaced/removed on disk).
+    BukuDb shares a single cursor, so access is serialized with a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._bdb: Optional[BukuDb] = None
+        self._key: Optional[Tuple[str, int, int]] = None
+
+    @staticmethod
+    def _file_key(dbfile: Optional[str]) -> Optional[Tuple[str, int, int]]:
+        if not dbfile:
+            dbfile = os.path.join(BukuDb.get_default_dbdir(), "bookmarks.db")
+        path = os.path.abspath(dbfile)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return path, st.st_dev, st.st_ino
+
+    def _get(self) -> BukuDb:
+        dbfile = config.dbfile_twbm
+        key = self._file_key(dbfile)
+        if self._bdb is not None and key is not None and key == self._key:
+            return self._bdb
+
+        if self._bdb is not None:
+            _log.debug(f"twbm DB changed: {self._key} -> {key}, reconnecting")
+            self._bdb.close()
+        self._bdb = BukuDb(dbfile=dbfile, tuned=config.twbm_db_tuned)
+        self._key = self._file_key(dbfile)
+        _log.debug(f"Opened twbm DB {dbfile}")
+        return self._bdb
+
+    @contextmanager
+    def session(self) -> Iterator[BukuDb]:
+        """Exclusive access to the pooled BukuDb."""
+        with self._lock:
+            yield self._get()
+
+    def close(self):
+        with self._lock:
+            if self._bdb is not None:
+                self._bdb.close()
+            self._bdb = None
+            self._key = None
+
+
+pool = TwbmPool()
+atexit.register(pool.close)
+
+
+class TwbmWriter:
+    """Background writer for bookmarks saved via `goo`.
+
+    `submit` returns immediately so the browser opens without waiting for the DB
+    or the network. The writer thread persists each URL without fetching and
+    hands it to the fetcher thread, which fetches title/description and updates
+    the record found by URL. Persisting never waits behind a fetch, so `flush`
+    only waits for DB writes.
+    Vim must not be touched from the worker threads: results are collected in
+    `messages` and picked up by a Vim timer (see VimaniaUriManager.poll_twbm).
+    """
+
+    def __init__(self, maxsize: int = TWBM_QUEUE_SIZE):
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._fetch_queue: queue.Queue = queue.Queue()
+        self._cond = threading.Condition()
+        self._unpersisted = 0
+        self._skip_fetch = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.messages: collections.deque = collections.deque()
+
+    @property
+    def idle(self) -> bool:
+        return self._queue.unfinished_tasks == 0 and self._fetch_queue.unfinished_tasks == 0
+
+    def submit(self, url: str) -> None:
+        self._ensure_started()
+        with self._cond:
+            self._unpersisted += 1
+        try:
+            self._queue.put(url, timeout=TWBM_QUEUE_TIMEOUT)
+        except queue.Full:
+            _log.warning(f"twbm queue full, saving {url} synchronously without fetch")
+            try:
+                self._persist(url)
+            finally:
+                self._persisted()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Persist all queued bookmarks, skipping pending metadata fetches.
+
+        Returns False if the timeout expired before everything was persisted.
+        """
+        self._skip_fetch.set()
+        with self._cond:
+            done = self._cond.wait_for(lambda: self._unpersisted == 0, timeout)
+        if not done:
+            _log.error(f"twbm flush timed out, {self._unpersisted} bookmark(s) pending")
+        return done
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Wait until all submitted bookmarks are persisted and fetched."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        # persisted URLs are queued for fetching before their task is done
+        for q in (self._queue, self._fetch_queue):
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            with q.all_tasks_done:
+                if not q.all_tasks_done.wait_for(lambda: q.unfinished_tasks == 0, remaining):
+                    return False
+        return True
+
+    def _ensure_started(self):
+        if not self._threads or not all(t.is_alive() for t in self._threads):
+            self._threads = [
+                threading.Thread(target=target, name=name, daemon=True)
+                for target, name in ((self._run, "twbm-writer"), (self._run_fetch, "twbm-fetcher"))
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def _persisted(self):
+        with self._cond:
+            self._unpersisted -= 1
+            self._cond.notify_all()
+
+    def _persist(self, url: str) -> int:
+        with pool.session() as bdb, bdb.transaction():
+            id_ = bdb.add_rec(
+                url=url, tags_in=",vimania,", delay_commit=True, fetch=False
+            )
         if id_ == -1:
-            _log.info(f"{url} not in DB {config.dbfile_twbm=}")
+            self.messages.append(f"twbm not added (exists or error): {url}")
         else:
-            # (1, 'http://example.com', 'example title', ',tags1,', 'randomdesc', 0))
-            bm_var = BukuDb(dbfile=config.dbfile_twbm).get_rec_by_id(id_)
-
-            if "vimania" in bm_var[3]:
-                _log.debug(f"Deleting twbm: {url}")
-                if not BukuDb(dbfile=config.dbfile_twbm).delete_rec(
-                    index=id_, delay_commit=False
-                ):
+            _log.debug(f"Added twbm: {id_=} - {url} to DB {config.dbfile_twbm}")
+            self.messages.append(f"twbm added: {id_} {url}")
+        return id_
+
+    def _fetch(self, url: str):
+        title, desc, _, mime, bad = network_handler(url)
+        if bad or mime or not (title or desc):
+            return
+        # by URL: the record may have been deleted or its id compacted meanwhile
+        with pool.session() as bdb, bdb.transaction():
+            id_ = bdb.get_rec_id(url)
+            if id_ != -1:
+                bdb.update_rec(id_, title_in=title or None, desc=desc or None)
+        if id_ == -1:
+            _log.debug(f"twbm {url} deleted before its title was fetched")
+            return
+        self.messages.append(f"twbm title: {id_} {title}")
+
+    def _run(self):
+        while True:
+            url = self._queue.get()
+            try:
+                if self._persist(url) != -1:
+                    self._fetch_queue.put(url)
+            except Exception as e:
+                _log.error(f"Error adding {url=} to DB {config.dbfile_twbm}: {e}")
+                self.messages.append(f"twbm error: {url}: {e}")
+            finally:
+                self._persisted()
+                self._queue.task_done()
+
+    def _run_fetch(self):
+        while True:
+            url = self._fetch_queue.get()
+            try:
+                if not self._skip_fetch.is_set():
+                    self._fetch(url)
+            except Exception as e:
+                _log.error(f"Error fetching metadata for {url=}: {e}")
+            finally:
+                self._fetch_queue.task_done()
+
+
+writer = TwbmWriter()
+
+
+def enqueue_twbm(url: str) -> None:
+    """Save bookmark in the background, see TwbmWriter."""
+    writer.submit(url)
+
+
+def delete_twbms(urls: Sequence[str]) -> List[Tuple[int, str]]:
+    """Delete bookmarks managed by vimania (tag: vimania) in one transaction.
+
+    All URLs are resolved with one `WHERE URL IN (...)` query per chunk and
+    deleted with a single commit.
+    Returns the outcome per URL found in DB, in input order.
+    """
+    urls = list(dict.fromkeys(urls))  # dedupe, keep order
+    if not urls:
+        return []
+
+    with pool.session() as bdb:
+        found = {}
+        for i in range(0, len(urls), SQL_MAX_PARAMS):
+            chunk = urls[i : i + SQL_MAX_PARAMS]
+            qry = "SELECT id, URL, tags FROM bookmarks WHERE URL IN ({})".format(
+                ",".join("?" * len(chunk))
+            )
+            bdb.cur.execute(qry, chunk)
+            found.update({url: (id_, tags) for id_, url, tags in bdb.cur.fetchall()})
+
+        to_delete = sorted(
+            (id_ for id_, tags in found.values() if "vimania" in tags), reverse=True
+        )
+        with bdb.transaction():
+            # descending order: compaction never moves a record which is still to be deleted
+            for id_ in to_delete:
+                if not bdb.delete_rec(index=id_, delay_commit=True):
                     raise VimaniaException(
-                        f"Cannot delete {url=} from: {config.dbfile_twbm}"
+                        f"Cannot delete {id_=} from: {config.dbfile_twbm}"
                     )
-            else:
-                _log.debug(f"{url=} not managed by vimania, no deletion.")
-                url = f"{url} not managed by vimania, no deletion."
-            urls.append((id_, url))
 
-    return urls
+    result = []
+    for url in urls:
+        if url not in found:
+            _log.info(f"{url} not in DB {config.dbfile_twbm=}")
+            continue
+        id_, tags = found[url]
+        if "vimania" in tags:
+            _log.debug(f"Deleted twbm: {url}")
+            result.append((id_, url))
+        else:
+            _log.debug(f"{url=} not managed by vimania, no deletion.")
+            result.append((id_, f"{url} not managed by vimania, no deletion."))
+    return result
+
+
+def delete_twbm(line: str) -> Sequence[Tuple[int, str]]:
+    """Delete bookmarks, managed by vimania (tag: vimania)"""
+    return delete_twbms([match.group() for match in URL_PATTERN.finditer(line)])
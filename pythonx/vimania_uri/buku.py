@@ -18,16 +18,19 @@
 # along with buku.  If not, see <http://www.gnu.org/licenses/>.
 
 import argparse
+import atexit
 import calendar
-import cgi
 import codecs
 import collections
 import contextlib
+import functools
+import io
 import json
 import locale
 import logging
 import os
 import platform
+import queue
 import re
 import shutil
 import signal
@@ -42,12 +45,12 @@ import time
 import unicodedata
 import webbrowser
 from enum import Enum
-from itertools import chain
+from html.parser import HTMLParser
+from itertools import chain, islice
 from subprocess import DEVNULL, PIPE, Popen
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 import urllib3
-from bs4 import BeautifulSoup
 from urllib3.exceptions import LocationParseError
 from urllib3.util import Retry, make_headers, parse_url
 
@@ -133,6 +136,39 @@ MYHEADERS = None  # Default dictionary of headers
 MYPROXY = None  # Default proxy
 TEXT_BROWSERS = ["elinks", "links", "links2", "lynx", "w3m", "www-browser"]
 IGNORE_FF_BOOKMARK_FOLDERS = frozenset(["placesRoot", "bookmarksMenuFolder"])
+REGEXP_CACHE_SIZE = 256  # compiled patterns of the SQLite REGEXP function
+REFRESH_HOST_CONNECTIONS = 2  # requests in flight per host during refreshdb
+REFRESH_BATCH_SIZE = 32  # records per commit during refreshdb
+POOL_NUM_POOLS = 16  # hosts with kept-alive connections in the shared pool
+POOL_MAXSIZE = REFRESH_HOST_CONNECTIONS  # kept-alive connections per host
+METADATA_CACHE_TTL = 24 * 3600  # seconds a cached page is used without revalidation
+METADATA_CACHE_SIZE = 20000  # pages kept in the metadata cache
+METADATA_CACHE_EVICT_EVERY = 64  # stores between two evictions
+IMPORT_BATCH_SIZE = 10000  # imported bookmarks per executemany
+DB_BUSY_TIMEOUT = 5000  # ms a tuned connection waits for a lock
+DB_BUSY_RETRIES = 3  # retries of a DB setup or write lock failing with SQLITE_BUSY
+DB_BUSY_BACKOFF = 0.1  # seconds before the first retry, doubled per retry
+DB_MMAP_SIZE = 64 * 1024 * 1024  # bytes of the DB file read via mmap when tuned
+IMPORT_READ_SIZE = 64 * 1024  # characters per read of an imported file
+EXPORT_BATCH_SIZE = 10000  # records fetched per read during export
+HTML_VOID_ELEMENTS = frozenset(  # elements without content, as in BeautifulSoup
+    "area base basefont bgsound br col command embed frame hr image img input "
+    "isindex keygen link menuitem meta nextid param source spacer track wbr".split()
+)
+PAGE_CHUNK_SIZE = 16 * 1024  # bytes per read of a page
+PAGE_HEAD_LIMIT = 256 * 1024  # bytes read at most to find the end of <head>
+PAGE_DRAIN_LIMIT = 64 * 1024  # unread bytes drained to keep a connection alive
+PAGE_DESCRIPTION_METAS = [  # <meta> attributes holding a description, by priority
+    (attr, value)
+    for prefix in ("", "og:")
+    for attr in ("name", "property")
+    for value in (prefix + "description", prefix + "Description")
+]
+CHARSET_RE = re.compile(rb"""charset\s*=\s*["']?\s*([-\w.:]+)""", re.I)
+META_CHARSET_RE = re.compile(rb"""<meta\s+charset\s*=\s*["']?\s*([-\w.:]+)""", re.I)
+HTTP_EQUIV_CHARSET_RE = re.compile(
+    rb"""<meta\s[^>]*charset\s*=\s*["']?\s*([-\w.:]+)""", re.I
+)
 
 # Set up logging
 LOGGER = logging.getLogger()
@@ -180,6 +216,132 @@ BEGIN
 END;
 """
 
+# Optional full-text index, see BukuDb.enable_fts().
+# The trigram tokenizer indexes substrings: a MATCH narrows the candidate rows,
+# the exact search predicates are then evaluated on those rows only.
+create_fts_sql = """
+CREATE VIRTUAL TABLE IF NOT EXISTS bookmarks_fts USING fts5(
+    URL, metadata, tags, desc,
+    content='bookmarks', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS bookmarks_fts_ai AFTER INSERT ON bookmarks BEGIN
+    INSERT INTO bookmarks_fts(rowid, URL, metadata, tags, desc)
+    VALUES (new.id, new.URL, new.metadata, new.tags, new.desc);
+END;
+CREATE TRIGGER IF NOT EXISTS bookmarks_fts_ad AFTER DELETE ON bookmarks BEGIN
+    INSERT INTO bookmarks_fts(bookmarks_fts, rowid, URL, metadata, tags, desc)
+    VALUES ('delete', old.id, old.URL, old.metadata, old.tags, old.desc);
+END;
+CREATE TRIGGER IF NOT EXISTS bookmarks_fts_au AFTER UPDATE OF id, URL, metadata, tags, desc ON bookmarks BEGIN
+    INSERT INTO bookmarks_fts(bookmarks_fts, rowid, URL, metadata, tags, desc)
+    VALUES ('delete', old.id, old.URL, old.metadata, old.tags, old.desc);
+    INSERT INTO bookmarks_fts(rowid, URL, metadata, tags, desc)
+    VALUES (new.id, new.URL, new.metadata, new.tags, new.desc);
+END;
+INSERT INTO bookmarks_fts(bookmarks_fts) VALUES ('rebuild');
+"""
+
+drop_fts_sql = """
+DROP TRIGGER IF EXISTS bookmarks_fts_ai;
+DROP TRIGGER IF EXISTS bookmarks_fts_ad;
+DROP TRIGGER IF EXISTS bookmarks_fts_au;
+DROP TABLE IF EXISTS bookmarks_fts;
+"""
+
+FTS_MIN_TOKEN_LEN = 3  # trigram tokenizer: shorter phrases match nothing
+SQL_MAX_PARAMS = 500  # stay below SQLITE_MAX_VARIABLE_NUMBER of old sqlite builds
+
+
+def tags_json_sql(column: str) -> str:
+    """SQL expression converting a ,tag1,tag2, string into a JSON array of tags.
+
+    Plain SQL (no user function), so the tag index triggers also work for
+    other clients writing to the DB. json_quote() escapes the tags, the
+    delimiters are then turned into string boundaries. Empty tags are left
+    to the caller to filter.
+    """
+
+    return "'[' || replace(json_quote(trim(%s, '%s')), '%s', '\",\"') || ']'" % (
+        column,
+        DELIM,
+        DELIM,
+    )
+
+
+# Optional normalized tags, see BukuDb.enable_tag_index().
+# bookmarks.tags stays the primary data, triggers keep the tables consistent.
+# No OR IGNORE in the triggers: the conflict clause of the statement firing a
+# trigger (e.g. the UPSERT of import_items) overrides the one in its body.
+_tag_index_insert_sql = """
+    INSERT INTO tags(name)
+    SELECT DISTINCT value FROM json_each({tags})
+    WHERE value != '' AND value NOT IN (SELECT name FROM tags);
+    INSERT INTO bookmark_tags(bookmark_id, tag_id)
+    SELECT DISTINCT {id}, tags.id
+    FROM json_each({tags}) JOIN tags ON tags.name = json_each.value
+    WHERE NOT EXISTS (
+        SELECT 1 FROM bookmark_tags bt
+        WHERE bt.bookmark_id = {id} AND bt.tag_id = tags.id
+    );
+"""
+_tag_index_delete_sql = """
+    DELETE FROM bookmark_tags WHERE bookmark_id = old.id;
+    DELETE FROM tags WHERE name IN (SELECT value FROM json_each({tags}))
+    AND NOT EXISTS (SELECT 1 FROM bookmark_tags WHERE tag_id = tags.id);
+"""
+create_tag_index_sql = (
+    """
+CREATE TABLE IF NOT EXISTS tags (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE INDEX IF NOT EXISTS tags_name_nocase_idx ON tags(name COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS bookmark_tags (
+    bookmark_id INTEGER NOT NULL,
+    tag_id INTEGER NOT NULL,
+    PRIMARY KEY (tag_id, bookmark_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS bookmark_tags_bookmark_idx ON bookmark_tags(bookmark_id);
+DROP TRIGGER IF EXISTS bookmark_tags_ai;
+DROP TRIGGER IF EXISTS bookmark_tags_ad;
+DROP TRIGGER IF EXISTS bookmark_tags_au;
+CREATE TRIGGER IF NOT EXISTS bookmark_tags_ai AFTER INSERT ON bookmarks BEGIN"""
+    + _tag_index_insert_sql.format(id="new.id", tags=tags_json_sql("new.tags"))
+    + """END;
+CREATE TRIGGER IF NOT EXISTS bookmark_tags_ad AFTER DELETE ON bookmarks BEGIN"""
+    + _tag_index_delete_sql.format(tags=tags_json_sql("old.tags"))
+    + """END;
+CREATE TRIGGER IF NOT EXISTS bookmark_tags_au AFTER UPDATE OF id, tags ON bookmarks BEGIN"""
+    + _tag_index_delete_sql.format(tags=tags_json_sql("old.tags"))
+    + _tag_index_insert_sql.format(id="new.id", tags=tags_json_sql("new.tags"))
+    + """END;
+DELETE FROM bookmark_tags;
+DELETE FROM tags;
+INSERT OR IGNORE INTO tags(name)
+SELECT j.value FROM bookmarks b, json_each("""
+    + tags_json_sql("b.tags")
+    + """) j WHERE j.value != '';
+INSERT OR IGNORE INTO bookmark_tags(bookmark_id, tag_id)
+SELECT b.id, t.id FROM bookmarks b, json_each("""
+    + tags_json_sql("b.tags")
+    + """) j JOIN tags t ON t.name = j.value;
+"""
+)
+
+drop_tag_index_sql = """
+DROP TRIGGER IF EXISTS bookmark_tags_ai;
+DROP TRIGGER IF EXISTS bookmark_tags_ad;
+DROP TRIGGER IF EXISTS bookmark_tags_au;
+DROP TABLE IF EXISTS bookmark_tags;
+DROP TABLE IF EXISTS tags;
+"""
+
+# bookmarks with tag ?, case-insensitive like the legacy LIKE matching
+TAGGED_BOOKMARKS_SQL = (
+    "SELECT bookmark_id FROM bookmark_tags WHERE tag_id IN "
+    "(SELECT id FROM tags WHERE name = ? COLLATE NOCASE)"
+)
+
 
 class BukuCrypt:
     """Class to handle encryption and decryption of
@@ -447,6 +609,10 @@ class BukuDb:
         Indicates format for displaying bookmarks. Default is 0.
     chatty : bool
         Sets the verbosity of the APIs. Default is False.
+    fts : bool
+        True if the full-text index bookmarks_fts exists, used by searchdb.
+    tag_index : bool
+        True if the normalized tag tables exist, used by the tag APIs.
     """
 
     def __init__(
@@ -456,6 +622,7 @@ class BukuDb:
         chatty: Optional[bool] = False,
         dbfile: Optional[str] = None,
         colorize: Optional[bool] = True,
+        tuned: Optional[bool] = False,
     ) -> None:
         """Database initialization API.
 
@@ -471,13 +638,18 @@ class BukuDb:
             Sets the verbosity of the APIs. Default is False.
         colorize : bool, optional
             Indicates whether color should be used in output. Default is True.
+        tuned : bool, optional
+            Open the DB in WAL mode with tuned pragmas, see initdb.
+            Default is False.
         """
 
         self.json = json
         self.field_filter = field_filter
         self.chatty = chatty
         self.colorize = colorize
-        self.conn, self.cur = BukuDb.initdb(dbfile, self.chatty)
+        self.conn, self.cur = BukuDb.initdb(dbfile, self.chatty, tuned)
+        self.fts = self._has_table("bookmarks_fts")
+        self.tag_index = self._has_table("bookmark_tags")
 
     @staticmethod
     def get_default_dbdir():
@@ -510,12 +682,16 @@ class BukuDb:
 
     @staticmethod
     def initdb(
-        dbfile: Optional[str] = None, chatty: Optional[bool] = False
+        dbfile: Optional[str] = None,
+        chatty: Optional[bool] = False,
+        tuned: Optional[bool] = False,
     ) -> Tuple[sqlite3.Connection, sqlite3.Cursor]:
         """Initialize the database connection.
 
         Create DB file and/or bookmarks table if they don't exist.
         Alert on encryption options on first execution.
+        A setup failing on a locked DB is retried DB_BUSY_RETRIES times,
+        as are writes in a transaction, see BukuDb.transaction.
 
         Parameters
         ----------
@@ -523,6 +699,12 @@ class BukuDb:
             Custom database file path (including filename).
         chatty : bool
             If True, shows informative message on DB creation.
+        tuned : bool, optional
+            If True, the connection waits DB_BUSY_TIMEOUT for locks, memory
+            maps the DB file and keeps temp tables in memory. The DB is
+            switched to WAL journaling with NORMAL sync: readers are not
+            blocked by a writer and commits skip a sync. WAL mode persists
+            in the DB file, other connections use it, too. Default is False.
 
         Returns
         -------
@@ -563,23 +745,103 @@ class BukuDb:
         try:
             # Create a connection
             conn = sqlite3.connect(dbfile, check_same_thread=False)
-            conn.create_function("REGEXP", 2, regexp)
+            for name, func in (("REGEXP", regexp), ("MERGE_TAGS", merge_tags)):
+                try:
+                    # allows SQLite to evaluate once for constant arguments
+                    conn.create_function(name, 2, func, deterministic=True)
+                except sqlite3.NotSupportedError:
+                    conn.create_function(name, 2, func)
             cur = conn.cursor()
 
-            # Create table if it doesn't exist
-            # flags: designed to be extended in future using bitwise masks
-            # Masks:
-            #     0b00000001: set title immutable
-            # queries.create_db(conn)
-            conn.execute(create_table_sql)
-            conn.execute(create_trigger_sql)
-            conn.commit()
+            def setup():
+                if tuned:
+                    conn.execute("PRAGMA busy_timeout = %d" % DB_BUSY_TIMEOUT)
+                    conn.execute("PRAGMA journal_mode = WAL")
+                    conn.execute("PRAGMA synchronous = NORMAL")
+                    conn.execute("PRAGMA temp_store = MEMORY")
+                    conn.execute("PRAGMA mmap_size = %d" % DB_MMAP_SIZE)
+
+                # Create table if it doesn't exist
+                # flags: designed to be extended in future using bitwise masks
+                # Masks:
+                #     0b00000001: set title immutable
+                # queries.create_db(conn)
+                conn.execute(create_table_sql)
+                conn.execute(create_trigger_sql)
+                conn.commit()
+
+            retry_busy(setup, rollback=conn.rollback)
         except Exception as e:
             LOGERR("initdb(): %s", e)
             sys.exit(1)
 
         return (conn, cur)
 
+    def _has_table(self, name: str) -> bool:
+        self.cur.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        )
+        return self.cur.fetchone() is not None
+
+    def enable_fts(self) -> bool:
+        """Create the full-text index used by searchdb and fill it.
+
+        The index is kept in sync with the bookmarks table by triggers.
+        Requires SQLite with FTS5 and the trigram tokenizer (3.34+).
+
+        Returns
+        -------
+        bool
+            True on success, False on failure.
+        """
+
+        try:
+            self.conn.executescript(create_fts_sql)
+            self.conn.commit()
+        except sqlite3.OperationalError as e:
+            LOGERR("Cannot create full-text index: %s", e)
+            self.conn.rollback()
+            return False
+
+        self.fts = True
+        return True
+
+    def disable_fts(self) -> None:
+        """Drop the full-text index, searchdb falls back to table scans."""
+
+        self.conn.executescript(drop_fts_sql)
+        self.conn.commit()
+        self.fts = False
+
+    def enable_tag_index(self) -> bool:
+        """Migrate tags to the normalized tables tags and bookmark_tags.
+
+        The tables are filled from bookmarks.tags and kept consistent with it
+        by triggers, the tag APIs then query the indexed tables.
+
+        Returns
+        -------
+        bool
+            True on success, False on failure.
+        """
+
+        try:
+            self.conn.executescript("BEGIN;" + create_tag_index_sql + "COMMIT;")
+        except sqlite3.Error as e:
+            LOGERR("Cannot create tag index: %s", e)
+            self.conn.rollback()
+            return False
+
+        self.tag_index = True
+        return True
+
+    def disable_tag_index(self) -> None:
+        """Drop the normalized tag tables, the tag APIs scan bookmarks.tags."""
+
+        self.conn.executescript(drop_tag_index_sql)
+        self.conn.commit()
+        self.tag_index = False
+
     def get_rec_all(self):
         """Get all the bookmarks in the database.
 
@@ -592,6 +854,28 @@ class BukuDb:
         self.cur.execute("SELECT * FROM bookmarks")
         return self.cur.fetchall()
 
+    def iter_rec_all(self, batch_size: int = EXPORT_BATCH_SIZE):
+        """Iterate over all the bookmarks in the database, fetched in batches.
+
+        Parameters
+        ----------
+        batch_size : int, optional
+            Records fetched per read. Default is EXPORT_BATCH_SIZE.
+
+        Returns
+        -------
+        iterator
+            Tuples representing bookmark records, as in get_rec_all.
+        """
+
+        cur = self.conn.cursor()
+        cur.execute("SELECT * FROM bookmarks")
+        while True:
+            resultset = cur.fetchmany(batch_size)
+            if not resultset:
+                break
+            yield from resultset
+
     def get_rec_by_id(self, index: int) -> Optional[BookmarkVar]:
         """Get a bookmark from database by its ID.
 
@@ -827,7 +1111,11 @@ class BukuDb:
                     "UPDATE bookmarks SET tags = replace(tags, '%s', '%s') "
                     "WHERE tags LIKE %s" % (tag, DELIM, match)
                 )
-                self.cur.execute(q, (tag,))
+                args = (tag,)
+                if self.tag_index:
+                    q += " AND id IN (" + TAGGED_BOOKMARKS_SQL + ")"
+                    args = (tag, tag[1:-1])
+                self.cur.execute(q, args)
                 count += self.cur.rowcount
 
             if count and not delay_commit:
@@ -1042,12 +1330,23 @@ class BukuDb:
 
         return True
 
-    def refreshdb(self, index: int, threads: int) -> bool:
+    def refreshdb(
+        self,
+        index: int,
+        threads: int,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> bool:
         """Refresh ALL records in the database.
 
         Fetch title for each bookmark from the web and update the records.
         Doesn't update the record if fetched title is empty.
 
+        Fetches run in a thread pool sharing one keep-alive connection pool,
+        with at most REFRESH_HOST_CONNECTIONS requests in flight per host.
+        The calling thread is the only writer: updates are applied in
+        batches of REFRESH_BATCH_SIZE records per commit.
+        Pages in the metadata cache are revalidated with conditional requests.
+
         Notes
         -----
             This API doesn't change DB index, URL or tags of a bookmark.
@@ -1059,6 +1358,8 @@ class BukuDb:
             DB index of record to update. 0 indicates all records.
         threads: int
             Number of threads to use to refresh full DB. Default is 4.
+        progress : callable, optional
+            Called as progress(done, total) after each fetched record.
         """
 
         if index == 0:
@@ -1086,9 +1387,6 @@ class BukuDb:
             blank_url_str = "Index %d: No title\n"
             success_str = "Title: [%s]\nIndex %d: updated\n"
 
-        done = {"value": 0}  # count threads completed
-        processed = {"value": 0}  # count number of records processed
-
         # An additional call to generate default headers
         # gen_headers() is called within network_handler()
         # However, this initial call to setup headers
@@ -1097,106 +1395,85 @@ class BukuDb:
         if not MYHEADERS:
             gen_headers()
 
-        cond = threading.Condition()
-        cond.acquire()
-
-        def refresh(count, cond):
-            """Inner function to fetch titles and update records.
-
-            Parameters
-            ----------
-            count : int
-                Dummy input to adhere to convention.
-            cond : threading condition object.
-            """
+        threads = max(1, min(threads, recs))
+        scheduler = RefreshScheduler(resultset, REFRESH_HOST_CONNECTIONS)
+        manager = shared_pool.get()
+        results = queue.Queue()  # (row, network_handler result), None per finished worker
 
+        def refresh():
+            """Fetch titles of the records handed out by the scheduler."""
             count = 0
+            host, row = scheduler.take()
+            while row is not None:
+                result = network_handler(row[1], row[2] & 1, manager, revalidate=True)
+                results.put((row, result))
+                count += 1
+                if INTERRUPTED:
+                    break
+                host, row = scheduler.take(host)
 
-            while True:
-                query = "UPDATE bookmarks SET"
-                arguments = []
+            LOGDBG("Thread %d: processed %d", threading.get_ident(), count)
+            results.put(None)
 
-                cond.acquire()
-                if resultset:
-                    row = resultset.pop()
-                else:
-                    cond.release()
-                    break
-                cond.release()
+        workers = [threading.Thread(target=refresh) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
 
-                title, desc, tags, mime, bad = network_handler(row[1], row[2] & 1)
-                count += 1
+        query = (
+            "UPDATE bookmarks SET metadata = COALESCE(?, metadata), "
+            "desc = COALESCE(?, desc) WHERE id = ?"
+        )
+        batch = []
+        processed = 0
+        running = threads
+        try:
+            while running:
+                item = results.get()
+                if item is None:
+                    running -= 1
+                    continue
 
-                cond.acquire()
+                row, (title, desc, _, mime, bad) = item
+                processed += 1
+                if progress is not None:
+                    progress(processed, recs)
 
                 if bad:
                     print(bad_url_str % row[0])
-                    cond.release()
                     continue
 
                 if mime:
                     if self.chatty:
                         print(mime_str % row[0])
-                    cond.release()
                     continue
 
-                to_update = False
-
-                if not title or title == "":
+                if not title:
                     LOGERR(blank_url_str, row[0])
-                else:
-                    query += " metadata = ?,"
-                    arguments += (title,)
-                    to_update = True
-
-                if desc:
-                    query += " desc = ?,"
-                    arguments += (desc,)
-                    to_update = True
-
-                if not to_update:
-                    cond.release()
-                    continue
-
-                query = query[:-1] + " WHERE id = ?"
-                arguments += (row[0],)
-                LOGDBG('refreshdb query: "%s", args: %s', query, arguments)
-
-                self.cur.execute(query, arguments)
+                    title = None
+                    if not desc:
+                        continue
 
-                # Save after fetching 32 titles per thread
-                if count & 0b11111 == 0:
+                batch.append((title, desc or None, row[0]))
+                if len(batch) >= REFRESH_BATCH_SIZE:
+                    LOGDBG('refreshdb query: "%s", %d records', query, len(batch))
+                    self.cur.executemany(query, batch)
                     self.conn.commit()
+                    batch = []
 
-                if self.chatty:
+                if title and self.chatty:
                     print(success_str % (title, row[0]))
-                cond.release()
-
-                if INTERRUPTED:
-                    break
-
-            LOGDBG("Thread %d: processed %d", threading.get_ident(), count)
-            with cond:
-                done["value"] += 1
-                processed["value"] += count
-                cond.notify()
-
-        if recs < threads:
-            threads = recs
-
-        for i in range(threads):
-            thread = threading.Thread(target=refresh, args=(i, cond))
-            thread.start()
+        finally:
+            for worker in workers:
+                worker.join()
 
-        while done["value"] < threads:
-            cond.wait()
-            LOGDBG("%d threads completed", done["value"])
+        if batch:
+            LOGDBG('refreshdb query: "%s", %d records', query, len(batch))
+            self.cur.executemany(query, batch)
 
         # Guard: records found == total records processed
-        if recs != processed["value"]:
-            LOGERR("Records: %d, processed: %d !!!", recs, processed["value"])
+        if recs != processed and not INTERRUPTED:
+            LOGERR("Records: %d, processed: %d !!!", recs, processed)
 
-        cond.release()
         self.conn.commit()
         return True
 
@@ -1299,9 +1576,14 @@ class BukuDb:
         all_keywords: Optional[bool] = False,
         deep: Optional[bool] = False,
         regex: Optional[bool] = False,
+        rank: Optional[bool] = False,
     ) -> Optional[Iterable[Any]]:
         """Search DB for entries where tags, URL, or title fields match keywords.
 
+        If the full-text index exists (see enable_fts), keyword searches only
+        evaluate the rows containing the keywords. Regex searches and keywords
+        shorter than 3 characters always scan the table.
+
         Parameters
         ----------
         keywords : list of str
@@ -1313,6 +1595,9 @@ class BukuDb:
             True to search for matching substrings. Default is False.
         regex : bool, optional
             Match a regular expression if True. Default is False.
+        rank : bool, optional
+            Order results by BM25 relevance if the full-text index is used.
+            Default is False.
 
         Returns
         -------
@@ -1322,6 +1607,15 @@ class BukuDb:
         if not keywords:
             return None
 
+        source = "bookmarks"
+        match = None if regex or not self.fts else self._fts_match(keywords, all_keywords, deep)
+        if match is not None:
+            source = (
+                "(SELECT bookmarks.*, bookmarks_fts.rank AS fts_rank FROM bookmarks_fts "
+                "JOIN bookmarks ON bookmarks.id = bookmarks_fts.rowid "
+                "WHERE bookmarks_fts MATCH ?)"
+            )
+
         # Deep query string
         q1 = (
             "(tags LIKE ('%' || ? || '%') OR "
@@ -1367,7 +1661,9 @@ class BukuDb:
             elif len(keywords) == 1 and keywords[0] == "immutable":
                 q0 = "SELECT * FROM bookmarks WHERE flags & 1 == 1 "
             else:
-                q0 = "SELECT id, url, metadata, tags, desc, flags FROM bookmarks WHERE "
+                q0 = "SELECT id, url, metadata, tags, desc, flags FROM " + source + " WHERE "
+                if match is not None:
+                    qargs.append(match)
                 for token in keywords:
                     if not token:
                         continue
@@ -1394,7 +1690,7 @@ class BukuDb:
                     return None
 
                 q0 = q0[:-4]
-            q0 += "ORDER BY id ASC"
+            q0 += "ORDER BY fts_rank" if match is not None and rank else "ORDER BY id ASC"
         elif not all_keywords:
             q0 = "SELECT id, url, metadata, tags, desc, flags FROM (SELECT *, "
             for token in keywords:
@@ -1422,10 +1718,11 @@ class BukuDb:
             if not qargs:
                 return None
 
-            q0 = (
-                q0[:-3]
-                + " AS score FROM bookmarks WHERE score > 0 ORDER BY score DESC)"
-            )
+            q0 = q0[:-3] + " AS score FROM " + source + " WHERE score > 0 ORDER BY score DESC"
+            if match is not None:
+                qargs.append(match)
+                q0 += ", fts_rank" if rank else ", id"
+            q0 += ")"
         else:
             LOGERR("Invalid search option")
             return None
@@ -1440,6 +1737,36 @@ class BukuDb:
 
         return self.cur.fetchall()
 
+    @staticmethod
+    def _fts_match(
+        keywords: List[str], all_keywords: Optional[bool], deep: Optional[bool]
+    ) -> Optional[str]:
+        """FTS5 query selecting all candidate rows of a keyword search.
+
+        Returns None if the index cannot narrow the search: a keyword shorter
+        than the trigram (or with LIKE wildcards in deep mode) could match any
+        row. With ALL keywords such tokens are left to the exact predicates.
+        """
+
+        if all_keywords and len(keywords) == 1 and keywords[0] in ("blank", "immutable"):
+            return None
+
+        phrases = []
+        for token in keywords:
+            if not token:
+                continue
+            if not deep:
+                token = token.rstrip("/")
+            if len(token) < FTS_MIN_TOKEN_LEN or (deep and ("%" in token or "_" in token)):
+                if all_keywords:
+                    continue
+                return None
+            phrases.append('"' + token.replace('"', '""') + '"')
+
+        if not phrases:
+            return None
+        return (" AND " if all_keywords else " OR ").join(phrases)
+
     def search_by_tag(self, tags: Optional[str]) -> Optional[List[BookmarkVar]]:
         """Search bookmarks for entries with given tags.
 
@@ -1471,13 +1798,27 @@ class BukuDb:
         LOGDBG("search_operator: %s", search_operator)
         LOGDBG("excluded_tags: %s", excluded_tags)
 
+        # With the tag index only bookmarks having the tags are evaluated.
+        # Tags are then matched as names, LIKE wildcards (%, _) literally.
+        source = "bookmarks"
+        names = []  # type: List[str]
+        if self.tag_index and all(tag.strip(DELIM) for tag in tags_):
+            names = [tag[1:-1] for tag in tags_]
+            op = " INTERSECT " if search_operator == "AND" else " UNION "
+            source = (
+                "(SELECT * FROM bookmarks WHERE id IN ("
+                + op.join([TAGGED_BOOKMARKS_SQL] * len(names))
+                + "))"
+            )
+
         if search_operator == "AND":
             query = (
-                "SELECT id, url, metadata, tags, desc, flags FROM bookmarks "
+                "SELECT id, url, metadata, tags, desc, flags FROM " + source + " "
                 "WHERE tags LIKE '%' || ? || '%' "
             )
             for tag in tags_[1:]:
                 query += "{} tags LIKE '%' || ? || '%' ".format(search_operator)
+            tags_ = names + tags_
 
             if excluded_tags:
                 tags_.append(excluded_tags)
@@ -1492,7 +1833,8 @@ class BukuDb:
             for tag in tags_[1:]:
                 query += " + " + case_statement
 
-            query += " AS score FROM bookmarks WHERE score > 0"
+            query += " AS score FROM " + source + " WHERE score > 0"
+            tags_ = tags_ + names
 
             if excluded_tags:
                 tags_.append(excluded_tags)
@@ -2001,29 +2343,45 @@ class BukuDb:
              dictionary of {tag: usage_count}).
         """
 
-        tags = []
-        unique_tags = []
-        dic = {}
-        qry = "SELECT DISTINCT tags, COUNT(tags) FROM bookmarks GROUP BY tags"
-        for row in self.cur.execute(qry):
-            tagset = row[0].strip(DELIM).split(DELIM)
-            for tag in tagset:
-                if tag not in tags:
-                    dic[tag] = row[1]
-                    tags += (tag,)
-                else:
-                    dic[tag] += row[1]
+        if self.tag_index:
+            return self._get_tag_all_indexed()
 
-        if not tags:
-            return tags, dic
+        # split and count in SQLite, each distinct tagset once
+        qry = (
+            "SELECT j.value, SUM(g.n) FROM "
+            "(SELECT tags, COUNT(*) AS n FROM bookmarks WHERE tags IS NOT NULL GROUP BY tags) g, "
+            "json_each(" + tags_json_sql("g.tags") + ") j GROUP BY j.value"
+        )
+        dic = dict(self.cur.execute(qry))
+        unique_tags = sorted(dic)
 
-        if tags[0] == "":
-            unique_tags = sorted(tags[1:])
-        else:
-            unique_tags = sorted(tags)
+        # the empty tag is listed unless the smallest tagset starts with it
+        if unique_tags and unique_tags[0] == "":
+            self.cur.execute("SELECT MIN(tags) FROM bookmarks")
+            if self.cur.fetchone()[0].strip(DELIM).split(DELIM)[0] == "":
+                unique_tags = unique_tags[1:]
 
         return unique_tags, dic
 
+    def _get_tag_all_indexed(self):
+        """get_tag_all from the tag index, counted on the bookmark_tags primary key."""
+
+        dic = dict(
+            self.cur.execute(
+                "SELECT t.name, c.n FROM "
+                "(SELECT tag_id, COUNT(*) AS n FROM bookmark_tags GROUP BY tag_id) c "
+                "JOIN tags t ON t.id = c.tag_id"
+            )
+        )
+        self.cur.execute(
+            "SELECT (SELECT COUNT(*) FROM bookmarks) - "
+            "(SELECT COUNT(DISTINCT bookmark_id) FROM bookmark_tags)"
+        )
+        untagged = self.cur.fetchone()[0]
+        if untagged:
+            dic[""] = untagged
+        return sorted(tag for tag in dic if tag), dic
+
     def suggest_similar_tag(self, tagstr):
         """Show list of tags those go together in DB.
 
@@ -2043,12 +2401,17 @@ class BukuDb:
             return tagstr
 
         qry = "SELECT DISTINCT tags FROM bookmarks WHERE tags LIKE ?"
+        if self.tag_index:
+            qry = "SELECT DISTINCT tags FROM bookmarks WHERE id IN (" + TAGGED_BOOKMARKS_SQL + ")"
         tagset = set()
         for tag in tags:
             if tag == "":
                 continue
 
-            self.cur.execute(qry, ("%" + delim_wrap(tag) + "%",))
+            if self.tag_index:
+                self.cur.execute(qry, (tag,))
+            else:
+                self.cur.execute(qry, ("%" + delim_wrap(tag) + "%",))
             results = self.cur.fetchall()
             for row in results:
                 # update tagset with unique tags in row
@@ -2081,10 +2444,13 @@ class BukuDb:
 
         return parse_tags(tags)
 
-    def replace_tag(self, orig: str, new: Optional[List[str]] = None) -> bool:
+    def replace_tag(
+        self, orig: str, new: Optional[List[str]] = None, dry_run: bool = False
+    ) -> bool:
         """Replace original tag by new tags in all records.
 
         Remove original tag if new tag is empty.
+        All records are updated with a single statement in one transaction.
 
         Parameters
         ----------
@@ -2092,6 +2458,8 @@ class BukuDb:
             Original tag.
         new : list
             Replacement tags.
+        dry_run : bool, optional
+            Only print the changes per record. Default is False.
 
         Returns
         -------
@@ -2110,31 +2478,86 @@ class BukuDb:
             return False
 
         # Remove original tag from DB if new tagset reduces to delimiter
-        if newtags == DELIM:
+        if newtags == DELIM and not dry_run:
             return self.delete_tag_at_index(0, orig)
 
-        # Update bookmarks with original tag
-        query = "SELECT id, tags FROM bookmarks WHERE tags LIKE ?"
-        self.cur.execute(query, ("%" + orig + "%",))
-        results = self.cur.fetchall()
-        if results:
-            query = "UPDATE bookmarks SET tags = ? WHERE id = ?"
-            for row in results:
-                tags = row[1].replace(orig, newtags)
-                tags = parse_tags([tags])
-                self.cur.execute(
-                    query,
-                    (
-                        tags,
-                        row[0],
-                    ),
-                )
-                print("Index %d updated" % row[0])
+        # Bookmarks with original tag
+        if self.tag_index:
+            query = "SELECT id, tags FROM bookmarks WHERE id IN (" + TAGGED_BOOKMARKS_SQL + ")"
+            self.cur.execute(query, (orig[1:-1],))
+        else:
+            query = "SELECT id, tags FROM bookmarks WHERE tags LIKE ?"
+            self.cur.execute(query, ("%" + orig + "%",))
 
-            self.conn.commit()
+        if newtags == DELIM:  # same as delete_tag_at_index
+            rewrite = lambda tags: tags.replace(orig, DELIM)
+        else:
+            rewrite = lambda tags: parse_tags([tags.replace(orig, newtags)])
+
+        try:
+            report = self.rewrite_tags(self.cur.fetchall(), rewrite, dry_run)
+        except sqlite3.Error as e:
+            LOGERR(e)
+            self.conn.rollback()
+            return False
+
+        for index, old_tags, new_tags in report:
+            if dry_run:
+                print("Index %d: %s -> %s" % (index, old_tags, new_tags))
+            else:
+                print("Index %d updated" % index)
 
         return True
 
+    def rewrite_tags(
+        self,
+        rows: Iterable[Tuple[int, str]],
+        rewrite: Callable[[str], str],
+        dry_run: bool = False,
+    ) -> List[Tuple[int, str, str]]:
+        """Rewrite the tags of many records with one UPDATE statement.
+
+        Parameters
+        ----------
+        rows : iterable of (int, str)
+            (DB index, tags) of the records to rewrite.
+        rewrite : callable
+            Maps a tagset to the new tagset, called once per distinct tagset.
+        dry_run : bool, optional
+            Only report the changes. Default is False.
+
+        Returns
+        -------
+        list
+            (DB index, old tags, new tags) of the changed records.
+            Changes are committed unless dry_run is True.
+        """
+
+        new_tagsets = {}  # type: Dict[str, str]
+        report = []
+        for index, tags in rows:
+            if tags not in new_tagsets:
+                new_tagsets[tags] = rewrite(tags)
+            if new_tagsets[tags] != tags:
+                report.append((index, tags, new_tagsets[tags]))
+
+        if dry_run or not report:
+            return report
+
+        if sqlite3.sqlite_version_info >= (3, 33, 0):  # UPDATE FROM
+            self.cur.execute(
+                "UPDATE bookmarks SET tags = json_extract(j.value, '$[1]') "
+                "FROM json_each(?) j WHERE bookmarks.id = json_extract(j.value, '$[0]')",
+                (json.dumps([(index, new_tags) for index, _, new_tags in report]),),
+            )
+        else:
+            self.cur.executemany(
+                "UPDATE bookmarks SET tags = ? WHERE id = ?",
+                [(new_tags, index) for index, _, new_tags in report],
+            )
+        self.conn.commit()
+        return report
+
     def get_tagstr_from_taglist(self, id_list, taglist):
         """Get a string of delimiter-separated (and enclosed) string
         of tags from a dictionary of tags by matching ids.
@@ -2168,15 +2591,19 @@ class BukuDb:
 
         return tags
 
-    def set_tag(self, cmdstr, taglist):
+    def set_tag(self, cmdstr, taglist, dry_run=False):
         """Append, overwrite, remove tags using the symbols >>, > and << respectively.
 
+        All records are updated with a single statement in one transaction.
+
         Parameters
         ----------
         cmdstr : str
             Command pattern.
         taglist : list
             List of tags.
+        dry_run : bool, optional
+            Only print the changes per record. Default is False.
 
         Returns
         -------
@@ -2215,64 +2642,55 @@ class BukuDb:
         if flag != 2:
             index += 1
 
-        update_count = 0
-        query = "UPDATE bookmarks SET tags = ? WHERE id = ?"
+        db_ids = []
         try:
-            db_id_list = cmdstr[index + 1 :].split()
-            for id in db_id_list:
+            for id in cmdstr[index + 1 :].split():
                 if is_int(id) and int(id) > 0:
-                    if flag == 1:
-                        if self.append_tag_at_index(id, tags, True):
-                            update_count += 1
-                    elif flag == 2:
-                        tags = parse_tags([tags])
-                        self.cur.execute(
-                            query,
-                            (
-                                tags,
-                                id,
-                            ),
-                        )
-                        update_count += self.cur.rowcount
-                    else:
-                        self.delete_tag_at_index(id, tags, True)
-                        update_count += 1
+                    db_ids.append(int(id))
                 elif "-" in id:
                     vals = [int(x) for x in id.split("-")]
                     if vals[0] > vals[-1]:
                         vals[0], vals[-1] = vals[-1], vals[0]
-
-                    for _id in range(vals[0], vals[-1] + 1):
-                        if flag == 1:
-                            if self.append_tag_at_index(_id, tags, True):
-                                update_count += 1
-                        elif flag == 2:
-                            tags = parse_tags([tags])
-                            self.cur.execute(
-                                query,
-                                (
-                                    tags,
-                                    _id,
-                                ),
-                            )
-                            update_count += self.cur.rowcount
-                        else:
-                            if self.delete_tag_at_index(_id, tags, True):
-                                update_count += 1
+                    db_ids.extend(range(vals[0], vals[-1] + 1))
                 else:
                     return -1
         except ValueError:
             return -1
-        except sqlite3.IntegrityError:
-            return -1
+
+        if flag == 1:
+            rewrite = lambda old_tags: parse_tags([old_tags + tags[1:]])
+        elif flag == 2:
+            tags = parse_tags([tags])
+            rewrite = lambda old_tags: tags
+        else:
+            tags_to_delete = tags.strip(DELIM).split(DELIM)
+
+            def rewrite(old_tags):
+                for tag in tags_to_delete:
+                    old_tags = old_tags.replace(delim_wrap(tag), DELIM)
+                return parse_tags([old_tags])
+
+        rows = {}
+        for i in range(0, len(db_ids), SQL_MAX_PARAMS):
+            chunk = db_ids[i : i + SQL_MAX_PARAMS]
+            self.cur.execute(
+                "SELECT id, tags FROM bookmarks WHERE id IN (%s)" % ",".join("?" * len(chunk)),
+                chunk,
+            )
+            rows.update(self.cur.fetchall())
 
         try:
-            self.conn.commit()
-        except Exception as e:
+            report = self.rewrite_tags(sorted(rows.items()), rewrite, dry_run)
+        except sqlite3.Error as e:
             LOGERR(e)
+            self.conn.rollback()
             return -1
 
-        return update_count
+        if dry_run:
+            for index, old_tags, new_tags in report:
+                print("Index %d: %s -> %s" % (index, old_tags, new_tags))
+
+        return sum(1 for id in db_ids if id in rows)
 
     def browse_by_index(self, index=0, low=0, high=0, is_range=False):
         """Open URL at index or range of indices in browser.
@@ -2365,6 +2783,7 @@ class BukuDb:
             Path to export destination file.
         resultset : list of tuples
             List of results to export.
+            The full DB is read in batches and written record by record.
 
 
         Returns
@@ -2375,11 +2794,13 @@ class BukuDb:
 
         count = 0
 
-        if not resultset:
-            resultset = self.get_rec_all()
-            if not resultset:
+        export_all = not resultset
+        if export_all:
+            self.cur.execute("SELECT EXISTS (SELECT 1 FROM bookmarks)")
+            if not self.cur.fetchone()[0]:
                 print("No records found")
                 return False
+            resultset = self.iter_rec_all()
 
         if os.path.exists(filepath):
             resp = read_in(filepath + " exists. Overwrite? (y/n): ")
@@ -2391,29 +2812,40 @@ class BukuDb:
 
         if filepath.endswith(".db"):
             outdb = BukuDb(dbfile=filepath)
-            qry = "INSERT INTO bookmarks(URL, metadata, tags, desc, flags) VALUES (?, ?, ?, ?, ?)"
-            for row in resultset:
-                outdb.cur.execute(qry, (row[1], row[2], row[3], row[4], row[5]))
-                count += 1
-            outdb.conn.commit()
-            outdb.close()
+            if export_all:
+                # copied inside SQLite, without passing rows through Python
+                outdb.close()
+                self.conn.commit()
+                self.cur.execute("ATTACH DATABASE ? AS export", (filepath,))
+                try:
+                    self.cur.execute(
+                        "INSERT INTO export.bookmarks(URL, metadata, tags, desc, flags)"
+                        " SELECT URL, metadata, tags, desc, flags FROM main.bookmarks"
+                        " ORDER BY id"
+                    )
+                    count = self.cur.rowcount
+                    self.conn.commit()
+                finally:
+                    self.cur.execute("DETACH DATABASE export")
+            else:
+                qry = (
+                    "INSERT INTO bookmarks(URL, metadata, tags, desc, flags) "
+                    "VALUES (?, ?, ?, ?, ?)"
+                )
+                outdb.cur.executemany(qry, (row[1:6] for row in resultset))
+                count = outdb.cur.rowcount
+                outdb.conn.commit()
+                outdb.close()
             print("%s exported" % count)
             return True
 
         with open(filepath, mode="w", encoding="utf-8") as outfp:
-            res = {}  # type: Dict
             if filepath.endswith(".md"):
-                res = convert_bookmark_set(resultset, "markdown")
-                count += res["count"]
-                outfp.write(res["data"])
+                count = write_bookmark_set(outfp, resultset, "markdown")
             elif filepath.endswith(".org"):
-                res = convert_bookmark_set(resultset, "org")
-                count += res["count"]
-                outfp.write(res["data"])
+                count = write_bookmark_set(outfp, resultset, "org")
             else:
-                res = convert_bookmark_set(resultset, "html")
-                count += res["count"]
-                outfp.write(res["data"])
+                count = write_bookmark_set(outfp, resultset, "html")
             print("%s exported" % count)
             return True
         return False
@@ -2700,22 +3132,140 @@ class BukuDb:
         if newtag:
             print("\nAuto-generated tag: %s" % newtag)
 
-    def importdb(self, filepath, tacit=False):
-        """Import bookmarks from a HTML or a Markdown file.
+    @contextlib.contextmanager
+    def transaction(self):
+        """Writes of the block in one transaction, holding the write lock.
 
-        Supports Firefox, Google Chrome, and IE exported HTML bookmarks.
-        Supports Markdown files with extension '.md, .org'.
-        Supports importing bookmarks from another buku database file.
+        The lock is taken up front (BEGIN IMMEDIATE), retried while the DB
+        is locked (SQLITE_BUSY) after the busy timeout, see retry_busy.
+        Writes within the block then do not fail on other writers.
+        Committed at the end, rolled back on an exception.
+        """
+
+        self.conn.commit()
+        retry_busy(lambda: self.cur.execute("BEGIN IMMEDIATE"))
+        try:
+            yield
+        except BaseException:
+            self.conn.rollback()
+            raise
+        else:
+            self.conn.commit()
+
+    @contextlib.contextmanager
+    def bulk_write(self):
+        """A transaction with NORMAL sync on this connection for a bulk write.
+
+        The sync level is restored afterwards. The journal mode is left
+        alone: it persists in the DB file, WAL is only used when opted in,
+        see initdb.
+        """
+
+        self.conn.commit()
+        synchronous = self.cur.execute("PRAGMA synchronous").fetchone()[0]
+        self.cur.execute("PRAGMA synchronous = NORMAL")
+        try:
+            with self.transaction():
+                yield
+        finally:
+            self.cur.execute("PRAGMA synchronous = %d" % synchronous)
+
+    def import_items(
+        self,
+        items: Iterable[Tuple],
+        append_tags: bool = True,
+        batch_size: int = IMPORT_BATCH_SIZE,
+    ) -> int:
+        """Add bookmarks in bulk, without fetching from the web.
+
+        Rows are inserted with executemany in batches of batch_size, in one
+        transaction with NORMAL sync: if reading items fails, e.g. on a
+        malformed file, nothing is written. Bookmarks with existing URLs are
+        updated in the same statement: their tags are merged in SQL, as
+        append_tag_at_index does, or left alone.
 
         Parameters
         ----------
-        filepath : str
-            Path to file to import.
-        tacit : bool, optional
-            If True, no questions asked and folder names are automatically
-            imported as tags from bookmarks HTML.
-            If True, automatic timestamp tag is NOT added.
-            Default is False.
+        items : iterable of tuple
+            (url, title, tags, desc, immutable, ...) as add_rec arguments,
+            as yielded by the import_* parsers. Consumed lazily.
+        append_tags : bool, optional
+            Append the tags of items with existing URLs. Default is True.
+        batch_size : int, optional
+            Bookmarks per executemany. Default is IMPORT_BATCH_SIZE.
+
+        Returns
+        -------
+        int
+            Number of added bookmarks.
+        """
+
+        def prepare():
+            for url, title, tags, desc, immutable, *_ in items:
+                if not url:
+                    LOGERR("Invalid URL")
+                    continue
+                yield (
+                    url,
+                    "" if title is None else title,
+                    delim_wrap(tags),
+                    "" if desc is None else desc,
+                    1 if immutable == 1 else 0,
+                )
+
+        if sqlite3.sqlite_version_info < (3, 24, 0):  # no UPSERT
+            added = 0
+            with self.bulk_write():
+                for url, title, tags, desc, flags in prepare():
+                    if self.add_rec(url, title, tags, desc, flags, True, False) != -1:
+                        added += 1
+                    elif append_tags:
+                        self.append_tag_at_index(self.get_rec_id(url), tags, True)
+            return added
+
+        qry = (
+            "INSERT INTO bookmarks(URL, metadata, tags, desc, flags) "
+            "VALUES (?, ?, ?, ?, ?) ON CONFLICT(URL) DO "
+        )
+        if append_tags:
+            qry += (
+                "UPDATE SET tags = MERGE_TAGS(bookmarks.tags, excluded.tags) "
+                "WHERE excluded.tags != ','"
+            )
+        else:
+            qry += "NOTHING"
+
+        count = self.cur.execute("SELECT COUNT(*) FROM bookmarks").fetchone()[0]
+        prepared = prepare()
+        with self.bulk_write():
+            while True:
+                batch = list(islice(prepared, batch_size))
+                if not batch:
+                    break
+                self.cur.executemany(qry, batch)
+                LOGDBG("import_items(): %d bookmarks written", len(batch))
+
+        added = self.cur.execute("SELECT COUNT(*) FROM bookmarks").fetchone()[0] - count
+        if self.chatty:
+            print("%d bookmarks added" % added)
+        return added
+
+    def importdb(self, filepath, tacit=False):
+        """Import bookmarks from a HTML or a Markdown file.
+
+        Supports Firefox, Google Chrome, and IE exported HTML bookmarks.
+        Supports Markdown files with extension '.md, .org'.
+        Supports importing bookmarks from another buku database file.
+
+        Parameters
+        ----------
+        filepath : str
+            Path to file to import.
+        tacit : bool, optional
+            If True, no questions asked and folder names are automatically
+            imported as tags from bookmarks HTML.
+            If True, automatic timestamp tag is NOT added.
+            Default is False.
 
         Returns
         -------
@@ -2744,44 +3294,23 @@ class BukuDb:
             else:
                 resp = "y"
             add_bookmark_folder_as_tag = resp == "y"
-            try:
-                with open(filepath, "r", encoding="utf-8") as datafile:
-                    data = json.load(datafile)
-
-                items = import_firefox_json(data, add_bookmark_folder_as_tag, newtag)
-            except ValueError as e:
-                LOGERR("ff_json: JSON Decode Error: {}".format(e))
-                return False
-            except Exception as e:
-                LOGERR(e)
-                return False
+            items = import_firefox_json_file(
+                filepath, add_bookmark_folder_as_tag, newtag
+            )
         else:
-            try:
-                with open(filepath, mode="r", encoding="utf-8") as infp:
-                    soup = BeautifulSoup(infp, "html.parser")
-            except ImportError:
-                LOGERR("Beautiful Soup not found")
-                return False
-            except Exception as e:
-                LOGERR(e)
-                return False
-
             if not tacit:
                 resp = input("Add parent folder names as tags? (y/n): ")
             else:
                 resp = "y"
 
             add_parent_folder_as_tag = resp == "y"
-            items = import_html(soup, add_parent_folder_as_tag, newtag)
-            infp.close()
-
-        for item in items:
-            add_rec_res = self.add_rec(*item)
-            if add_rec_res == -1 and append_tags_resp == "y":
-                rec_id = self.get_rec_id(item[0])
-                self.append_tag_at_index(rec_id, item[2])
+            items = import_html_file(filepath, add_parent_folder_as_tag, newtag)
 
-        self.conn.commit()
+        try:
+            self.import_items(items, append_tags=append_tags_resp == "y")
+        except (OSError, ValueError) as e:  # unreadable or malformed, found while reading
+            LOGERR("Error importing {}: {}".format(filepath, e))
+            return False
 
         if newtag:
             print("\nAuto-generated tag: %s" % newtag)
@@ -2812,12 +3341,15 @@ class BukuDb:
             LOGERR(e)
             return False
 
-        resultset = indb_cur.fetchall()
-        if resultset:
-            for row in resultset:
-                self.add_rec(row[1], row[2], row[3], row[4], row[5], True, False)
+        def items():
+            while True:
+                resultset = indb_cur.fetchmany(IMPORT_BATCH_SIZE)
+                if not resultset:
+                    break
+                for row in resultset:
+                    yield row[1:6]
 
-            self.conn.commit()
+        self.import_items(items(), append_tags=False)
 
         try:
             indb_cur.close()
@@ -2939,20 +3471,16 @@ class BukuDb:
 
         # Try fetching cached page from Wayback Machine
         api_url = "https://archive.org/wayback/available?url=" + quote_plus(url)
-        manager = get_PoolManager()
-        resp = manager.request("GET", api_url)
+        resp = shared_pool.get().request("GET", api_url)
         respobj = json.loads(resp.data)
         try:
             if (
                 len(respobj["archived_snapshots"])
                 and respobj["archived_snapshots"]["closest"]["available"] is True
             ):
-                manager.clear()
                 return respobj["archived_snapshots"]["closest"]["url"]
         except Exception:
             pass
-        finally:
-            manager.clear()
 
         LOGERR("Uncached")
         return None
@@ -3169,36 +3697,57 @@ def convert_bookmark_set(
     -------
         converted data and count of converted bookmark set
     """
+    out = io.StringIO()
+    count = write_bookmark_set(out, bookmark_set, export_type)
+    return {"data": out.getvalue(), "count": count}
+
+
+def write_bookmark_set(
+    outfp, bookmark_set: Iterable[BookmarkVar], export_type: str
+) -> int:
+    """Write bookmark set in one of multiple data formats, record by record.
+
+    Parameters
+    ----------
+        outfp: file object opened for writing text
+        bookmark_set: bookmark set, any iterable of records
+        export type: one of supported type: markdown, html, org
+
+    Returns
+    -------
+        count of written bookmark set
+    """
     assert export_type in ["markdown", "html", "org"]
     #  compatibility
     resultset = bookmark_set
 
     count = 0
-    out = ""
     if export_type == "markdown":
         for row in resultset:
             if not row[2] or row[2] is None:
-                out += "- [Untitled](" + row[1] + ")"
+                out = "- [Untitled](" + row[1] + ")"
             else:
-                out += "- [" + row[2] + "](" + row[1] + ")"
+                out = "- [" + row[2] + "](" + row[1] + ")"
 
             if row[3] != DELIM:
                 out += " <!-- TAGS: {} -->\n".format(row[3][1:-1])
             else:
                 out += "\n"
 
+            outfp.write(out)
             count += 1
     elif export_type == "org":
         for row in resultset:
             if not row[2]:
-                out += "* [[{}][Untitled]]".format(row[1])
+                out = "* [[{}][Untitled]]".format(row[1])
             else:
-                out += "* [[{}][{}]]".format(row[1], row[2])
+                out = "* [[{}][{}]]".format(row[1], row[2])
             out += convert_tags_to_org_mode_tags(row[3])
+            outfp.write(out)
             count += 1
     elif export_type == "html":
         timestamp = str(int(time.time()))
-        out = (
+        outfp.write(
             "<!DOCTYPE NETSCAPE-Bookmark-file-1>\n\n"
             '<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">\n'
             "<TITLE>Bookmarks</TITLE>\n"
@@ -3210,7 +3759,7 @@ def convert_bookmark_set(
         )
 
         for row in resultset:
-            out += '        <DT><A HREF="%s" ADD_DATE="%s" LAST_MODIFIED="%s"' % (
+            out = '        <DT><A HREF="%s" ADD_DATE="%s" LAST_MODIFIED="%s"' % (
                 row[1],
                 timestamp,
                 timestamp,
@@ -3220,11 +3769,12 @@ def convert_bookmark_set(
             out += ">{}</A>\n".format(row[2] if row[2] else "")
             if row[4] != "":
                 out += "        <DD>" + row[4] + "\n"
+            outfp.write(out)
             count += 1
 
-        out += "    </DL><p>\n</DL><p>"
+        outfp.write("    </DL><p>\n</DL><p>")
 
-    return {"data": out, "count": count}
+    return count
 
 
 def get_firefox_profile_name(path):
@@ -3605,6 +4155,165 @@ def import_firefox_json(json, add_bookmark_folder_as_tag=False, unique_tag=None)
     yield from iterate_children(None, main_entry_list)
 
 
+class FirefoxJsonReader:
+    """Incremental reader of a Firefox JSON backup for import_firefox_json_file.
+
+    `document` yields the root object with every "children" array replaced by
+    an iterator of its entries, parsed while import_firefox_json walks them.
+    Entries fitting into the read buffer are decoded at once by the json
+    module; larger folders are read key by key and handed out as soon as
+    their "children" array starts, once "typeCode" and "title" are known
+    (Firefox writes them, and "root", before "children"). Other objects
+    with children are decoded completely.
+    """
+
+    WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+    def __init__(self, infp, read_size: int = IMPORT_READ_SIZE):
+        self.infp = infp
+        self.read_size = read_size
+        self.buf = ""
+        self.pos = 0
+        self.offset = 0  # characters of the file before buf
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def document(self):
+        """Yield the root value, then check that nothing follows it."""
+        if self._peek() == "{":
+            self.pos += 1
+            yield from self._object(is_root=True)
+        else:
+            yield self._value()
+        if self._peek():
+            self._error("Extra data")
+
+    def _fill(self, size: Optional[int] = None) -> bool:
+        if self.eof:
+            return False
+        chunk = self.infp.read(size or self.read_size)
+        self.offset += self.pos
+        self.buf = self.buf[self.pos :] + chunk
+        self.pos = 0
+        self.eof = not chunk
+        return bool(chunk)
+
+    def _error(self, msg: str):
+        raise ValueError("{}: char {}".format(msg, self.offset + self.pos))
+
+    def _peek(self) -> str:
+        """Next character after whitespace, "" at the end of the file."""
+        while True:
+            self.pos = self.WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or not self._fill():
+                return self.buf[self.pos : self.pos + 1]
+
+    def _expect(self, chars: str) -> str:
+        c = self._peek()
+        if not c or c not in chars:
+            self._error("Expecting {!r}".format(chars))
+        self.pos += 1
+        return c
+
+    def _value(self) -> Any:
+        """Decode a complete value, reading as much as it takes."""
+        size = self.read_size
+        while True:
+            self._peek()
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                if self._fill(size):
+                    size *= 2
+                    continue
+                self.pos = e.pos
+                self._error(e.msg)
+            if end < len(self.buf) or not self._fill(size):  # a number may go on
+                self.pos = end
+                return value
+            size *= 2
+
+    def _entries(self):
+        """Entries of an array, after its "[" """
+        if self._peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            if self._peek() == "{":
+                try:
+                    entry, end = self.decoder.raw_decode(self.buf, self.pos)
+                except json.JSONDecodeError:  # not in the buffer, read it by keys
+                    self.pos += 1
+                    yield from self._object()
+                else:
+                    self.pos = end
+                    yield entry
+            else:
+                yield self._value()
+            if self._expect(",]") == "]":
+                return
+
+    def _object(self, is_root: bool = False):
+        """Yield an object once, after its "{"; its children are read lazily."""
+        fields: Dict[str, Any] = {}
+        yielded = False
+        if self._peek() == "}":
+            self.pos += 1
+        else:
+            while True:
+                key = self._value()
+                if not isinstance(key, str):
+                    self._error("Expecting property name enclosed in double quotes")
+                self._expect(":")
+                if (
+                    key == "children"
+                    and not yielded
+                    and (is_root or ("typeCode" in fields and "title" in fields))
+                    and self._peek() == "["
+                ):
+                    self.pos += 1
+                    children = self._entries()
+                    fields[key] = children
+                    yield fields
+                    yielded = True
+                    for _ in children:  # skip what the importer did not walk
+                        pass
+                else:
+                    fields[key] = self._value()
+                if self._expect(",}") == "}":
+                    break
+        if not yielded:
+            yield fields
+
+
+def import_firefox_json_file(
+    filepath: str, add_bookmark_folder_as_tag=False, unique_tag=None
+):
+    """Import a Firefox JSON backup file, reading it incrementally.
+
+    Same as import_firefox_json on the decoded file, without holding more
+    of it in memory than the folders currently walked.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to Firefox JSON bookmarks file.
+    add_bookmark_folder_as_tag : bool
+        True if bookmark parent folder should be added as tags else False.
+    unique_tag : str
+        Timestamp tag in YYYYMonDD format.
+
+    Raises
+    ------
+    ValueError
+        If the file is not valid JSON.
+    """
+
+    with open(filepath, mode="r", encoding="utf-8") as infp:
+        for root in FirefoxJsonReader(infp).document():
+            yield from import_firefox_json(root, add_bookmark_folder_as_tag, unique_tag)
+
+
 def import_html(html_soup, add_parent_folder_as_tag, newtag):
     """Parse bookmark HTML.
 
@@ -3672,6 +4381,231 @@ def import_html(html_soup, add_parent_folder_as_tag, newtag):
         )
 
 
+class _HtmlNode:
+    """Element of the bookmark HTML tree, as far as import_html looks at it"""
+
+    __slots__ = ("name", "parent", "children", "parts", "readers")
+
+    def __init__(self, name: str, parent: Optional["_HtmlNode"]):
+        self.name = name
+        self.parent = parent
+        self.children: Optional[List[Any]] = None  # tracked inside <a> for .string
+        self.parts: Optional[List[str]] = None  # text of an <h3>
+        self.readers: Optional[List["_HtmlBookmark"]] = None  # bookmarks of a <dd>
+
+    def string(self) -> Optional[str]:
+        """BeautifulSoup Tag.string: the only string below a chain of only children"""
+        if not self.children or len(self.children) != 1:
+            return None
+        child = self.children[0]
+        return child if isinstance(child, str) else child.string()
+
+
+class _HtmlBookmark:
+    __slots__ = ("href", "title", "tags", "folder", "desc", "done")
+
+    def __init__(self, href: str, tags: Optional[str], folder: Optional[_HtmlNode]):
+        self.href = href
+        self.title: Optional[str] = None
+        self.tags = tags
+        self.folder = folder
+        self.desc: Optional[str] = None
+        self.done = False  # title and description known
+
+
+class BookmarkHTMLParser(HTMLParser):
+    """Event-driven parser of Netscape bookmark HTML for import_html_file.
+
+    Yields the same tuples as import_html on the BeautifulSoup html.parser
+    tree without building it: the stack of open elements mirrors the tree
+    (unclosed <DT>, <DD> and <p> nest, as in BeautifulSoup), the folder of
+    a bookmark is decided when its <a> starts and its description when the
+    following <dd> sibling has its first text. Only open elements and
+    undecided bookmarks are kept in memory.
+    """
+
+    def __init__(self, add_parent_folder_as_tag: bool, newtag: Optional[str]):
+        super().__init__(convert_charrefs=True)
+        self.add_parent_folder_as_tag = add_parent_folder_as_tag
+        self.newtag = newtag
+        self._stack = [_HtmlNode("[document]", None)]
+        self._text: List[str] = []
+        self._open_h3: List[_HtmlNode] = []
+        self._last_h3: Optional[_HtmlNode] = None
+        self._waiting: Dict[int, List[_HtmlBookmark]] = {}  # id(parent) -> closed <a>s
+        self._bookmarks: Dict[int, _HtmlBookmark] = {}  # id(<a> node) -> bookmark
+        self._pending: collections.deque = collections.deque()
+
+    def ready(self) -> Iterable[Tuple]:
+        """Decided bookmarks in document order, as import_html yields them."""
+        while self._pending and self._pending[0].done:
+            bm = self._pending.popleft()
+            tags = bm.tags
+            if bm.folder is not None:
+                folder = "".join(bm.folder.parts)
+                tags = folder if tags is None else tags + DELIM + folder
+            if self.newtag:
+                tags = self.newtag if tags is None else tags + DELIM + self.newtag
+            yield (
+                bm.href,
+                bm.title,
+                parse_tags([tags]) if tags is not None else None,
+                bm.desc if not bm.desc else bm.desc.strip(),
+                0,
+                True,
+                False,
+            )
+
+    def close(self):
+        super().close()
+        self._flush()
+        while len(self._stack) > 1:
+            self._pop()
+        for bm in self._pending:  # top level <a>s, no parent to close
+            bm.done = True
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        parent = self._stack[-1]
+        node = _HtmlNode(tag, parent)
+        if parent.children is not None or tag == "a":
+            node.children = []
+        if parent.children is not None:
+            parent.children.append(node)
+
+        if tag == "a":
+            self._start_bookmark(node, {k: "" if v is None else v for k, v in attrs})
+        elif tag == "h3":
+            node.parts = []
+            self._open_h3.append(node)
+            self._last_h3 = node
+        elif tag == "dd":
+            node.readers = self._waiting.pop(id(parent), [])
+
+        if tag in HTML_VOID_ELEMENTS:
+            self._end(node)
+        else:
+            self._stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in HTML_VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        self._flush()
+        if all(node.name != tag for node in self._stack[1:]):
+            return
+        while True:
+            node = self._pop()
+            if node.name == tag:
+                break
+
+    def handle_data(self, data):
+        self._text.append(data)
+
+    def handle_comment(self, data):
+        self._flush()
+        self._string(data, comment=True)
+
+    def _flush(self):
+        """End of a text node: collapse it if blank, as BeautifulSoup does."""
+        if not self._text:
+            return
+        text = "".join(self._text)
+        self._text = []
+        if not text.strip(" \t\n\r\f"):
+            text = "\n" if "\n" in text else " "
+        self._string(text)
+
+    def _string(self, text: str, comment: bool = False):
+        """Hand a string to the open elements interested in it."""
+        top = self._stack[-1]
+        if top.children is not None:
+            top.children.append(text)
+        if not comment:  # Tag.text leaves out comments
+            for h3 in self._open_h3:
+                h3.parts.append(text)
+        if top.name == "dd" and top.readers is not None:
+            self._describe(top, text)
+
+    def _start_bookmark(self, node: _HtmlNode, attrs: Dict[str, str]):
+        href = attrs.get("href")
+        if href is None or is_nongeneric_url(href):
+            return
+
+        folder = None
+        h3 = self._last_h3
+        if self.add_parent_folder_as_tag and h3 is not None and len(self._stack) > 1:
+            # the nearest <h3> before, if its parent is an ancestor of the
+            # <dl> enclosing the grandparent of the <a>
+            ancestors = self._stack[:-2]
+            for i in range(len(ancestors) - 1, -1, -1):
+                if ancestors[i].name == "dl":
+                    if any(a is h3.parent for a in ancestors[:i]):
+                        folder = h3
+                    break
+
+        bm = _HtmlBookmark(href, attrs.get("tags"), folder)
+        self._bookmarks[id(node)] = bm
+        self._pending.append(bm)
+
+    def _describe(self, dd: _HtmlNode, desc: Optional[str]):
+        for bm in dd.readers:
+            bm.desc = desc
+            bm.done = True
+        dd.readers = None
+
+    def _pop(self) -> _HtmlNode:
+        node = self._stack.pop()
+        self._end(node)
+        return node
+
+    def _end(self, node: _HtmlNode):
+        if node.name == "h3" and node in self._open_h3:
+            self._open_h3.remove(node)
+        elif node.name == "dd" and node.readers is not None:
+            self._describe(node, None)
+        elif node.name == "a":
+            bm = self._bookmarks.pop(id(node), None)
+            if bm is not None:
+                bm.title = node.string()  # then wait for a <dd> sibling
+                self._waiting.setdefault(id(node.parent), []).append(bm)
+
+        # no more siblings for the <a>s among the children of node
+        for bm in self._waiting.pop(id(node), []):
+            bm.done = True
+
+
+def import_html_file(
+    filepath: str, add_parent_folder_as_tag: bool, newtag: Optional[str]
+):
+    """Parse a bookmark HTML file chunk by chunk, without a BeautifulSoup tree.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to bookmark HTML file.
+    add_parent_folder_as_tag : bool
+        True if bookmark parent folders should be added as tags else False.
+    newtag : str
+        A new unique tag to add to imported bookmarks.
+
+    Returns
+    -------
+    tuple
+        Parsed result, the same as import_html yields.
+    """
+
+    parser = BookmarkHTMLParser(add_parent_folder_as_tag, newtag)
+    with open(filepath, mode="r", encoding="utf-8") as infp:
+        for chunk in iter(lambda: infp.read(IMPORT_READ_SIZE), ""):
+            parser.feed(chunk)
+            yield from parser.ready()
+    parser.close()
+    yield from parser.ready()
+
+
 def is_bad_url(url):
     """Check if URL is malformed.
 
@@ -3792,60 +4726,84 @@ def is_unusual_tag(tagstr):
     return False
 
 
-def parse_decoded_page(page):
-    """Fetch title, description and keywords from decoded HTML page.
+class PageMetaParser(HTMLParser):
+    """Incremental parser collecting <title> and <meta> tags of an HTML head.
 
-    Parameters
-    ----------
-    page : str
-        Decoded HTML page.
-
-    Returns
-    -------
-    tuple
-        (title, description, keywords).
+    `done` is set at </head> or <body>, later markup is ignored.
     """
 
-    title = None
-    desc = None
-    keys = None
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.done = False
+        self.title: Optional[str] = None
+        self.metas: List[Dict[str, Optional[str]]] = []
+        self._title_parts: Optional[List[str]] = None
 
-    # soup = BeautifulSoup(page, "html5lib")
-    soup = BeautifulSoup(
-        page, "html.parser"
-    )  # https://github.com/coursera-dl/edx-dl/issues/434
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == "meta":
+            self.metas.append(dict(attrs))
+        elif tag == "title" and self.title is None and self._title_parts is None:
+            self._title_parts = []
+        elif tag == "body":
+            self._end_title()
+            self.done = True
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if self.done:
+            return
+        if tag == "title":
+            self._end_title()
+        elif tag == "head":
+            self._end_title()
+            self.done = True
 
-    try:
-        title = soup.find("title").text.strip().replace("\n", " ")
-        if title:
-            title = re.sub(r"\s{2,}", " ", title)
-    except Exception as e:
-        LOGDBG(e)
-
-    description = (
-        soup.find("meta", attrs={"name": "description"})
-        or soup.find("meta", attrs={"name": "Description"})
-        or soup.find("meta", attrs={"property": "description"})
-        or soup.find("meta", attrs={"property": "Description"})
-        or soup.find("meta", attrs={"name": "og:description"})
-        or soup.find("meta", attrs={"name": "og:Description"})
-        or soup.find("meta", attrs={"property": "og:description"})
-        or soup.find("meta", attrs={"property": "og:Description"})
-    )
-    try:
-        if description:
-            desc = description.get("content").strip()
+    def handle_data(self, data):
+        if self._title_parts is not None and not self.done:
+            self._title_parts.append(data)
+
+    def close(self):
+        super().close()
+        self._end_title()
+
+    def _end_title(self):
+        if self._title_parts is not None:
+            self.title = "".join(self._title_parts)
+            self._title_parts = None
+
+    def find_meta(self, attr: str, value: str) -> Optional[Dict[str, Optional[str]]]:
+        return next((m for m in self.metas if m.get(attr) == value), None)
+
+    def metadata(self) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """(title, description, keywords) as found in the parsed markup."""
+
+        title = None
+        desc = None
+        keys = None
+
+        if self.title is not None:
+            title = self.title.strip().replace("\n", " ")
+            if title:
+                title = re.sub(r"\s{2,}", " ", title)
+
+        description = next(
+            filter(None, (self.find_meta(a, v) for a, v in PAGE_DESCRIPTION_METAS)),
+            None,
+        )
+        if description and description.get("content"):
+            desc = description["content"].strip()
             if desc:
                 desc = re.sub(r"\s{2,}", " ", desc)
-    except Exception as e:
-        LOGDBG(e)
 
-    keywords = soup.find("meta", attrs={"name": "keywords"}) or soup.find(
-        "meta", attrs={"name": "Keywords"}
-    )
-    try:
-        if keywords:
-            keys = keywords.get("content").strip().replace("\n", " ")
+        keywords = self.find_meta("name", "keywords") or self.find_meta(
+            "name", "Keywords"
+        )
+        if keywords and keywords.get("content"):
+            keys = keywords["content"].strip().replace("\n", " ")
             keys = re.sub(r"\s{2,}", " ", keys)
             if is_unusual_tag(keys):
                 if keys not in (title, desc):
@@ -3856,23 +4814,21 @@ def parse_decoded_page(page):
                         desc = "* " + keys
 
                 keys = None
-    except Exception as e:
-        LOGDBG(e)
 
-    LOGDBG("title: %s", title)
-    LOGDBG("desc : %s", desc)
-    LOGDBG("keys : %s", keys)
+        LOGDBG("title: %s", title)
+        LOGDBG("desc : %s", desc)
+        LOGDBG("keys : %s", keys)
 
-    return (title, desc, keys)
+        return (title, desc, keys)
 
 
-def get_data_from_page(resp):
-    """Detect HTTP response encoding and invoke parser with decoded data.
+def parse_decoded_page(page):
+    """Fetch title, description and keywords from decoded HTML page.
 
     Parameters
     ----------
-    resp : HTTP response
-        Response from GET request.
+    page : str
+        Decoded HTML page.
 
     Returns
     -------
@@ -3880,40 +4836,70 @@ def get_data_from_page(resp):
         (title, description, keywords).
     """
 
+    parser = PageMetaParser()
+    parser.feed(page)
+    parser.close()
+    return parser.metadata()
+
+
+def detect_charset(head: bytes, content_type: Optional[str]) -> str:
+    """Encoding of a page from its first bytes and the Content-Type header.
+
+    A leading <meta charset> wins over the header, an http-equiv
+    Content-Type <meta> is the fallback. Default is utf-8.
+    """
+
+    m = META_CHARSET_RE.search(head)
+    if m is None and content_type:
+        m = CHARSET_RE.search(content_type.encode("latin-1", errors="replace"))
+    if m is None:
+        m = HTTP_EQUIV_CHARSET_RE.search(head)
+
+    charset = m.group(1).decode("ascii", errors="replace") if m else "utf-8"
     try:
-        soup = BeautifulSoup(resp.data, "html.parser")
-    except Exception as e:
-        LOGERR("get_data_from_page(): %s", e)
+        return codecs.lookup(charset).name
+    except LookupError:
+        LOGDBG("unknown charset: %s", charset)
+        return "utf-8"
+
+
+def get_data_from_page(resp):
+    """Read the head of an HTML response and parse its metadata.
+
+    The body is streamed: reading stops at </head> or after
+    PAGE_HEAD_LIMIT bytes. The charset is detected once from the first
+    chunk, which is then decoded incrementally into the parser.
+
+    Parameters
+    ----------
+    resp : HTTP response
+        Response from GET request, requested with preload_content=False.
+
+    Returns
+    -------
+    tuple
+        (title, description, keywords).
+    """
 
     try:
-        charset = None
-
-        if soup.meta and soup.meta.get("charset") is not None:
-            charset = soup.meta.get("charset")
-        elif "content-type" in resp.headers:
-            _, params = cgi.parse_header(resp.headers["content-type"])
-            if params.get("charset") is not None:
-                charset = params.get("charset")
-
-        if not charset and soup:
-            meta_tag = soup.find("meta", attrs={"http-equiv": "Content-Type"})
-            if meta_tag:
-                _, params = cgi.parse_header(meta_tag.attrs["content"])
-                charset = params.get("charset", charset)
-
-        if charset:
-            LOGDBG("charset: %s", charset)
-            title, desc, keywords = parse_decoded_page(
-                resp.data.decode(charset, errors="replace")
-            )
-        else:
-            title, desc, keywords = parse_decoded_page(
-                resp.data.decode(errors="replace")
-            )
+        parser = PageMetaParser()
+        decoder = None
+        read = 0
+        for chunk in resp.stream(PAGE_CHUNK_SIZE):
+            if decoder is None:
+                charset = detect_charset(chunk, resp.headers.get("content-type"))
+                LOGDBG("charset: %s", charset)
+                decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+            parser.feed(decoder.decode(chunk))
+            read += len(chunk)
+            if parser.done or read >= PAGE_HEAD_LIMIT:
+                break
 
-        return (title, desc, keywords)
+        LOGDBG("read %d bytes", read)
+        parser.close()
+        return parser.metadata()
     except Exception as e:
-        LOGERR(e)
+        LOGERR("get_data_from_page(): %s", e)
         return (None, None, None)
 
 
@@ -3947,9 +4933,16 @@ def gen_headers():
         LOGDBG("proxy: [%s]", MYPROXY)
 
 
-def get_PoolManager():
+def get_PoolManager(num_pools=1, maxsize=1):
     """Creates a pool manager with proxy support, if applicable.
 
+    Parameters
+    ----------
+    num_pools : int, optional
+        Number of host connection pools to keep. Default is 1.
+    maxsize : int, optional
+        Number of connections kept alive per host. Default is 1.
+
     Returns
     -------
     ProxyManager or PoolManager
@@ -3959,7 +4952,8 @@ def get_PoolManager():
     if MYPROXY:
         return urllib3.ProxyManager(
             MYPROXY,
-            num_pools=1,
+            num_pools=num_pools,
+            maxsize=maxsize,
             headers=MYHEADERS,
             timeout=15,
             cert_reqs="CERT_REQUIRED",
@@ -3967,7 +4961,8 @@ def get_PoolManager():
         )
 
     return urllib3.PoolManager(
-        num_pools=1,
+        num_pools=num_pools,
+        maxsize=maxsize,
         headers=MYHEADERS,
         timeout=15,
         cert_reqs="CERT_REQUIRED",
@@ -3975,17 +4970,298 @@ def get_PoolManager():
     )
 
 
+class SharedPoolManager:
+    """Process-wide keep-alive pool manager shared by all network calls.
+
+    Creating a pool manager loads the CA bundle, and clearing it drops the
+    connections and TLS sessions. One manager per proxy setting is kept
+    instead, so repeated fetches from the same hosts reuse their sockets.
+    urllib3 pool managers are thread-safe.
+    """
+
+    def __init__(self, num_pools: int = POOL_NUM_POOLS, maxsize: int = POOL_MAXSIZE):
+        self._lock = threading.Lock()
+        self._managers: Dict[Tuple, urllib3.PoolManager] = {}
+        self.num_pools = num_pools
+        self.maxsize = maxsize
+
+    def get(self) -> urllib3.PoolManager:
+        """Pool manager for the current proxy settings."""
+        if not MYHEADERS:
+            gen_headers()
+        key = (MYPROXY, os.getenv("BUKU_CA_CERTS", default=CA_CERTS))
+        with self._lock:
+            manager = self._managers.get(key)
+            if manager is None:
+                manager = get_PoolManager(num_pools=self.num_pools, maxsize=self.maxsize)
+                self._managers[key] = manager
+            return manager
+
+    def configure(self, num_pools: Optional[int] = None, maxsize: Optional[int] = None):
+        """Change the pool sizes, open connections are closed."""
+        with self._lock:
+            if num_pools is not None:
+                self.num_pools = num_pools
+            if maxsize is not None:
+                self.maxsize = maxsize
+        self.close()
+
+    def close(self):
+        with self._lock:
+            for manager in self._managers.values():
+                manager.clear()
+            self._managers.clear()
+
+
+shared_pool = SharedPoolManager()
+atexit.register(shared_pool.close)
+
+
+create_metadata_cache_sql = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    title TEXT,
+    desc TEXT,
+    keywords TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    checked REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_checked_idx ON pages(checked);
+"""
+
+CachedPage = collections.namedtuple(
+    "CachedPage", "title desc keywords etag last_modified checked"
+)
+
+
+class MetadataCache:
+    """On-disk cache of page metadata for conditional HTTP requests.
+
+    Keyed by URL, stores title, description and keywords together with the
+    ETag and Last-Modified validators of the response. Within `ttl` seconds
+    of the last check a page is served from the cache, afterwards it is
+    revalidated with If-None-Match/If-Modified-Since: a 304 response has no
+    body and skips parsing. The least recently checked pages beyond
+    `max_entries` are evicted.
+
+    The database is opened on first use and shared by all threads.
+    """
+
+    def __init__(
+        self,
+        dbfile: str,
+        ttl: float = METADATA_CACHE_TTL,
+        max_entries: int = METADATA_CACHE_SIZE,
+    ):
+        self.dbfile = dbfile
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._stores = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.dbfile)), exist_ok=True)
+            self._conn = sqlite3.connect(self.dbfile, check_same_thread=False)
+            self._conn.executescript(create_metadata_cache_sql)
+            self._conn.commit()
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = None
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        with self._lock:
+            row = (
+                self._connect()
+                .execute(
+                    "SELECT title, desc, keywords, etag, last_modified, checked "
+                    "FROM pages WHERE url = ?",
+                    (url,),
+                )
+                .fetchone()
+            )
+        return None if row is None else CachedPage(*row)
+
+    def is_fresh(self, page: CachedPage) -> bool:
+        return time.time() - page.checked < self.ttl
+
+    @staticmethod
+    def validators(page: Optional[CachedPage]) -> Dict[str, str]:
+        """Conditional request headers for a cached page."""
+        headers = {}
+        if page is not None:
+            if page.etag:
+                headers["If-None-Match"] = page.etag
+            if page.last_modified:
+                headers["If-Modified-Since"] = page.last_modified
+        return headers
+
+    def store(self, url: str, title, desc, keywords, etag=None, last_modified=None):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO pages"
+                "(url, title, desc, keywords, etag, last_modified, checked) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, title, desc, keywords, etag, last_modified, time.time()),
+            )
+            self._stores += 1
+            if self._stores % METADATA_CACHE_EVICT_EVERY == 0:
+                self._evict(conn)
+            conn.commit()
+
+    def touch(self, url: str):
+        """Mark a page as revalidated (HTTP 304)."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("UPDATE pages SET checked = ? WHERE url = ?", (time.time(), url))
+            conn.commit()
+
+    def evict(self):
+        with self._lock:
+            conn = self._connect()
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection):
+        conn.execute(
+            "DELETE FROM pages WHERE url IN "
+            "(SELECT url FROM pages ORDER BY checked DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+
+metadata_cache: Optional[MetadataCache] = None  # see enable_metadata_cache()
+
+
+def enable_metadata_cache(dbfile: str, **kwargs) -> MetadataCache:
+    """Use an on-disk metadata cache in network_handler.
+
+    Parameters
+    ----------
+    dbfile : str
+        Path of the cache database, created on first use.
+    **kwargs
+        ttl and max_entries of the MetadataCache.
+
+    Returns
+    -------
+    MetadataCache
+        The cache now used by network_handler.
+    """
+
+    global metadata_cache
+
+    if metadata_cache is not None:
+        metadata_cache.close()
+    metadata_cache = MetadataCache(dbfile, **kwargs)
+    return metadata_cache
+
+
+def disable_metadata_cache():
+    global metadata_cache
+
+    if metadata_cache is not None:
+        metadata_cache.close()
+    metadata_cache = None
+
+
+atexit.register(disable_metadata_cache)
+
+
+class RefreshScheduler:
+    """Hands out records to refresh workers, per host.
+
+    At most `limit` records of a host are in flight at a time, a counted
+    semaphore per host that never blocks: a worker finding all hosts busy
+    is done, as every host with work left is served by a busy worker. A
+    worker keeps to its host while it has records left, so the keep-alive
+    connection of its pool is reused.
+    """
+
+    def __init__(self, rows: Iterable[Tuple], limit: int):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._todo = collections.OrderedDict()  # host -> deque of rows
+        self._active = collections.Counter()  # host -> records in flight
+        for row in rows:
+            self._todo.setdefault(self.host(row[1]), collections.deque()).append(row)
+
+    @staticmethod
+    def host(url: str) -> str:
+        try:
+            return parse_url(url).host or url
+        except LocationParseError:
+            return url
+
+    def take(self, host: Optional[str] = None) -> Tuple[Optional[str], Optional[Tuple]]:
+        """Next (host, row) to fetch, (None, None) when done.
+
+        host is the host of the record the worker finished, if any.
+        """
+        with self._lock:
+            if host is not None:
+                self._active[host] -= 1
+            if host not in self._todo or self._active[host] >= self.limit:
+                host = next((h for h in self._todo if self._active[h] < self.limit), None)
+                if host is None:
+                    return None, None
+
+            rows = self._todo[host]
+            row = rows.popleft()
+            if not rows:
+                del self._todo[host]
+            self._active[host] += 1
+            return host, row
+
+
+def release_response(resp):
+    """Return the connection of a streamed response to its pool.
+
+    A small unread remainder is drained to keep the connection alive,
+    otherwise the connection is closed.
+    """
+
+    remaining = resp.length_remaining
+    if remaining is not None and remaining <= PAGE_DRAIN_LIMIT:
+        resp.drain_conn()
+    else:
+        resp.close()
+    resp.release_conn()
+
+
 def network_handler(
-    url: str, http_head: Optional[bool] = False
+    url: str,
+    http_head: Optional[bool] = False,
+    manager: Optional[urllib3.PoolManager] = None,
+    revalidate: bool = False,
+    timeout: Optional[urllib3.Timeout] = None,
 ) -> Tuple[Optional[str], Optional[str], Optional[str], int, int]:
     """Handle server connection and redirections.
 
+    With a metadata cache enabled (see enable_metadata_cache), fresh pages
+    are served from the cache and stale ones are fetched conditionally.
+
     Parameters
     ----------
     url : str
         URL to fetch.
     http_head : bool
         If True, send only HTTP HEAD request. Default is False.
+    manager : PoolManager, optional
+        Pool manager to use. Default is the process-wide shared_pool.
+    revalidate : bool
+        If True, revalidate cached pages even if they are fresh.
+        Default is False.
+    timeout : Timeout, optional
+        Connect and read timeout, failed connections are not retried.
+        Default is the timeout of the pool manager, with retries.
 
     Returns
     -------
@@ -4006,18 +5282,51 @@ def network_handler(
     else:
         method = "GET"
 
+    cache = metadata_cache if method == "GET" else None
+    cached = None
+    if cache is not None:
+        cached = cache.get(url)
+        if cached is not None and not revalidate and cache.is_fresh(cached):
+            LOGDBG("metadata cache hit: %s", url)
+            return (cached.title or "", cached.desc, cached.keywords, 0, 0)
+
     if not MYHEADERS:
         gen_headers()
 
+    cache_key = url
     try:
-        manager = get_PoolManager()
+        if manager is None:
+            manager = shared_pool.get()
+
+        headers = None
+        if cached is not None:
+            headers = dict(manager.headers, **MetadataCache.validators(cached))
+
+        kwargs = {"retries": Retry(redirect=10)}
+        if timeout is not None:
+            kwargs = {"retries": Retry(connect=0, read=0, redirect=10), "timeout": timeout}
 
         while True:
-            resp = manager.request(method, url, retries=Retry(redirect=10))
+            resp = manager.request(
+                method, url, headers=headers, preload_content=False, **kwargs
+            )
 
             if resp.status == 200:
                 if method == "GET":
                     page_title, page_desc, page_keys = get_data_from_page(resp)
+                    if cache is not None:
+                        cache.store(
+                            cache_key,
+                            page_title,
+                            page_desc,
+                            page_keys,
+                            resp.headers.get("ETag"),
+                            resp.headers.get("Last-Modified"),
+                        )
+            elif resp.status == 304 and cached is not None:
+                LOGDBG("not modified: %s", url)
+                page_title, page_desc, page_keys = cached[:3]
+                cache.touch(cache_key)
             elif resp.status == 403 and url.endswith("/"):
                 # HTTP response Forbidden
                 # Handle URLs in the form of https://www.domain.com/
@@ -4027,21 +5336,17 @@ def network_handler(
                 LOGDBG("Received status 403: retrying...")
                 # Remove trailing /
                 url = url[:-1]
-                resp.close()
+                release_response(resp)
                 continue
             else:
                 LOGERR("[%s] %s", resp.status, resp.reason)
 
-            if resp:
-                resp.close()
-
+            release_response(resp)
             break
     except Exception as e:
         LOGERR("network_handler(): %s", e)
         exception = True
     finally:
-        if manager:
-            manager.clear()
         if exception:
             return (None, None, None, 0, 0)
         if method == "HEAD":
@@ -4112,6 +5417,78 @@ def parse_tags(keywords=[]):
     return delim_wrap(DELIM.join(unique_tags))
 
 
+def merge_tags(tags: Optional[str], new_tags: Optional[str]) -> Optional[str]:
+    """Append new tags to a tagset, as append_tag_at_index does.
+
+    Registered as SQL function MERGE_TAGS for the bulk import upsert.
+
+    Parameters
+    ----------
+    tags : str
+        Delimiter wrapped tagset of a bookmark.
+    new_tags : str
+        Delimiter wrapped tags to append.
+
+    Returns
+    -------
+    str
+        Merged, sorted tagset.
+    """
+
+    if new_tags is None or new_tags == DELIM:
+        return tags
+    return parse_tags([(tags or DELIM) + new_tags[1:]])
+
+
+def is_busy_error(e: Exception) -> bool:
+    """True if e is SQLite failing on a locked DB (SQLITE_BUSY)."""
+
+    if not isinstance(e, sqlite3.OperationalError):
+        return False
+    code = getattr(e, "sqlite_errorcode", None)  # Python 3.11+
+    if code is not None:
+        return code & 0xFF == sqlite3.SQLITE_BUSY
+    return "database is locked" in str(e)
+
+
+def retry_busy(
+    func: Callable[[], Any],
+    retries: Optional[int] = None,
+    rollback: Optional[Callable[[], None]] = None,
+) -> Any:
+    """Call func, again after a backoff while it fails with SQLITE_BUSY.
+
+    Parameters
+    ----------
+    func : callable
+        Function without arguments, safe to repeat.
+    retries : int, optional
+        Retries after the first call. Default is DB_BUSY_RETRIES.
+    rollback : callable, optional
+        Called before each retry, to end a failed transaction.
+
+    Returns
+    -------
+    Any
+        Result of func.
+    """
+
+    if retries is None:
+        retries = DB_BUSY_RETRIES
+    delay = DB_BUSY_BACKOFF
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except sqlite3.OperationalError as e:
+            if attempt == retries or not is_busy_error(e):
+                raise
+            LOGDBG("DB busy, retrying in %.2fs: %s", delay, e)
+            if rollback is not None:
+                rollback()
+            time.sleep(delay)
+            delay *= 2
+
+
 def prep_tag_search(tags: str) -> Tuple[List[str], Optional[str], Optional[str]]:
     """Prepare list of tags to search and determine search operator.
 
@@ -4959,10 +6336,22 @@ def regexp(expr, item):
     """
 
     if expr is None or item is None:
-        LOGDBG("expr: [%s], item: [%s]", expr, item)
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            LOGDBG("expr: [%s], item: [%s]", expr, item)
         return False
 
-    return re.search(expr, item, re.IGNORECASE) is not None
+    return regexp_compile(expr).search(item) is not None
+
+
+@functools.lru_cache(maxsize=REGEXP_CACHE_SIZE)
+def regexp_compile(expr):
+    """Compile a case-insensitive pattern for regexp().
+
+    SQLite calls regexp() for every row and column, the pattern is compiled
+    once per query. Hit/miss counters: regexp_compile.cache_info().
+    """
+
+    return re.compile(expr, re.IGNORECASE)
 
 
 def delim_wrap(token):
@@ -0,0 +1,52 @@
+import sys
+from enum import Enum
+from pathlib import Path
+
+import typer
+
+from vimania_uri.md.anchor_cache import get_anchor_cache
+from vimania_uri.md.link_checker import (
+    check_links,
+    format_json,
+    format_quickfix,
+    urllib3_fetcher,
+)
+
+app = typer.Typer()
+
+
+class OutputFormat(str, Enum):
+    quickfix = "quickfix"
+    json = "json"
+
+
+@app.callback()
+def main():
+    """vimania-uri command line tools"""
+
+
+@app.command("check-links")
+def check_links_cmd(
+    root: Path = typer.Argument(..., exists=True, file_okay=False),
+    output: OutputFormat = typer.Option(OutputFormat.quickfix, "--format", "-f"),
+    http: bool = typer.Option(False, "--http", help="also check http(s) URLs"),
+    timeout: float = typer.Option(10.0, help="http timeout in seconds"),
+    workers: int = typer.Option(16, help="size of the thread pool"),
+    cache: bool = typer.Option(True, help="use and fill the on-disk anchor cache"),
+):
+    """Check all links of the markdown files under ROOT.
+
+    The quickfix output can be loaded into vim with `:cfile`.
+    """
+    fetcher = urllib3_fetcher(timeout) if http else None
+    broken = check_links(
+        root,
+        workers=workers,
+        fetcher=fetcher,
+        anchor_cache=get_anchor_cache() if cache else None,
+    )
+    if output == OutputFormat.json:
+        typer.echo(format_json(broken))
+    else:
+        sys.stdout.write(format_quickfix(broken))
+    raise typer.Exit(1 if broken else 0)
@@ -1,4 +1,5 @@
 import logging
+import os
 from pathlib import Path
 from typing import Optional
 
@@ -11,6 +12,11 @@ ROOT_DIR = Path(__file__).parent.absolute()
 class Environment(BaseSettings):
     log_level: str = "INFO"
     twbm_db_url: Optional[str] = None  # = f"sqlite:///{ROOT_DIR}/db/bm.db"
+    twbm_db_tuned: bool = False  # WAL mode and tuned pragmas, see BukuDb.initdb
+    vimania_notes_root: Optional[str] = None  # markdown tree covered by the on-disk indexes
+    vimania_cache_dir: str = str(
+        Path(os.getenv("XDG_CACHE_HOME", Path.home() / ".cache")) / "vimania-uri"
+    )
 
     @property
     def dbfile_twbm(self):
@@ -18,6 +24,12 @@ class Environment(BaseSettings):
             return None
         return f"{self.twbm_db_url.split('sqlite:///')[-1]}"
 
+    @property
+    def notes_root_path(self) -> Optional[Path]:
+        if not self.vimania_notes_root:
+            return None
+        return Path(os.path.expandvars(self.vimania_notes_root)).expanduser().absolute()
+
     @property
     def is_installed_twbm(self):
         return self.twbm_db_url is not None
@@ -0,0 +1,113 @@
+import collections
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+import urllib3
+
+from vimania_uri.buku import network_handler
+
+_log = logging.getLogger("vimania-uri.helper.url_title")
+
+URL_TITLE_TIMEOUT = urllib3.Timeout(connect=2.0, read=3.0)
+URL_TITLE_MEMORY_SIZE = 256  # recently resolved titles kept in memory
+URL_TITLE_WORKERS = 2
+
+
+class TitleResolver:
+    """Page titles for pasted URLs with bounded latency.
+
+    Titles are looked up in memory, then fetched via network_handler: only
+    the head of the page is read, with connect/read timeouts, and the
+    metadata cache on disk is used if enabled. Without a title the URL
+    itself is returned.
+
+    `resolve_async` returns at once; titles fetched in the background are
+    collected in `results` as (key, url, title) and picked up by a Vim
+    timer (see VimaniaUriManager.poll_url_title).
+    """
+
+    def __init__(
+        self,
+        timeout: urllib3.Timeout = URL_TITLE_TIMEOUT,
+        maxsize: int = URL_TITLE_MEMORY_SIZE,
+    ):
+        self.timeout = timeout
+        self.maxsize = maxsize
+        self._titles: collections.OrderedDict = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.results: collections.deque = collections.deque()
+
+    @property
+    def idle(self) -> bool:
+        return self._pending == 0
+
+    def cached(self, url: str) -> Optional[str]:
+        with self._lock:
+            title = self._titles.get(url)
+            if title is not None:
+                self._titles.move_to_end(url)
+            return title
+
+    def _remember(self, url: str, title: str):
+        with self._lock:
+            self._titles[url] = title
+            self._titles.move_to_end(url)
+            while len(self._titles) > self.maxsize:
+                self._titles.popitem(last=False)
+
+    def fetch(self, url: str) -> Optional[str]:
+        """Title of the page at url, None if there is none."""
+        title, *_ = network_handler(url, timeout=self.timeout)
+        title = title.strip() if title else None
+        if title:
+            self._remember(url, title)
+        return title
+
+    def resolve(self, url: str) -> str:
+        """Title of the page at url, the url if there is none."""
+        title = self.cached(url)
+        if title is None:
+            title = self.fetch(url)
+        return title or url
+
+    def resolve_async(self, url: str, key: Tuple = ()) -> Optional[str]:
+        """Title from memory, or None and fetch it in the background.
+
+        The fetched title (the url if there is none) is appended to `results`
+        together with key.
+        """
+        title = self.cached(url)
+        if title is not None:
+            return title
+
+        with self._lock:
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    URL_TITLE_WORKERS, thread_name_prefix="url-title"
+                )
+        self._executor.submit(self._run, url, key)
+        return None
+
+    def _run(self, url: str, key: Tuple):
+        title = None
+        try:
+            title = self.fetch(url)
+        except Exception as e:
+            _log.error(f"Error fetching title of {url=}: {e}")
+        finally:
+            self.results.append((key, url, title or url))
+            with self._lock:
+                self._pending -= 1
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+resolver = TitleResolver()
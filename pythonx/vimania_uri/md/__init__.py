@@ -1 +1,2 @@
+from .link_index import LinkIndex
 from .mdnav import URI, open_uri, parse_line
@@ -0,0 +1,130 @@
+import json
+import logging
+import os
+import sqlite3
+from pathlib import Path
+from typing import Iterator, Optional
+
+from vimania_uri.environment import config
+from vimania_uri.md.mdnav import AnchorTable, JumpToAnchor
+
+_log = logging.getLogger("vimania-uri.md.anchor_cache")
+
+create_table_sql = """
+CREATE TABLE IF NOT EXISTS anchor_tables (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+"""
+
+
+def walk_markdown(root: Path) -> Iterator[Path]:
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        for filename in filenames:
+            if filename.endswith(".md"):
+                yield Path(dirpath) / filename
+
+
+def read_lines(path: Path):
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read().splitlines()
+
+
+class AnchorCache:
+    """On-disk anchor tables of markdown files, keyed by path, mtime and size.
+
+    Resolves `other.md#section` to a line number without opening the file in
+    vim. A table is only re-parsed when mtime or size of the file changed.
+    """
+
+    def __init__(self, dbfile: str):
+        Path(dbfile).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(dbfile)
+        self.conn.execute(create_table_sql)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def table(self, path: Path) -> Optional[AnchorTable]:
+        path = Path(path).absolute()
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+
+        row = self.conn.execute(
+            "SELECT mtime_ns, size, data FROM anchor_tables WHERE path = ?", (str(path),)
+        ).fetchone()
+        if row is not None and (row[0], row[1]) == (st.st_mtime_ns, st.st_size):
+            return AnchorTable.load(json.loads(row[2]))
+
+        _log.debug(f"indexing anchors of {path}")
+        table = AnchorTable(read_lines(path))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO anchor_tables(path, mtime_ns, size, data) VALUES (?, ?, ?, ?)",
+            (str(path), st.st_mtime_ns, st.st_size, json.dumps(table.dump())),
+        )
+        self.conn.commit()
+        return table
+
+    def resolve(self, path: Path, anchor: str) -> Optional[int]:
+        """0-based line of anchor in path, None if file or anchor not found"""
+        table = self.table(path)
+        if table is None:
+            return None
+        return table.find(JumpToAnchor.norm_target(anchor))
+
+    def index_tree(self, root: Path) -> int:
+        """Bring the cache up to date for all markdown files under root.
+
+        Returns the number of indexed files.
+        """
+        root = Path(root).absolute()
+        count = 0
+        seen = set()
+        for path in walk_markdown(root):
+            self.table(path)
+            seen.add(str(path))
+            count += 1
+
+        stale = [
+            p
+            for (p,) in self.conn.execute(
+                "SELECT path FROM anchor_tables WHERE substr(path, 1, length(?1)) = ?1",
+                (str(root) + os.sep,),
+            )
+            if p not in seen
+        ]
+        self.conn.executemany(
+            "DELETE FROM anchor_tables WHERE path = ?", [(p,) for p in stale]
+        )
+        self.conn.commit()
+        return count
+
+
+_cache: Optional[AnchorCache] = None
+
+
+def get_anchor_cache() -> AnchorCache:
+    global _cache
+    if _cache is None:
+        _cache = AnchorCache(str(Path(config.vimania_cache_dir) / "anchors.db"))
+    return _cache
+
+
+def resolve_anchor(path: str, anchor: str) -> Optional[int]:
+    """Line of anchor in a markdown file under the configured notes root.
+
+    Returns None if no notes root is configured, the file is outside of it or
+    the anchor cannot be found.
+    """
+    root = config.notes_root_path
+    if root is None or not path.endswith(".md"):
+        return None
+    if not Path(path).absolute().is_relative_to(root):
+        return None
+    return get_anchor_cache().resolve(Path(path), anchor)
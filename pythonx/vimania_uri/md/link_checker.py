@@ -0,0 +1,158 @@
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import urllib3
+
+from vimania_uri.md.anchor_cache import AnchorCache, read_lines, walk_markdown
+from vimania_uri.md.link_graph import Link, extract_links
+from vimania_uri.md.mdnav import AnchorTable, JumpToAnchor, has_scheme
+
+_log = logging.getLogger("vimania-uri.md.link_checker")
+
+STAT_BATCH_SIZE = 256
+
+# returns an error message for a broken URL, None if it is fine
+Fetcher = Callable[[str], Optional[str]]
+
+
+@dataclass(frozen=True)
+class BrokenLink:
+    source: str
+    line: int  # 0-based
+    target: str
+    message: str
+
+    def quickfix(self) -> str:
+        """Line in vim's default errorformat: `file:lnum: message`"""
+        return f"{self.source}:{self.line + 1}: {self.target}: {self.message}"
+
+
+def urllib3_fetcher(timeout: float = 10.0) -> Fetcher:
+    """HEAD request (GET if HEAD is not allowed), 4xx/5xx and errors are broken"""
+    manager = urllib3.PoolManager(
+        timeout=urllib3.Timeout(connect=timeout, read=timeout),
+        retries=urllib3.Retry(total=2, redirect=10),
+    )
+
+    def fetch(url: str) -> Optional[str]:
+        try:
+            resp = manager.request("HEAD", url)
+            if resp.status in (405, 501):
+                resp = manager.request("GET", url, preload_content=False)
+                resp.release_conn()
+        except Exception as e:
+            return str(e)
+        if resp.status >= 400:
+            return f"HTTP {resp.status}"
+        return None
+
+    return fetch
+
+
+def _stat_batch(paths: Sequence[str]) -> Dict[str, bool]:
+    return {p: os.path.exists(p) for p in paths}
+
+
+def _chunks(items: Sequence, size: int) -> Iterable[Sequence]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _has_checkable_anchor(link: Link) -> bool:
+    """Only markdown targets have a heading index, as for resolve_anchor.
+
+    Fragments of other files (`doc.pdf#page=2`, `script.py#L1`) are not checked.
+    """
+    return bool(link.anchor) and link.target_path.endswith(".md")
+
+
+def _anchor_table(path: str) -> Optional[AnchorTable]:
+    try:
+        return AnchorTable(read_lines(Path(path)))
+    except OSError:
+        return None
+
+
+def check_links(
+    root: Path,
+    *,
+    workers: int = 16,
+    fetcher: Optional[Fetcher] = None,
+    anchor_cache: Optional[AnchorCache] = None,
+) -> List[BrokenLink]:
+    """Check all links of the markdown files under root without opening them in vim.
+
+    Local targets are checked with batched os.stat calls on a thread pool,
+    `#anchor` targets of markdown files against the heading index of the target
+    file (built once per target). With an anchor_cache, the indexes are read from and stored
+    in it, so unchanged targets are not parsed again.
+    URLs are only checked if a fetcher is given.
+
+    Relative targets are resolved against the linking file, see
+    link_graph.resolve_target.
+    """
+    files = list(walk_markdown(Path(root).absolute()))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        links: List[Link] = [
+            link
+            for file_links in pool.map(
+                lambda p: list(extract_links(p, read_lines(p))), files
+            )
+            for link in file_links
+        ]
+
+        local = sorted({link.target_path for link in links if link.target_path})
+        exists: Dict[str, bool] = {}
+        for batch in pool.map(_stat_batch, _chunks(local, STAT_BATCH_SIZE)):
+            exists.update(batch)
+
+        anchored = sorted(
+            {
+                link.target_path
+                for link in links
+                if _has_checkable_anchor(link) and exists.get(link.target_path)
+            }
+        )
+        if anchor_cache is not None:
+            # sqlite connection of the cache is bound to this thread
+            tables = {p: anchor_cache.table(Path(p)) for p in anchored}
+        else:
+            tables = dict(zip(anchored, pool.map(_anchor_table, anchored)))
+
+        url_status: Dict[str, Optional[str]] = {}
+        if fetcher is not None:
+            urls = sorted({link.target for link in links if has_scheme(link.target)})
+            url_status = dict(zip(urls, pool.map(fetcher, urls)))
+
+    broken = []
+    for link in links:
+        message = None
+        if link.target_path is not None:
+            if not exists[link.target_path]:
+                message = "file not found"
+            elif _has_checkable_anchor(link):
+                table = tables.get(link.target_path)
+                needle = JumpToAnchor.norm_target(link.anchor)
+                if table is None or table.find(needle) is None:
+                    message = f"anchor #{link.anchor} not found"
+        elif link.target in url_status:
+            message = url_status[link.target]
+
+        if message is not None:
+            broken.append(BrokenLink(link.source, link.line, link.target, message))
+
+    _log.debug(f"checked {len(links)} links in {len(files)} files, {len(broken)} broken")
+    return broken
+
+
+def format_quickfix(broken: Sequence[BrokenLink]) -> str:
+    return "".join(f"{b.quickfix()}\n" for b in broken)
+
+
+def format_json(broken: Sequence[BrokenLink]) -> str:
+    return json.dumps([asdict(b) for b in broken], indent=2)
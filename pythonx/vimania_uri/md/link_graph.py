@@ -0,0 +1,199 @@
+import logging
+import os
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence
+
+from vimania_uri.environment import config
+from vimania_uri.md.anchor_cache import read_lines, walk_markdown
+from vimania_uri.md.mdnav import has_scheme, parse_uri
+from vimania_uri.pattern import (
+    LINK_PATTERN,
+    MD_LINK_PATTERN,
+    REFERENCE_DEFINITION_PATTERN,
+    URL_PATTERN,
+)
+
+_log = logging.getLogger("vimania-uri.md.link_graph")
+
+create_tables_sql = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS links (
+    src_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    line INTEGER NOT NULL,
+    target TEXT NOT NULL,
+    target_path TEXT,
+    anchor TEXT
+);
+CREATE INDEX IF NOT EXISTS links_src_idx ON links(src_id);
+CREATE INDEX IF NOT EXISTS links_target_path_idx ON links(target_path);
+"""
+
+
+@dataclass(frozen=True)
+class Link:
+    source: str  # absolute path of the linking file
+    line: int  # 0-based line of the link in source
+    target: str  # link target as written
+    target_path: Optional[str] = None  # absolute path for local targets, None for URLs
+    anchor: Optional[str] = None
+
+
+def resolve_target(source: Path, target: str) -> Optional[str]:
+    """Absolute path of a local link target, relative targets resolved against source.
+
+    Same resolution as navigation (ParsedPath.resolve), except for the base of
+    relative targets: `go` resolves them against vim's cwd, which is unknown
+    offline. Both agree when vim's cwd is the directory of the linking file.
+    """
+    for prefix in ("|filename|", "{filename}"):
+        if target.startswith(prefix):
+            target = target[len(prefix) :]
+    if target.startswith("#"):
+        return str(source)
+    return parse_uri(target).resolve(source.parent)
+
+
+def extract_links(source: Path, lines: Sequence[str]) -> Iterator[Link]:
+    """All links of a markdown document: markdown links, reference definitions and bare URLs.
+
+    Reference style usages `[text][ref]` are represented by their definition.
+    """
+    for row, line in enumerate(lines):
+        m = REFERENCE_DEFINITION_PATTERN.match(line)
+        if m is not None:
+            targets = [m.group("link").strip()]
+            covered = [(0, len(line))]
+        else:
+            targets, covered = [], []
+            for m in MD_LINK_PATTERN.finditer(line):
+                # LINK_PATTERN splits `[text](target)` the same way parse_line does
+                link = LINK_PATTERN.match(line[m.start() :])
+                if link is not None and link.group("direct") is not None:
+                    targets.append(link.group("direct").strip())
+                    covered.append((m.start(), m.end()))
+
+        for m in URL_PATTERN.finditer(line):
+            if not any(start <= m.start() < end for start, end in covered):
+                targets.append(m.group())
+
+        for target in targets:
+            if not target:
+                continue
+            if has_scheme(target):
+                yield Link(str(source), row, target)
+            else:
+                yield Link(
+                    str(source),
+                    row,
+                    target,
+                    target_path=resolve_target(source, target),
+                    anchor=target[1:] if target.startswith("#") else parse_uri(target).anchor,
+                )
+
+
+class LinkGraph:
+    """Forward and backlink graph of a markdown notes tree in SQLite.
+
+    `update` re-extracts only files whose mtime or size changed, so keeping
+    the graph current costs a stat per file. Backlink queries use the index on
+    the resolved target path.
+    """
+
+    def __init__(self, dbfile: str):
+        Path(dbfile).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(dbfile)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(create_tables_sql)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def update(self, root: Path) -> int:
+        """Synchronize the graph with the markdown files under root.
+
+        Returns the number of (re-)indexed files.
+        """
+        root = Path(root).absolute()
+        known = {
+            path: (id_, mtime_ns, size)
+            for id_, path, mtime_ns, size in self.conn.execute(
+                "SELECT id, path, mtime_ns, size FROM files "
+                "WHERE substr(path, 1, length(?1)) = ?1",
+                (str(root) + os.sep,),
+            )
+        }
+
+        count = 0
+        with self.conn:
+            for path in walk_markdown(root):
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                entry = known.pop(str(path), None)
+                if entry is not None and entry[1:] == (st.st_mtime_ns, st.st_size):
+                    continue
+                self._index_file(path, st, None if entry is None else entry[0])
+                count += 1
+
+            # files removed from disk, links are deleted by cascade
+            self.conn.executemany(
+                "DELETE FROM files WHERE id = ?", [(e[0],) for e in known.values()]
+            )
+        _log.debug(f"link graph: {count} file(s) indexed, {len(known)} removed")
+        return count
+
+    def _index_file(self, path: Path, st: os.stat_result, id_: Optional[int]):
+        if id_ is None:
+            id_ = self.conn.execute(
+                "INSERT INTO files(path, mtime_ns, size) VALUES (?, ?, ?)",
+                (str(path), st.st_mtime_ns, st.st_size),
+            ).lastrowid
+        else:
+            self.conn.execute(
+                "UPDATE files SET mtime_ns = ?, size = ? WHERE id = ?",
+                (st.st_mtime_ns, st.st_size, id_),
+            )
+            self.conn.execute("DELETE FROM links WHERE src_id = ?", (id_,))
+
+        self.conn.executemany(
+            "INSERT INTO links(src_id, line, target, target_path, anchor) VALUES (?, ?, ?, ?, ?)",
+            (
+                (id_, link.line, link.target, link.target_path, link.anchor)
+                for link in extract_links(path, read_lines(path))
+            ),
+        )
+
+    def forward_links(self, path: Path) -> List[Link]:
+        """Links from path"""
+        return self._query("WHERE f.path = ?", str(Path(path).absolute()))
+
+    def backlinks(self, path: Path) -> List[Link]:
+        """Links pointing to path (who links here)"""
+        return self._query("WHERE l.target_path = ?", os.path.normpath(Path(path).absolute()))
+
+    def _query(self, where: str, arg: str) -> List[Link]:
+        qry = (
+            "SELECT f.path, l.line, l.target, l.target_path, l.anchor "
+            "FROM links l JOIN files f ON f.id = l.src_id "
+            f"{where} ORDER BY f.path, l.line"
+        )
+        return [Link(*row) for row in self.conn.execute(qry, (arg,))]
+
+
+_graph: Optional[LinkGraph] = None
+
+
+def get_link_graph() -> LinkGraph:
+    global _graph
+    if _graph is None:
+        _graph = LinkGraph(str(Path(config.vimania_cache_dir) / "links.db"))
+    return _graph
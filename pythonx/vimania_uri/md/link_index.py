@@ -0,0 +1,68 @@
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from vimania_uri.pattern import REFERENCE_DEFINITION_PATTERN
+
+_log = logging.getLogger("vimania-uri.md.link_index")
+
+
+def parse_reference_definition(line: str) -> Optional[Tuple[str, str]]:
+    m = REFERENCE_DEFINITION_PATTERN.match(line)
+    if m is None:
+        return None
+    return m.group("label"), m.group("link").strip()
+
+
+class LinkIndex:
+    """Per-buffer index of reference definitions.
+
+    Built once per buffer and kept current with `update` from the changed line
+    ranges reported by vim (listener_add), so resolving `[text][ref]` is a dict
+    lookup instead of a regex scan over all lines. The link under the cursor is
+    found by the tokenizer, see mdnav.parse_line.
+    """
+
+    def __init__(self, lines: Sequence[str]):
+        self._defs: List[Optional[Tuple[str, str]]] = []
+        self._refs: Dict[str, List[str]] = {}  # label -> targets of all definitions
+        self.update(0, 0, lines)
+
+    def __len__(self):
+        return len(self._defs)
+
+    def update(self, start: int, end: int, new_lines: Sequence[str]) -> None:
+        """Replace the index of lines [start, end) by the index of new_lines.
+
+        Mirrors the listener_add callback: 0-based first changed line, first line
+        below the change (before the change) and the new content of the range.
+        """
+        for definition in self._defs[start:end]:
+            if definition is not None:
+                self._remove_ref(*definition)
+
+        defs = [parse_reference_definition(line) for line in new_lines]
+        for definition in defs:
+            if definition is not None:
+                self._refs.setdefault(definition[0], []).append(definition[1])
+
+        self._defs[start:end] = defs
+
+    def _remove_ref(self, label: str, target: str):
+        targets = self._refs[label]
+        targets.remove(target)
+        if not targets:
+            del self._refs[label]
+
+    def resolve(self, label: str) -> Optional[str]:
+        """Target of reference definition `[label]: target`, first definition wins"""
+        targets = self._refs.get(label)
+        if not targets:
+            return None
+        if len(targets) == 1:
+            return targets[0]
+
+        # duplicate definitions: buffer order decides
+        for definition in self._defs:
+            if definition is not None and definition[0] == label:
+                return definition[1]
+        return None
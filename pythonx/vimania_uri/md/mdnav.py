@@ -1,5 +1,6 @@
 from __future__ import print_function
 
+import bisect
 import logging
 import os.path
 import re
@@ -8,12 +9,14 @@ import sys
 import webbrowser
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Callable, NewType, Optional, Tuple
+from typing import Callable, Dict, NewType, Optional, Tuple
 
-from vimania_uri.bms.handler import add_twbm
+from vimania_uri.bms.handler import enqueue_twbm
 from vimania_uri.environment import config
 from vimania_uri.exception import VimaniaException
-from vimania_uri.pattern import URL_PATTERN, MD_LINK_PATTERN, LINK_PATTERN, REFERENCE_DEFINITION_PATTERN
+from vimania_uri.md.link_index import LinkIndex
+from vimania_uri.md.tokenizer import TokenKind, tokenize
+from vimania_uri.pattern import URL_PATTERN, MD_LINK_PATTERN, REFERENCE_DEFINITION_PATTERN
 
 try:
     from urllib.parse import urlparse
@@ -34,11 +37,23 @@ class ParsedPath(object):
 
     @property
     def fullpath(self) -> str:
+        """Path opened by navigation: relative paths are resolved against vim's cwd"""
+        return self.resolve()
+
+    def resolve(self, base: Optional[Path] = None) -> str:
+        """Absolute, normalized path, a relative path is resolved against base (default: cwd).
+
+        Shared by navigation (`fullpath`) and the link graph, which resolves
+        against the directory of the linking file instead.
+        """
         if self.path is None or self.path == "":
             return ""
         if self.scheme is not None:
             return self.path
-        return str(Path(os.path.expandvars(self.path)).expanduser().absolute())
+        p = Path(os.path.expandvars(self.path)).expanduser()
+        if not p.is_absolute():
+            p = (Path.cwd() if base is None else base) / p
+        return os.path.normpath(p)
 
 
 def parse_uri(uri: URI) -> ParsedPath:
@@ -106,10 +121,9 @@ def open_uri(
             raise VimaniaException(
                 f"Environment variable TWBM_DB_URL not set. Required for twbm integration"
             )
-        id_ = add_twbm(str(target))
-        if id_ != -1:
-            return_message = f"new added twbm url: {id_=}"
-            _log.info(f"twbm added: {id_}")
+        # persisted in the background, opening must not wait for DB and network
+        enqueue_twbm(str(target))
+        _log.info(f"twbm queued: {target}")
 
     if has_scheme(target):
         _log.debug(f"has scheme -> open in browser: {target=}")
@@ -189,6 +203,13 @@ class VimOpen(Action):
             # raise FileNotFoundError(f"{path.fullpath=} does not exists")
         _log.debug(f"Opening {path.fullpath=}")
 
+        anchor_line = None
+        if path.anchor is not None:
+            from vimania_uri.md.anchor_cache import resolve_anchor
+
+            # resolved from the on-disk cache, the target need not be parsed after opening
+            anchor_line = resolve_anchor(path.fullpath, path.anchor)
+
         # TODO: make space handling more robust?
         p_sanitized = path.fullpath.replace(" ", "\\ ")
         vim.command(f"tabnew {p_sanitized}")
@@ -203,19 +224,31 @@ class VimOpen(Action):
                 vim.current.window.cursor = (line, 0)
 
         if path.anchor is not None:
-            JumpToAnchor(URI(path.anchor))()
+            # a modified buffer may differ from the file on disk
+            if anchor_line is not None and not int(vim.eval("&modified")):
+                vim.current.window.cursor = (anchor_line + 1, 0)
+            else:
+                JumpToAnchor(URI(path.anchor))()
 
 
 class JumpToAnchor(Action):
     HEADING_PATTERN = re.compile(r"^#+(?P<title>.*)$")
     ATTR_LIST_PATTERN = re.compile(r"{:\s+#(?P<id>\S+)\s")
+    PUNCTUATION_TO_REMOVE = str.maketrans(
+        "", "", "!\"#$%&'()*+,./:;<=>?@[\\]^_`{|}~"  # string.punctuation, keep -
+    )
+
+    # bufnr -> (changedtick, AnchorTable)
+    _tables: Dict[int, Tuple[int, "AnchorTable"]] = {}
 
     def __call__(self):
         # noinspection PyUnresolvedReferences
         import vim
 
         _log.debug(f"{self.target=}")
-        line = self.find_anchor(self.target, vim.current.buffer)
+        buffer = vim.current.buffer
+        table = self.anchor_table(buffer, int(vim.eval("b:changedtick")))
+        line = table.find(self.norm_target(self.target))
         _log.debug(f"{line=}")
 
         if line is None:
@@ -223,30 +256,24 @@ class JumpToAnchor(Action):
 
         vim.current.window.cursor = (line + 1, 0)
 
+    @classmethod
+    def anchor_table(cls, buffer, changedtick: int) -> "AnchorTable":
+        """AnchorTable of buffer, rebuilt only when the buffer changed"""
+        entry = cls._tables.get(buffer.number)
+        if entry is None or entry[0] != changedtick:
+            entry = (changedtick, AnchorTable(buffer))
+            cls._tables[buffer.number] = entry
+        return entry[1]
+
     @classmethod
     def find_anchor(cls, target, buffer) -> int:
         needle = cls.norm_target(target)
         _log.debug(f"{target=}, {needle=}, {buffer=}")
+        return AnchorTable(buffer).find(needle)
 
-        for (idx, line) in enumerate(buffer):
-            m = cls.HEADING_PATTERN.match(line)
-            if m is not None:
-                title = m.group("title")
-                anchor = cls.title_to_anchor(title)
-                _log.debug(f"{title=}, {anchor=}")
-                if anchor.startswith(needle):
-                    return idx
-
-            m = cls.ATTR_LIST_PATTERN.search(line)
-            if m is not None and needle == m.group("id"):
-                return idx
-
-    @staticmethod
-    def title_to_anchor(title) -> str:
-        PUNCTUATION_TO_REMOVE = (
-            "!\"#$%&'()*+,./:;<=>?@[\\]^_`{|}~"  # string.punctuation, keep -
-        )
-        title = title.translate(str.maketrans("", "", PUNCTUATION_TO_REMOVE))
+    @classmethod
+    def title_to_anchor(cls, title) -> str:
+        title = title.translate(cls.PUNCTUATION_TO_REMOVE)
         return "-".join(fragment.lower() for fragment in title.split())
 
     # @staticmethod
@@ -260,6 +287,52 @@ class JumpToAnchor(Action):
         return cls.title_to_anchor(target)
 
 
+class AnchorTable:
+    """Headings and attr-list ids of a document mapped to line numbers.
+
+    Heading anchors are kept sorted, so the prefix match of `find` is a bisect
+    instead of a scan over all lines.
+    """
+
+    def __init__(self, lines):
+        headings = []
+        self.ids: Dict[str, int] = {}
+
+        for (idx, line) in enumerate(lines):
+            m = JumpToAnchor.HEADING_PATTERN.match(line)
+            if m is not None:
+                headings.append((JumpToAnchor.title_to_anchor(m.group("title")), idx))
+
+            m = JumpToAnchor.ATTR_LIST_PATTERN.search(line)
+            if m is not None:
+                self.ids.setdefault(m.group("id"), idx)
+
+        headings.sort()
+        self.anchors = [anchor for anchor, _ in headings]
+        self.lines = [idx for _, idx in headings]
+
+    def dump(self) -> Dict:
+        return {"anchors": self.anchors, "lines": self.lines, "ids": self.ids}
+
+    @classmethod
+    def load(cls, data: Dict) -> "AnchorTable":
+        table = cls([])
+        table.anchors, table.lines, table.ids = data["anchors"], data["lines"], data["ids"]
+        return table
+
+    def find(self, needle: str) -> Optional[int]:
+        """First line with a heading anchor starting with needle or attr id == needle"""
+        found = self.ids.get(needle)
+
+        # all anchors with prefix needle are contiguous in sort order
+        pos = bisect.bisect_left(self.anchors, needle)
+        while pos < len(self.anchors) and self.anchors[pos].startswith(needle):
+            if found is None or self.lines[pos] < found:
+                found = self.lines[pos]
+            pos += 1
+        return found
+
+
 def call(args):
     """If available use vims shell mechanism to work around display issues"""
     try:
@@ -351,56 +424,45 @@ def check_reference_link(line: str, column: int) -> Tuple[str | None, int]:
     return None, column
 
 
-def parse_line(cursor, lines) -> URI | None:
-    """Extract URI under cursor from text line"""
+def parse_line(cursor, lines, index: Optional[LinkIndex] = None) -> URI | None:
+    """Extract URI under cursor from text line
+
+    The line is tokenized once (cached), the cursor lookup is a bisect.
+    With a LinkIndex of the buffer, reference links are resolved by lookup
+    instead of scanning all lines.
+    """
     row, column = cursor
     line = lines[row]
 
     _log.debug("handle line %s (%s, %s)", line, row, column)
 
-    ### 1. Return with URL
-    link_text, rel_column = check_url(line, column)
-    if link_text is not None:
-        return URI(link_text.strip())
-
-    ### 2. Return with Markdown Reference Link
-    link_text, rel_column = check_reference_link(line, column)
-    if link_text is not None:
-        return URI(link_text.strip())
-
-    ### 3. Return with local path
-    link_text, rel_column = check_path(line, column)
-    if link_text is not None:
-        return URI(link_text)
-
-    ### 4. Parse Markdown Link
-    link_text, rel_column = select_from_start_of_link(line, column)
-
-    if not link_text:
-        _log.info("could not find link text")
+    # URL, reference definition, local path, markdown link: see LineTokens.at
+    token = tokenize(line).at(column)
+    if token is None:
+        _log.info("cursor not on a link")
         return None
 
-    m = LINK_PATTERN.match(link_text)
+    if token.kind in (TokenKind.URL, TokenKind.REFERENCE_DEFINITION):
+        return URI(token.text.strip())
 
-    if not m:
-        _log.info("does not match link pattern")
-        return None
+    if token.kind == TokenKind.PATH:
+        return URI(token.text)
 
-    if m.end("link") <= rel_column:
-        _log.info("cursor outside link")
-        return None
-
-    _log.debug("found match: %s", m.groups())
-    assert (m.group("direct") is None) != (m.group("indirect") is None)
+    _log.debug("found link: %s", token)
+    if token.direct is not None:
+        _log.debug("found direct link: %s", token.direct)
+        return token.direct
 
-    if m.group("direct") is not None:
-        _log.debug("found direct link: %s", m.group("direct"))
-        return m.group("direct")
-
-    _log.debug("follow indirect link %s", m.group("indirect"))
-    indirect_ref = m.group("indirect")
+    _log.debug("follow indirect link %s", token.indirect)
+    indirect_ref = token.indirect
     if not indirect_ref:
-        indirect_ref = m.group("text")
+        indirect_ref = token.text
+
+    if index is not None:
+        target = index.resolve(indirect_ref)
+        if target is None:
+            _log.info("could not match for indirect link")
+        return None if target is None else URI(target)
 
     indirect_link_pattern = re.compile(r"^\[" + re.escape(indirect_ref) + r"\]:(.*)$")
 
@@ -0,0 +1,140 @@
+import bisect
+from dataclasses import dataclass
+from enum import IntEnum
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+from vimania_uri.pattern import (
+    LINK_SPAN_PATTERN,
+    REFERENCE_DEFINITION_PATTERN,
+    URL_PATTERN,
+)
+
+PATH_FORBIDDEN_CHARS = frozenset("*?[]|\"'<>!")
+
+
+class TokenKind(IntEnum):
+    """Token kinds in order of precedence for the cursor lookup"""
+
+    URL = 1
+    REFERENCE_DEFINITION = 2
+    PATH = 3
+    LINK = 4
+
+
+@dataclass(frozen=True)
+class Token:
+    start: int
+    end: int  # exclusive
+    kind: TokenKind
+    text: str  # URL, path, reference definition target or link text
+    direct: Optional[str] = None  # LINK: [text](direct)
+    indirect: Optional[str] = None  # LINK: [text][indirect]
+
+
+class _Spans:
+    """Non-overlapping tokens sorted by start, looked up by bisect"""
+
+    def __init__(self, tokens: Sequence[Token]):
+        self.tokens = tokens
+        self.starts = [t.start for t in tokens]
+
+    def at(self, column: int) -> Optional[Token]:
+        pos = bisect.bisect_right(self.starts, column) - 1
+        if pos >= 0 and column < self.tokens[pos].end:
+            return self.tokens[pos]
+        return None
+
+
+class LineTokens:
+    """All link candidates of one line, computed once per line.
+
+    Reproduces the precedence of the former probe sequence in parse_line:
+    URL, reference definition, local path, markdown link.
+    """
+
+    def __init__(self, line: str):
+        self.line = line
+        self.urls = _Spans(self._urls(line))
+        m = REFERENCE_DEFINITION_PATTERN.match(line)
+        self.reference_definition = None if m is None else m.group("link")
+        self.paths = _Spans(self._paths(line))
+        self.links = _Spans(self._links(line))
+
+    @staticmethod
+    def _urls(line: str) -> List[Token]:
+        # URLs ending with ')' are markdown links, handled as LINK
+        return [
+            Token(m.start(), m.end(), TokenKind.URL, m.group())
+            for m in URL_PATTERN.finditer(line)
+            if not m.group().endswith(")")
+        ]
+
+    @staticmethod
+    def _paths(line: str) -> List[Token]:
+        # space separated words without glob/quote/markup characters
+        tokens = []
+        start = 0
+        for word in line.split(" "):
+            if word and PATH_FORBIDDEN_CHARS.isdisjoint(word):
+                tokens.append(Token(start, start + len(word), TokenKind.PATH, word))
+            start += len(word) + 1
+        return tokens
+
+    @staticmethod
+    def _links(line: str) -> List[Token]:
+        """Markdown links, valid for the cursor between a '[' and the next '['.
+
+        A cursor belongs to the nearest '[' to its left (or under it). If that
+        '[' directly follows ']', the link starts at the '[' before: the cursor
+        is on the label part of `[text][label]`.
+        """
+        brackets = [i for i, c in enumerate(line) if c == "["]
+        tokens = []
+        for i, bracket in enumerate(brackets):
+            start = bracket
+            if bracket != 0 and line[bracket - 1] == "]" and i > 0:
+                start = brackets[i - 1]
+
+            m = LINK_SPAN_PATTERN.match(line, start)
+            if m is None:
+                continue
+            end = m.end()
+            if i + 1 < len(brackets):
+                end = min(end, brackets[i + 1])
+            if bracket < end:
+                tokens.append(
+                    Token(
+                        bracket,
+                        end,
+                        TokenKind.LINK,
+                        m.group("text"),
+                        direct=m.group("direct"),
+                        indirect=m.group("indirect"),
+                    )
+                )
+        return tokens
+
+    def at(self, column: int) -> Optional[Token]:
+        """Token under the cursor, None if the cursor is not on a link"""
+        token = self.urls.at(column)
+        if token is not None:
+            return token
+
+        if self.reference_definition is not None:
+            return Token(
+                0, len(self.line), TokenKind.REFERENCE_DEFINITION, self.reference_definition
+            )
+
+        if column < len(self.line) and self.line[column] != "\t":
+            token = self.paths.at(column)
+            if token is not None:
+                return token
+
+        return self.links.at(column)
+
+
+@lru_cache(maxsize=1024)
+def tokenize(line: str) -> LineTokens:
+    """Tokens of line, cached: repeated lookups on the same line only bisect"""
+    return LineTokens(line)
@@ -110,9 +110,22 @@ LINK_PATTERN = re.compile(
 REFERENCE_DEFINITION_PATTERN = re.compile(
     r"""
     ^
-        \[[^\]]*\]:             # reference def at start of line
+        \[(?P<label>[^\]]*)\]:   # reference def at start of line
         (?P<link>.*)            # interpret everything else as link text
     $
 """,
     re.VERBOSE,
 )
+LINK_SPAN_PATTERN = re.compile(
+    r"""
+    \[                          # start of link text
+        (?P<text>[^\]]*)        # link text
+    \]                          # end of link text
+    (?:
+        \((?P<direct>[^\)]*)\)  # direct target
+        |
+        \[(?P<indirect>[^\]]*)\]  # reference label
+    )
+""",
+    re.VERBOSE,
+)
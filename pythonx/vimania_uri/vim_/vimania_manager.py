@@ -1,3 +1,4 @@
+import json
 import logging
 import traceback
 from functools import wraps
@@ -5,11 +6,15 @@ from pathlib import Path
 from pprint import pprint
 from typing import Dict, Tuple
 
-import bs4
-import requests
+from urllib3.exceptions import LocationValueError
+from urllib3.util import parse_url
 from vimania_uri import md
-from vimania_uri.bms.handler import delete_twbm
+from vimania_uri.bms.handler import delete_twbm, writer
+from vimania_uri.buku import enable_metadata_cache
+from vimania_uri.environment import config
 from vimania_uri.exception import VimaniaException
+from vimania_uri.helper.url_title import resolver
+from vimania_uri.md.link_graph import get_link_graph
 from vimania_uri.pattern import URL_PATTERN
 from vimania_uri.vim_ import vim_helper
 
@@ -85,6 +90,8 @@ class VimaniaUriManager:
         self.extensions = extensions
         self.twbm_integrated = twbm_integrated
         self.plugin_root_dir = plugin_root_dir
+        self._link_indexes: Dict[int, Tuple[int, md.LinkIndex]] = {}  # bufnr -> (changedtick, index)
+        enable_metadata_cache(str(Path(config.vimania_cache_dir) / "metadata.db"))
         _log.debug(f"{extensions=}, {plugin_root_dir=}")
 
     def __repr__(self):
@@ -117,7 +124,7 @@ class VimaniaUriManager:
         lines = vim.current.buffer
 
         current_file = (vim.eval("expand('%:p')"),)
-        target = md.parse_line(cursor, lines)
+        target = md.parse_line(cursor, lines, index=self.get_link_index(lines))
         _log.debug(f"open {target=} from {current_file=}")
 
         action = md.open_uri(
@@ -129,6 +136,85 @@ class VimaniaUriManager:
         action()
         if return_message != "":
             vim.command(f"echom '{return_message}'")
+        if self.twbm_integrated and int(save_twbm) != 0:
+            # twbm is written in the background, report results via timer
+            vim.command("call timer_start(200, 'VimaniaTwbmPoll', {'repeat': -1})")
+
+    def get_link_index(self, buffer) -> md.LinkIndex:
+        """LinkIndex of buffer, kept current by vim's listener_add callbacks.
+
+        Without listener support (e.g. neovim) the index is rebuilt whenever
+        b:changedtick moved.
+        """
+        bufnr = buffer.number
+        has_listener = int(vim.eval("exists('*listener_add')"))
+        if has_listener:
+            vim.eval(f"listener_flush({bufnr})")
+        tick = int(vim.eval(f"getbufvar({bufnr}, 'changedtick')"))
+
+        entry = self._link_indexes.get(bufnr)
+        if entry is not None and entry[0] == tick and len(entry[1]) == len(buffer):
+            return entry[1]
+
+        _log.debug(f"building link index for buffer {bufnr}")
+        index = md.LinkIndex(buffer)
+        if entry is None and has_listener:
+            vim.eval(f"listener_add('VimaniaLinkIndexListener', {bufnr})")
+        self._link_indexes[bufnr] = (tick, index)
+        return index
+
+    def update_link_index(self, bufnr: int, start: int, end: int, added: int):
+        """listener_add callback: re-parse only the changed line range."""
+        entry = self._link_indexes.get(bufnr)
+        if entry is None:
+            return
+        buffer = vim.buffers[bufnr]
+        index = entry[1]
+        index.update(start - 1, end - 1, buffer[start - 1 : end - 1 + added])
+        tick = int(vim.eval(f"getbufvar({bufnr}, 'changedtick')"))
+        self._link_indexes[bufnr] = (tick, index)
+
+    def drop_link_index(self, bufnr: int):
+        self._link_indexes.pop(bufnr, None)
+        md.mdnav.JumpToAnchor._tables.pop(bufnr, None)
+
+    @staticmethod
+    @err_to_scratch_buffer
+    def backlinks():
+        """Fill the quickfix list with all notes linking to the current file."""
+        root = config.notes_root_path
+        if root is None:
+            vim.command(
+                "echohl WarningMsg | echom 'g:vimania_uri_notes_root not set' | echohl None"
+            )
+            return
+        graph = get_link_graph()
+        graph.update(root)
+        links = graph.backlinks(Path(vim.eval("expand('%:p')")))
+        items = [
+            {"filename": link.source, "lnum": link.line + 1, "text": link.target}
+            for link in links
+        ]
+        what = {"title": "vimania backlinks", "items": items}
+        vim.command(f"call setqflist([], ' ', {json.dumps(what)})")
+        if items:
+            vim.command("copen")
+        else:
+            vim.command("echom 'no backlinks'")
+
+    @staticmethod
+    def poll_twbm(timer: str):
+        """Report background twbm results, stop the timer when the writer is idle."""
+        while writer.messages:
+            msg = writer.messages.popleft().replace("'", "''")
+            vim.command(f"echom '{msg}'")
+        if writer.idle:
+            vim.command(f"call timer_stop({int(timer)})")
+
+    @staticmethod
+    def flush_twbm():
+        """Persist queued twbm bookmarks before vim exits (VimLeavePre)."""
+        writer.flush(timeout=5)
 
     @staticmethod
     @err_to_scratch_buffer
@@ -155,8 +241,10 @@ class VimaniaUriManager:
                 f"echohl WarningMsg | echom 'Cannot extract url from: {args}' | echohl None"
             )
             return
-        for url in urls:
-            vim.command(f"echom 'deleted twbm: {url[0]} {url[1]}'")
+        if not urls:
+            return
+        msg = ", ".join(f"{id_} {url}" for id_, url in urls).replace("'", "''")
+        vim.command(f"echom 'deleted twbm: {msg}'")
 
     @staticmethod
     @err_to_scratch_buffer
@@ -181,26 +269,68 @@ class VimaniaUriManager:
             vim.command(f"/{suffix}")
 
     @staticmethod
-    @err_to_scratch_buffer
-    def get_url_title(url: str):
-        """Edits text files and jumps to first position of pattern
-        pattern is extracted via separator: '#'
-        """
-        m = URL_PATTERN.match(url)
-        _log.debug(f"bs4 builders: {bs4.builder.builder_registry.builders}")
-        if m is None:
-            _log.warning(f"Invalid URL: {url=}")
-            vim.command(f"echom 'Invalid URL: {url=}'")
+    def _is_valid_url(url: str) -> bool:
         assert isinstance(url, str), f"Error: input must be string, got {type(url)}."
-        # _log.debug(f"{url=}")
         try:
-            title = bs4.BeautifulSoup(
-                requests.get(url).content, features="lxml"
-            ).title.text.strip()
-            # https://stackoverflow.com/a/27324622
-            title = title.replace("'", "''")
-            _log.debug(f"{title=}")
-            vim.command(f"let g:vimania_url_title = '{str(title)}'")
-        except requests.exceptions.MissingSchema:
+            valid = URL_PATTERN.match(url) is not None and parse_url(url).scheme is not None
+        except LocationValueError:
+            valid = False
+        if not valid:
             _log.warning(f"Invalid URL: {url=}")
             vim.command(f"echom 'Invalid URL: {url=}'")
+        return valid
+
+    @staticmethod
+    def _set_url_title(title: str):
+        # https://stackoverflow.com/a/27324622
+        title = title.replace("'", "''")
+        _log.debug(f"{title=}")
+        vim.command(f"let g:vimania_url_title = '{str(title)}'")
+
+    @staticmethod
+    @err_to_scratch_buffer
+    def get_url_title(url: str):
+        """Sets g:vimania_url_title to the page title of url, the url if there is none."""
+        title = url
+        if VimaniaUriManager._is_valid_url(url):
+            title = resolver.resolve(url)
+        VimaniaUriManager._set_url_title(title)
+
+    @staticmethod
+    @err_to_scratch_buffer
+    def get_url_title_async(url: str):
+        """Sets g:vimania_url_title without waiting for the network.
+
+        A known title is set at once. Otherwise the url is set and the title
+        fetched in the background: poll_url_title replaces the link text
+        `[url](url)` on the cursor line when the title arrives.
+        """
+        title = url
+        if VimaniaUriManager._is_valid_url(url):
+            key = (vim.current.buffer.number, vim.current.window.cursor[0] - 1)
+            title = resolver.resolve_async(url, key)
+            if title is None:
+                title = url
+                vim.command("call timer_start(100, 'VimaniaUrlTitlePoll', {'repeat': -1})")
+        VimaniaUriManager._set_url_title(title)
+
+    @staticmethod
+    def poll_url_title(timer: str):
+        """Patch titles fetched in the background, stop the timer when done."""
+        while resolver.results:
+            (bufnr, row), url, title = resolver.results.popleft()
+            if title == url:
+                continue
+            try:
+                buffer = vim.buffers[bufnr]
+            except KeyError:  # buffer wiped meanwhile
+                continue
+            placeholder = f"[{url}]({url})"
+            # the line moves if lines were added or removed above it
+            rows = [row] + [r for r in range(len(buffer)) if r != row]
+            for r in rows:
+                if r < len(buffer) and placeholder in buffer[r]:
+                    buffer[r] = buffer[r].replace(placeholder, f"[{title}]({url})", 1)
+                    break
+        if resolver.idle and not resolver.results:
+            vim.command(f"call timer_stop({int(timer)})")
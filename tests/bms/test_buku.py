@@ -0,0 +1,969 @@
+import json
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from vimania_uri import buku
+from vimania_uri.buku import BukuDb, RefreshScheduler, parse_tags, regexp, regexp_compile
+
+WORDS = ["python", "vim", "markdown", "sqlite", "Linux", "rust", "web-dev", "notes", "ab", "Ünïcode"]
+
+
+def fill(bdb, n=300, seed=1):
+    rnd = random.Random(seed)
+    for i in range(n):
+        words = rnd.sample(WORDS, 3)
+        bdb.add_rec(
+            f"https://host{i % 7}.example.com/{words[0]}/{i}",
+            title_in=f"title {words[1]} {i}",
+            tags_in="," + ",".join(rnd.sample(WORDS, 2)) + ",",
+            desc=f"about {words[2]}_{i} 50%",
+            fetch=False,
+        )
+
+
+@pytest.fixture
+def bdb(tmp_path):
+    bdb = BukuDb(dbfile=str(tmp_path / "bm.db"))
+    fill(bdb)
+    yield bdb
+    bdb.close()
+
+
+SEARCHES = [
+    (["python"], False, False),
+    (["python", "rust"], False, False),
+    (["python", "rust"], True, False),
+    (["python", "ab"], False, False),
+    (["python", "ab"], True, False),
+    (["ho", "vi"], True, False),
+    (["web-dev"], False, False),
+    (["example.com/"], False, False),
+    (["LINUX"], False, False),
+    (["ünïcode"], False, False),
+    (["thon"], False, True),
+    (["thon", "arkd"], True, True),
+    (["s_1"], False, True),
+    (["50%"], False, True),
+    (["host3", "notes"], False, True),
+    (["blank"], True, False),
+    (['"quoted"'], False, False),
+]
+
+
+class TestFts:
+    @pytest.mark.parametrize(("keywords", "all_keywords", "deep"), SEARCHES)
+    def test_same_results_as_scan(self, bdb, keywords, all_keywords, deep):
+        expected = bdb.searchdb(keywords, all_keywords=all_keywords, deep=deep)
+        assert bdb.enable_fts()
+        actual = bdb.searchdb(keywords, all_keywords=all_keywords, deep=deep)
+        if all_keywords:
+            assert actual == expected
+        else:  # order among equal scores is not defined
+            assert sorted(actual or []) == sorted(expected or [])
+
+    def test_index_follows_changes(self, bdb):
+        assert bdb.enable_fts()
+        bdb.add_rec("https://new.example.org", title_in="zebra", fetch=False)
+        assert [r[1] for r in bdb.searchdb(["zebra"])] == ["https://new.example.org"]
+
+        id_ = bdb.get_max_id()
+        bdb.update_rec(id_, title_in="giraffe")
+        assert bdb.searchdb(["zebra"]) == []
+        assert len(bdb.searchdb(["giraffe"])) == 1
+
+        # delete with compaction moves the last record
+        bdb.delete_rec(1)
+        assert [r[0] for r in bdb.searchdb(["giraffe"])] == [1]
+        bdb.cur.execute("INSERT INTO bookmarks_fts(bookmarks_fts) VALUES ('integrity-check')")
+
+    def test_rank(self, bdb):
+        assert bdb.enable_fts()
+        bdb.add_rec("https://rust.example.org/rust", title_in="rust rust", tags_in=",rust,", fetch=False)
+        result = bdb.searchdb(["rust"], rank=True)
+        assert result[0][1] == "https://rust.example.org/rust"
+        assert sorted(result) == sorted(bdb.searchdb(["rust"]))
+
+    def test_disable_fts(self, tmp_path, bdb):
+        assert bdb.enable_fts()
+        assert BukuDb(dbfile=str(tmp_path / "bm.db")).fts
+        bdb.disable_fts()
+        assert not bdb.fts
+        assert not BukuDb(dbfile=str(tmp_path / "bm.db")).fts
+        assert len(bdb.searchdb(["python"])) > 0
+
+
+class TestRegexp:
+    def test_compiled_once_per_query(self, bdb):
+        regexp_compile.cache_clear()
+        result = bdb.searchdb([r"host[35]\.example"], regex=True)
+        assert {r[1].split("/")[2] for r in result} == {"host3.example.com", "host5.example.com"}
+        info = regexp_compile.cache_info()
+        assert info.misses == 1
+        assert info.hits > 0
+
+    def test_regexp(self):
+        assert regexp("VIM", ",notes,vim,")
+        assert not regexp(r"\bvi\b", ",notes,vim,")
+        assert not regexp(None, "x")
+        assert not regexp("x", None)
+
+
+def tag_rows(bdb):
+    """bookmark_id -> tags according to the tag index"""
+    result = {}
+    for id_, name in bdb.conn.execute(
+        "SELECT bt.bookmark_id, t.name FROM bookmark_tags bt JOIN tags t ON t.id = bt.tag_id"
+    ):
+        result.setdefault(id_, set()).add(name)
+    return result
+
+
+def legacy_tag_rows(bdb):
+    return {
+        id_: set(tags.strip(",").split(","))
+        for id_, tags in bdb.conn.execute("SELECT id, tags FROM bookmarks WHERE tags != ','")
+    }
+
+
+class TestTagIndex:
+    @pytest.mark.parametrize(
+        "tags",
+        [
+            "python",
+            "python, rust",
+            "python + rust",
+            "python + rust - vim",
+            "python, vim - notes, ab",
+            "- python",
+            "web-dev",
+            "ünïcode",
+            "missing",
+        ],
+    )
+    def test_search_by_tag(self, bdb, tags):
+        expected = bdb.search_by_tag(tags)
+        assert bdb.enable_tag_index()
+        actual = bdb.search_by_tag(tags)
+        if "+" in tags:
+            assert actual == expected
+        else:  # order among equal scores is not defined
+            assert sorted(actual) == sorted(expected)
+
+    def test_get_tag_all(self, bdb):
+        bdb.add_rec("https://untagged.example.org", fetch=False)
+        expected = bdb.get_tag_all()
+        assert bdb.enable_tag_index()
+        assert bdb.get_tag_all() == expected
+
+    def test_consistent_with_tags_column(self, bdb):
+        assert bdb.enable_tag_index()
+        assert tag_rows(bdb) == legacy_tag_rows(bdb)
+
+        bdb.add_rec("https://new.example.org", tags_in=',q"uo\\te,tab\there,', fetch=False)
+        bdb.append_tag_at_index(1, ",zebra,")
+        bdb.delete_tag_at_index(2, ",python,vim,")
+        bdb.delete_tag_at_index(0, ",rust,", chatty=False)
+        bdb.replace_tag("markdown", ["md", "notes"])
+        bdb.delete_rec(3)  # compaction moves the last record
+        bdb.update_rec(4, tags_in=",rewritten,")
+        assert tag_rows(bdb) == legacy_tag_rows(bdb)
+        assert bdb.search_by_tag('q"uo\\te')[0][1] == "https://new.example.org"
+
+        # unused tags are removed
+        names = {n for (n,) in bdb.conn.execute("SELECT name FROM tags")}
+        assert names == set().union(*legacy_tag_rows(bdb).values())
+
+    def test_disable_tag_index(self, tmp_path, bdb):
+        assert bdb.enable_tag_index()
+        assert BukuDb(dbfile=str(tmp_path / "bm.db")).tag_index
+        bdb.disable_tag_index()
+        assert not BukuDb(dbfile=str(tmp_path / "bm.db")).tag_index
+        assert bdb.search_by_tag("python")
+
+
+def legacy_get_tag_all(bdb):
+    """get_tag_all as implemented before the SQL aggregation"""
+    tags = []
+    dic = {}
+    for row in bdb.conn.execute("SELECT DISTINCT tags, COUNT(tags) FROM bookmarks GROUP BY tags"):
+        for tag in row[0].strip(",").split(","):
+            if tag not in tags:
+                dic[tag] = row[1]
+                tags += (tag,)
+            else:
+                dic[tag] += row[1]
+    if not tags:
+        return tags, dic
+    return (sorted(tags[1:]) if tags[0] == "" else sorted(tags)), dic
+
+
+class TestGetTagAll:
+    @pytest.mark.parametrize(
+        "extra_tags",
+        [
+            [],
+            [","],
+            [",,zz,"],
+            [",a,a,", ",Vim,", ","],
+            [",b,,c,", ",,zz,"],
+        ],
+    )
+    def test_same_as_python_loop(self, bdb, extra_tags):
+        for i, tags in enumerate(extra_tags):
+            bdb.conn.execute(
+                "INSERT INTO bookmarks(URL, tags) VALUES (?, ?)", (f"https://extra/{i}", tags)
+            )
+        assert bdb.get_tag_all() == legacy_get_tag_all(bdb)
+
+    def test_empty_db(self, tmp_path):
+        assert BukuDb(dbfile=str(tmp_path / "empty.db")).get_tag_all() == ([], {})
+
+
+def all_tags(bdb):
+    return dict(bdb.conn.execute("SELECT id, tags FROM bookmarks"))
+
+
+class RecordingCursor:
+    """Records the UPDATE statements issued through the BukuDb cursor"""
+
+    def __init__(self, cur):
+        self._cur = cur
+        self.updates = []
+
+    def _record(self, sql):
+        if sql.lstrip().upper().startswith("UPDATE"):
+            self.updates.append(sql)
+
+    def execute(self, sql, *args):
+        self._record(sql)
+        return self._cur.execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        self._record(sql)
+        return self._cur.executemany(sql, *args)
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+
+def count_updates(bdb):
+    bdb.cur = RecordingCursor(bdb.cur)
+    return bdb.cur.updates
+
+
+class TestBulkTags:
+    @pytest.mark.parametrize("tag_index", [False, True])
+    @pytest.mark.parametrize(("orig", "new"), [("python", ["py"]), ("python", ["vim", "Zed"])])
+    def test_replace_tag(self, bdb, tag_index, orig, new):
+        if tag_index:
+            assert bdb.enable_tag_index()
+        before = all_tags(bdb)
+        updates = count_updates(bdb)
+
+        assert bdb.replace_tag(orig, new)
+
+        expected = {
+            id_: parse_tags([tags.replace(f",{orig},", parse_tags(new))]) if f",{orig}," in tags else tags
+            for id_, tags in before.items()
+        }
+        assert all_tags(bdb) == expected
+        assert len(updates) == 1
+        if tag_index:
+            assert bdb.search_by_tag(orig) == []
+
+    def test_replace_tag_dry_run(self, bdb, capsys):
+        before = all_tags(bdb)
+        assert bdb.replace_tag("python", None, dry_run=True)
+        assert all_tags(bdb) == before
+
+        lines = capsys.readouterr().out.splitlines()
+        assert len(lines) == sum(",python," in tags for tags in before.values())
+        index, change = lines[0][len("Index ") :].split(": ")
+        old, new = change.split(" -> ")
+        assert before[int(index)] == old and ",python," not in new
+
+    @pytest.mark.parametrize(
+        ("cmd", "expected"),
+        [
+            ("1 >> 1 3-2", lambda tags: parse_tags([tags + "ab,"])),
+            ("1 2 > 2 3", lambda tags: ",ab,linux,"),
+            ("2 << 1-3", lambda tags: parse_tags([tags.replace(",linux,", ",")])),
+        ],
+    )
+    def test_set_tag(self, bdb, cmd, expected, capsys):
+        taglist = ["ab", "linux"]
+        before = all_tags(bdb)
+        assert bdb.set_tag(cmd, taglist, dry_run=True) > 0
+        assert all_tags(bdb) == before
+        capsys.readouterr()
+
+        updates = count_updates(bdb)
+        ids = {1, 2, 3} if cmd != "1 2 > 2 3" else {2, 3}
+        assert bdb.set_tag(cmd, taglist) == len(ids)
+        after = all_tags(bdb)
+        assert after == {id_: expected(tags) if id_ in ids else tags for id_, tags in before.items()}
+        assert len(updates) <= 1
+
+    def test_set_tag_invalid_id_changes_nothing(self, bdb):
+        before = all_tags(bdb)
+        assert bdb.set_tag("1 >> 1 x", ["ab"]) == -1
+        assert all_tags(bdb) == before
+
+
+class TestRefresh:
+    def test_scheduler_limits_hosts(self):
+        rows = [(i, f"https://h{i % 2}.example.com/{i}", 0) for i in range(6)]
+        scheduler = RefreshScheduler(rows, limit=2)
+        taken = [scheduler.take() for _ in range(5)]
+        assert [h for h, _ in taken] == ["h0.example.com"] * 2 + ["h1.example.com"] * 2 + [None]
+
+        # a worker keeps to its host
+        host, row = scheduler.take("h1.example.com")
+        assert host == "h1.example.com"
+        assert row[0] == 5
+
+    def test_refreshdb(self, tmp_path, http_server):
+        port = http_server.server_address[1]
+        bdb = BukuDb(dbfile=str(tmp_path / "bm.db"))
+        n = 3 * buku.REFRESH_BATCH_SIZE
+        for i in range(n):
+            bdb.add_rec(f"http://127.0.0.1:{port}/{i}", title_in="old", desc="keep", fetch=False)
+        bdb.add_rec(f"http://127.0.0.1:{port}/head", title_in="immutable", immutable=1, fetch=False)
+
+        progress = []
+        assert bdb.refreshdb(0, 8, progress=lambda done, total: progress.append((done, total)))
+
+        rows = bdb.conn.execute("SELECT URL, metadata, desc FROM bookmarks ORDER BY id").fetchall()
+        for i, (url, title, desc) in enumerate(rows[:n]):
+            assert title == f"127.0.0.1 /{i}"
+            assert desc == "keep"
+        assert rows[n][1] == "immutable"  # HEAD request only
+
+        assert progress[-1] == (n + 1, n + 1)
+        assert http_server.max_in_flight["127.0.0.1"] <= buku.REFRESH_HOST_CONNECTIONS
+        assert len(http_server.connections) <= buku.REFRESH_HOST_CONNECTIONS + 1
+        bdb.close()
+
+
+class TestSharedPool:
+    def test_sockets_reused(self, http_server):
+        port = http_server.server_address[1]
+        for i in range(5):
+            title, *_ = buku.network_handler(f"http://127.0.0.1:{port}/{i}")
+            assert title == f"127.0.0.1 /{i}"
+        assert len(http_server.connections) == 1
+
+    def test_keyed_on_proxy(self, monkeypatch):
+        pool = buku.SharedPoolManager(num_pools=3, maxsize=4)
+        monkeypatch.setattr(buku, "MYHEADERS", {"User-Agent": "test"})
+        monkeypatch.setattr(buku, "MYPROXY", None)
+        manager = pool.get()
+        assert pool.get() is manager
+        assert manager.connection_pool_kw["maxsize"] == 4
+
+        monkeypatch.setattr(buku, "MYPROXY", "http://proxy.example.com:3128")
+        assert pool.get() is not manager
+
+        pool.configure(maxsize=1)
+        assert pool.get().connection_pool_kw["maxsize"] == 1
+        pool.close()
+
+
+@pytest.fixture
+def metadata_cache(tmp_path):
+    yield buku.enable_metadata_cache(str(tmp_path / "cache" / "metadata.db"))
+    buku.disable_metadata_cache()
+
+
+class TestMetadataCache:
+    def test_fresh_page_not_fetched(self, http_server, metadata_cache):
+        url = f"http://127.0.0.1:{http_server.server_address[1]}/a"
+        assert buku.network_handler(url)[0] == "127.0.0.1 /a"
+        assert buku.network_handler(url)[0] == "127.0.0.1 /a"
+        assert http_server.requests == 1
+
+    def test_stale_page_revalidated(self, http_server, metadata_cache):
+        metadata_cache.ttl = 0
+        url = f"http://127.0.0.1:{http_server.server_address[1]}/a"
+        assert buku.network_handler(url)[0] == "127.0.0.1 /a"
+        checked = metadata_cache.get(url).checked
+        assert buku.network_handler(url)[0] == "127.0.0.1 /a"
+        assert (http_server.requests, http_server.not_modified) == (2, 1)
+        assert metadata_cache.get(url).checked > checked
+
+    def test_eviction(self, metadata_cache):
+        metadata_cache.max_entries = 2
+        for i in range(3):
+            metadata_cache.store(f"https://x.example.com/{i}", f"t{i}", None, None)
+        metadata_cache.evict()
+        assert metadata_cache.get("https://x.example.com/0") is None
+        assert metadata_cache.get("https://x.example.com/2").title == "t2"
+
+    def test_refreshdb_revalidates(self, tmp_path, http_server, metadata_cache):
+        port = http_server.server_address[1]
+        bdb = BukuDb(dbfile=str(tmp_path / "bm.db"))
+        for i in range(10):
+            bdb.add_rec(f"http://127.0.0.1:{port}/{i}", title_in="old", fetch=False)
+
+        assert bdb.refreshdb(0, 4)
+        assert bdb.refreshdb(0, 4)
+        assert (http_server.requests, http_server.not_modified) == (20, 10)
+        assert bdb.get_rec_by_id(3)[2] == "127.0.0.1 /2"
+        bdb.close()
+
+
+class StreamedResponse:
+    """Minimal streamed urllib3 response, records the bytes read"""
+
+    def __init__(self, body: bytes, content_type="text/html"):
+        self.body = body
+        self.headers = {"content-type": content_type}
+        self.read_bytes = 0
+
+    def stream(self, amt):
+        for pos in range(0, len(self.body), amt):
+            chunk = self.body[pos : pos + amt]
+            self.read_bytes += len(chunk)
+            yield chunk
+
+
+class TestPageMetadata:
+    @pytest.mark.parametrize(
+        ("page", "expected"),
+        [
+            ("<title>\n  A   &amp; B\n</title>", ("A & B", None, None)),
+            (
+                '<head><meta property="og:description" content="og">'
+                '<meta name="Description" content=" plain  text "></head>',
+                (None, "plain text", None),
+            ),
+            (
+                '<title>t</title><meta name="keywords" content="a,b">',
+                ("t", None, "a,b"),
+            ),
+            (
+                '<meta name="keywords" content="one two three four">',
+                (None, "* one two three four", None),
+            ),
+            ("<head></head><body><title>late</title></body>", (None, None, None)),
+            ("no markup", (None, None, None)),
+        ],
+    )
+    def test_parse_decoded_page(self, page, expected):
+        assert buku.parse_decoded_page(page) == expected
+
+    def test_stops_after_head(self):
+        head = b"<html><head><title>big</title></head>"
+        resp = StreamedResponse(head + b"<body>" + b"x" * 4_000_000 + b"</body></html>")
+        assert buku.get_data_from_page(resp) == ("big", None, None)
+        assert resp.read_bytes == buku.PAGE_CHUNK_SIZE
+
+    def test_read_limit(self):
+        resp = StreamedResponse(b"<html><title>open" + b" x" * 1_000_000)
+        buku.get_data_from_page(resp)
+        assert resp.read_bytes == buku.PAGE_HEAD_LIMIT
+
+    @pytest.mark.parametrize(
+        ("head", "content_type", "expected"),
+        [
+            (b'<meta charset="iso-8859-1">', "text/html; charset=utf-8", "iso8859-1"),
+            (b"<html>", "text/html; charset=ISO-8859-1", "iso8859-1"),
+            (
+                b'<meta http-equiv="Content-Type" content="text/html; charset=windows-1252">',
+                "text/html",
+                "cp1252",
+            ),
+            (b"<meta charset=unknown-x>", None, "utf-8"),
+            (b"<html>", None, "utf-8"),
+        ],
+    )
+    def test_detect_charset(self, head, content_type, expected):
+        assert buku.detect_charset(head, content_type) == expected
+
+    def test_charset_decoded_once(self):
+        page = '<meta charset="latin-1"><title>Café</title></head>'.encode("latin-1")
+        assert buku.get_data_from_page(StreamedResponse(page))[0] == "Café"
+
+
+def bookmark_rows(bdb):
+    return bdb.conn.execute(
+        "SELECT URL, metadata, tags, desc, flags FROM bookmarks ORDER BY id"
+    ).fetchall()
+
+
+def import_items(bdb):
+    """Items to import into a filled BukuDb, with new, existing and repeated URLs"""
+    existing = [row[0] for row in bookmark_rows(bdb)[:2]]
+    return [
+        (existing[0], "dup", ",Zed,python,", None, 0, True, False),
+        ("https://new.example.org/a", "a", ",x,", "desc a", 0, True, False),
+        ("https://new.example.org/b", None, None, None, 1, True, False),
+        ("https://new.example.org/a", "again", ",y,X,", None, 0, True, False),
+        ("https://new.example.org/c", "c", ",", None, 0, True, False),
+        (existing[1], "dup", None, None, 0, True, False),
+        ("", "empty", ",e,", None, 0, True, False),
+    ]
+
+
+class TestImport:
+    @staticmethod
+    def legacy_import(bdb, items, append_tags=True):
+        """importdb as implemented before import_items"""
+        for item in items:
+            if bdb.add_rec(*item) == -1 and append_tags:
+                bdb.append_tag_at_index(bdb.get_rec_id(item[0]), item[2])
+        bdb.conn.commit()
+
+    @pytest.mark.parametrize("append_tags", [True, False])
+    def test_same_as_add_rec(self, tmp_path, append_tags):
+        expected, actual = (BukuDb(dbfile=str(tmp_path / f"{n}.db")) for n in "ab")
+        for bdb in (expected, actual):
+            fill(bdb, n=20)
+        items = import_items(expected)
+        self.legacy_import(expected, items, append_tags)
+
+        assert actual.import_items(iter(items), append_tags, batch_size=2) == 3
+        assert bookmark_rows(actual) == bookmark_rows(expected)
+
+    def test_tag_index_follows(self, bdb):
+        assert bdb.enable_tag_index()
+        bdb.import_items(import_items(bdb))
+        assert tag_rows(bdb) == legacy_tag_rows(bdb)
+
+    def test_journal_mode_untouched(self, bdb):
+        seen = []
+
+        def items():
+            for item in import_items(bdb):
+                seen.append(bdb.conn.execute("PRAGMA journal_mode").fetchone()[0])
+                yield item
+
+        bdb.import_items(items())
+        assert set(seen) == {"delete"}
+        assert bdb.conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+        assert bdb.conn.execute("PRAGMA synchronous").fetchone()[0] == 2
+
+    def test_mergedb(self, tmp_path):
+        source = BukuDb(dbfile=str(tmp_path / "source.db"))
+        fill(source, n=50, seed=2)
+        source.close()
+
+        expected, actual = (BukuDb(dbfile=str(tmp_path / f"{n}.db")) for n in "ab")
+        for bdb in (expected, actual):
+            fill(bdb, n=20)
+        rows = BukuDb(dbfile=str(tmp_path / "source.db")).get_rec_all()
+        self.legacy_import(expected, [(*row[1:6], True, False) for row in rows], False)
+
+        assert actual.mergedb(str(tmp_path / "source.db"))
+        assert bookmark_rows(actual) == bookmark_rows(expected)
+
+
+NETSCAPE_HTML = """<!DOCTYPE NETSCAPE-Bookmark-file-1>
+<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">
+<TITLE>Bookmarks</TITLE>
+<H1>Bookmarks Menu</H1>
+<DL><p>
+    <DT><A HREF="https://top.example.com/" ADD_DATE="1">Top &amp; level</A>
+    <DD>top description
+    <DT><H3 ADD_DATE="1">Dev</H3>
+    <DL><p>
+        <DT><A HREF="https://dev.example.com/a" TAGS="x,y">A <b>bold</b></A>
+        <DT><A HREF="place:sort=8">smart bookmark</A>
+        <DT><A HREF="https://dev.example.com/b"><!-- only a comment --></A>
+        <DD><!-- c --> after comment
+        <DT><H3>Nested <i>deep</i></H3>
+        <DL><p>
+            <DT><A NAME="anchor">no href</A>
+            <DT><A HREF="https://deep.example.com/">Deep</A><BR>
+            <DD>deep <p>para</p> tail</DD>
+        </DL><p>
+        <DT><A HREF="https://dev.example.com/c">After nested</A>
+    </DL><p>
+    <HR>
+    <DT><A HREF="https://last.example.com/">Last</A>
+</DL><p>
+"""
+
+
+def generated_html(rnd, n):
+    pieces = [
+        "<DL><p>", "</DL><p>", "<DT>", "<DD>", "desc ", "\n", "<p>", "</p>", "<BR>",
+        "</DT>", "</DD>", "<!-- c -->", "</A>", "<HR>", "<DT><H3>Folder</H3>",
+        '<A HREF="https://a.example.com/{i}">Title {i}</A>',
+        '<A HREF="https://b.example.com/{i}" TAGS="t1,t2">T<b>b</b></A>',
+        '<A HREF="place:x">p</A>', '<A HREF="https://c.example.com/{i}"></A>',
+    ]  # fmt: skip
+    body = (rnd.choice(pieces).replace("{i}", str(i)) for i in range(n))
+    return "<DL><p><DT><H3>Root</H3>\n<DL><p>\n" + "".join(body)
+
+
+def test_bs4_not_imported():
+    """bs4 is only needed by callers of import_html, who pass their own soup"""
+    code = "import sys, vimania_uri.buku; assert 'bs4' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], check=True, env={"PYTHONPATH": ":".join(sys.path)})
+
+
+class TestImportHtml:
+    @staticmethod
+    def expected(text, add_parent_folder_as_tag, newtag):
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(text, "html.parser")
+        return list(buku.import_html(soup, add_parent_folder_as_tag, newtag))
+
+    @pytest.mark.parametrize("add_parent_folder_as_tag", [True, False])
+    @pytest.mark.parametrize("newtag", [None, "new"])
+    @pytest.mark.parametrize("read_size", [1, 64 * 1024])
+    def test_same_as_import_html(
+        self, tmp_path, monkeypatch, add_parent_folder_as_tag, newtag, read_size
+    ):
+        monkeypatch.setattr(buku, "IMPORT_READ_SIZE", read_size)
+        path = tmp_path / "bookmarks.html"
+        path.write_text(NETSCAPE_HTML, encoding="utf-8")
+
+        actual = list(buku.import_html_file(str(path), add_parent_folder_as_tag, newtag))
+        assert actual == self.expected(NETSCAPE_HTML, add_parent_folder_as_tag, newtag)
+        assert len(actual) == 6
+
+    def test_generated_same_as_import_html(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(buku, "IMPORT_READ_SIZE", 7)
+        rnd = random.Random(7)
+        path = tmp_path / "bookmarks.html"
+        for _ in range(200):
+            text = generated_html(rnd, rnd.randint(1, 40))
+            try:
+                expected = self.expected(text, True, "new")
+            except AttributeError:  # import_html fails on <a> outside of any <dl>
+                continue
+            path.write_text(text, encoding="utf-8")
+            actual = list(buku.import_html_file(str(path), True, "new"))
+            assert actual == expected, text
+
+    def test_yields_while_reading(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(buku, "IMPORT_READ_SIZE", 1024)
+        path = tmp_path / "bookmarks.html"
+        path.write_text(generated_html(random.Random(1), 100_000), encoding="utf-8")
+
+        parser_feed = buku.BookmarkHTMLParser.feed
+        fed = []
+        monkeypatch.setattr(
+            buku.BookmarkHTMLParser,
+            "feed",
+            lambda self, chunk: fed.append(len(chunk)) or parser_feed(self, chunk),
+        )
+        next(buku.import_html_file(str(path), True, None))
+        assert sum(fed) < 10 * 1024
+
+    def test_importdb(self, tmp_path):
+        path = tmp_path / "bookmarks.html"
+        path.write_text(NETSCAPE_HTML, encoding="utf-8")
+        expected, actual = (BukuDb(dbfile=str(tmp_path / f"{n}.db")) for n in "ab")
+        TestImport.legacy_import(expected, self.expected(NETSCAPE_HTML, True, None))
+
+        assert actual.importdb(str(path), tacit=True)
+        assert bookmark_rows(actual) == bookmark_rows(expected)
+
+    @pytest.mark.parametrize("name", ["missing.html", "dir.html"])
+    def test_importdb_unreadable(self, tmp_path, name):
+        (tmp_path / "dir.html").mkdir()
+        bdb = BukuDb(dbfile=str(tmp_path / "bm.db"))
+        assert bdb.importdb(str(tmp_path / name), tacit=True) is False
+        assert bdb.get_rec_all() == []
+
+
+def firefox_entry(rnd, depth=0):
+    if depth < 3 and rnd.random() < 0.25:
+        folder = {"title": f"folder{depth}", "typeCode": 2}
+        if rnd.random() < 0.2:
+            folder["root"] = rnd.choice(["toolbarFolder", "menuFolder"])
+        children = range(rnd.randint(0, 5))
+        folder["children"] = [firefox_entry(rnd, depth + 1) for _ in children]
+        if rnd.random() < 0.2:  # children before typeCode, decoded as a whole
+            folder = {"children": folder.pop("children"), **folder}
+        return folder
+    if rnd.random() < 0.2:
+        return {"typeCode": 3}
+    i = rnd.randrange(10_000)
+    entry = {"title": f"t{i} é", "typeCode": 1, "uri": f"https://ff.example.com/{i}"}
+    if rnd.random() < 0.5:
+        entry["tags"] = "a,b"
+    if rnd.random() < 0.3:
+        entry["annos"] = [{"name": "bookmarkProperties/description", "value": "d" * i}]
+    if rnd.random() < 0.1:
+        entry["annos"] = [{"name": "Places/SmartBookmark", "value": "x"}]
+    if rnd.random() < 0.1:
+        entry["uri"] = "place:sort=8"
+    return entry
+
+
+class TestImportFirefoxJson:
+    @pytest.mark.parametrize("read_size", [1, 100, 64 * 1024])
+    def test_same_as_import_firefox_json(self, tmp_path, read_size):
+        rnd = random.Random(5)
+        path = tmp_path / "bookmarks.json"
+        for _ in range(50):
+            root = {"title": "", "typeCode": 2, "root": "placesRoot"}
+            root["children"] = [firefox_entry(rnd) for _ in range(rnd.randint(0, 8))]
+            text = json.dumps(root, indent=rnd.choice([None, 2]))
+            path.write_text(text, encoding="utf-8")
+            expected = list(buku.import_firefox_json(root, True, "new"))
+
+            with open(path, encoding="utf-8") as infp:
+                reader = buku.FirefoxJsonReader(infp, read_size)
+                actual = [
+                    item
+                    for doc in reader.document()
+                    for item in buku.import_firefox_json(doc, True, "new")
+                ]
+            assert actual == expected
+
+    def test_folders_walked_lazily(self, tmp_path):
+        entry = {"title": "t", "typeCode": 1, "uri": "https://ff.example.com/"}
+        folder = {"title": "f", "typeCode": 2, "children": [entry] * 50_000}
+        path = tmp_path / "bookmarks.json"
+        path.write_text(json.dumps({"children": [folder]}), encoding="utf-8")
+
+        with open(path, encoding="utf-8") as infp:
+            reader = buku.FirefoxJsonReader(infp, read_size=1024)
+            items = buku.import_firefox_json(next(reader.document()))
+            assert next(items)[0] == "https://ff.example.com/"
+            assert reader.offset + len(reader.buf) == 1024
+
+    @pytest.mark.parametrize(
+        "text",
+        ['{"children": [{"typeCode": 3}, {', '{"children": []} x', '{"a": [tru]}'],
+    )
+    def test_invalid(self, tmp_path, text):
+        path = tmp_path / "bookmarks.json"
+        path.write_text(text, encoding="utf-8")
+        with pytest.raises(ValueError):
+            list(buku.import_firefox_json_file(str(path), True, None))
+        bdb = BukuDb(dbfile=str(tmp_path / "bm.db"))
+        assert bdb.importdb(str(path), tacit=True) is False
+
+    def test_importdb_missing(self, tmp_path):
+        bdb = BukuDb(dbfile=str(tmp_path / "bm.db"))
+        assert bdb.importdb(str(tmp_path / "missing.json"), tacit=True) is False
+
+    def test_importdb_invalid_after_first_batch(self, tmp_path):
+        entries = ",".join(
+            json.dumps({"title": "t", "typeCode": 1, "uri": f"https://ff.example.com/{i}"})
+            for i in range(buku.IMPORT_BATCH_SIZE + 1)
+        )
+        path = tmp_path / "bookmarks.json"
+        path.write_text('{"children": [%s, {' % entries, encoding="utf-8")
+
+        bdb = BukuDb(dbfile=str(tmp_path / "bm.db"))
+        fill(bdb, n=3)
+        assert bdb.importdb(str(path), tacit=True) is False
+        assert len(bdb.get_rec_all()) == 3
+
+    def test_importdb(self, tmp_path):
+        root = {"children": [firefox_entry(random.Random(seed)) for seed in range(30)]}
+        path = tmp_path / "bookmarks.json"
+        path.write_text(json.dumps(root), encoding="utf-8")
+        expected, actual = (BukuDb(dbfile=str(tmp_path / f"{n}.db")) for n in "ab")
+        TestImport.legacy_import(expected, buku.import_firefox_json(root, True, None))
+
+        assert actual.importdb(str(path), tacit=True)
+        assert bookmark_rows(actual) == bookmark_rows(expected)
+
+
+def legacy_convert_bookmark_set(resultset, export_type):
+    """convert_bookmark_set as implemented before write_bookmark_set"""
+    DELIM = buku.DELIM
+    count = 0
+    out = ""
+    if export_type == "markdown":
+        for row in resultset:
+            if not row[2] or row[2] is None:
+                out += "- [Untitled](" + row[1] + ")"
+            else:
+                out += "- [" + row[2] + "](" + row[1] + ")"
+            if row[3] != DELIM:
+                out += " <!-- TAGS: {} -->\n".format(row[3][1:-1])
+            else:
+                out += "\n"
+            count += 1
+    elif export_type == "org":
+        for row in resultset:
+            if not row[2]:
+                out += "* [[{}][Untitled]]".format(row[1])
+            else:
+                out += "* [[{}][{}]]".format(row[1], row[2])
+            out += buku.convert_tags_to_org_mode_tags(row[3])
+            count += 1
+    elif export_type == "html":
+        timestamp = str(int(buku.time.time()))
+        out = (
+            "<!DOCTYPE NETSCAPE-Bookmark-file-1>\n\n"
+            '<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">\n'
+            "<TITLE>Bookmarks</TITLE>\n"
+            "<H1>Bookmarks</H1>\n\n"
+            "<DL><p>\n"
+            '    <DT><H3 ADD_DATE="{0}" LAST_MODIFIED="{0}" '
+            'PERSONAL_TOOLBAR_FOLDER="true">buku bookmarks</H3>\n'
+            "    <DL><p>\n".format(timestamp)
+        )
+        for row in resultset:
+            out += '        <DT><A HREF="%s" ADD_DATE="%s" LAST_MODIFIED="%s"' % (
+                row[1],
+                timestamp,
+                timestamp,
+            )
+            if row[3] != DELIM:
+                out += ' TAGS="' + row[3][1:-1] + '"'
+            out += ">{}</A>\n".format(row[2] if row[2] else "")
+            if row[4] != "":
+                out += "        <DD>" + row[4] + "\n"
+            count += 1
+        out += "    </DL><p>\n</DL><p>"
+    return {"data": out, "count": count}
+
+
+class TestExport:
+    @pytest.fixture
+    def export_bdb(self, bdb, monkeypatch):
+        bdb.add_rec("https://x.example.com/", title_in="", tags_in=",", fetch=False)
+        monkeypatch.setattr(buku.time, "time", lambda: 1700000000.5)
+        monkeypatch.setattr(bdb, "get_rec_all", None)  # never loaded at once
+        return bdb
+
+    @pytest.mark.parametrize(
+        ("suffix", "export_type"),
+        [(".md", "markdown"), (".org", "org"), (".html", "html")],
+    )
+    def test_same_as_convert_bookmark_set(
+        self, tmp_path, export_bdb, suffix, export_type
+    ):
+        rows = list(export_bdb.iter_rec_all(batch_size=7))
+        path = tmp_path / ("export" + suffix)
+
+        assert export_bdb.exportdb(str(path))
+        expected = legacy_convert_bookmark_set(rows, export_type)
+        assert path.read_text(encoding="utf-8") == expected["data"]
+        assert buku.convert_bookmark_set(rows, export_type) == expected
+
+    def test_resultset(self, tmp_path, export_bdb):
+        rows = export_bdb.searchdb(["python"])
+        path = tmp_path / "export.md"
+
+        assert export_bdb.exportdb(str(path), rows)
+        expected = legacy_convert_bookmark_set(rows, "markdown")["data"]
+        assert path.read_text(encoding="utf-8") == expected
+
+    def test_db(self, tmp_path, export_bdb, capsys):
+        path = tmp_path / "export.db"
+
+        assert export_bdb.exportdb(str(path))
+        assert capsys.readouterr().out == "301 exported\n"
+        assert bookmark_rows(BukuDb(dbfile=str(path))) == bookmark_rows(export_bdb)
+        assert export_bdb.conn.execute("PRAGMA database_list").fetchall()[1:] == []
+
+    def test_db_resultset(self, tmp_path, export_bdb, capsys):
+        rows = export_bdb.searchdb(["python"])
+        path = tmp_path / "export.db"
+
+        assert export_bdb.exportdb(str(path), rows)
+        assert capsys.readouterr().out == "%d exported\n" % len(rows)
+        assert bookmark_rows(BukuDb(dbfile=str(path))) == [row[1:6] for row in rows]
+
+    def test_empty(self, tmp_path, capsys):
+        bdb = BukuDb(dbfile=str(tmp_path / "bm.db"))
+        assert not bdb.exportdb(str(tmp_path / "export.md"))
+        assert capsys.readouterr().out == "No records found\n"
+
+
+class TestTunedConnection:
+    def pragmas(self, conn):
+        names = ["journal_mode", "synchronous", "temp_store", "busy_timeout"]
+        return [conn.execute("PRAGMA " + name).fetchone()[0] for name in names]
+
+    def test_default(self, tmp_path):
+        bdb = BukuDb(dbfile=str(tmp_path / "bm.db"))
+        assert self.pragmas(bdb.conn)[:3] == ["delete", 2, 0]
+
+    def test_tuned(self, tmp_path):
+        bdb = BukuDb(dbfile=str(tmp_path / "bm.db"), tuned=True)
+        assert self.pragmas(bdb.conn) == ["wal", 1, 2, buku.DB_BUSY_TIMEOUT]
+
+    def test_reader_not_blocked_by_writer(self, tmp_path):
+        dbfile = str(tmp_path / "bm.db")
+        bdb = BukuDb(dbfile=dbfile, tuned=True)
+        fill(bdb, n=3)
+        bdb.conn.execute("BEGIN EXCLUSIVE")
+        bdb.add_rec("https://new.example.com/", fetch=False, delay_commit=True)
+
+        reader = sqlite3.connect(dbfile, timeout=0)
+        assert reader.execute("SELECT COUNT(*) FROM bookmarks").fetchone()[0] == 3
+        bdb.conn.commit()
+        assert reader.execute("SELECT COUNT(*) FROM bookmarks").fetchone()[0] == 4
+
+    def test_setup_retried_while_locked(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(buku, "DB_BUSY_TIMEOUT", 10)
+        monkeypatch.setattr(buku, "DB_BUSY_BACKOFF", 0.05)
+        dbfile = str(tmp_path / "bm.db")
+        BukuDb(dbfile=dbfile).close()
+        locker = sqlite3.connect(
+            dbfile, isolation_level=None, check_same_thread=False
+        )
+        locker.execute("BEGIN EXCLUSIVE")
+        threading.Timer(0.1, locker.execute, ["COMMIT"]).start()
+
+        bdb = BukuDb(dbfile=dbfile, tuned=True)
+        assert self.pragmas(bdb.conn)[0] == "wal"
+
+    def test_write_retried_while_locked(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(buku, "DB_BUSY_TIMEOUT", 10)
+        monkeypatch.setattr(buku, "DB_BUSY_BACKOFF", 0.05)
+        dbfile = str(tmp_path / "bm.db")
+        bdb = BukuDb(dbfile=dbfile, tuned=True)
+        locker = sqlite3.connect(
+            dbfile, isolation_level=None, check_same_thread=False
+        )
+        locker.execute("BEGIN EXCLUSIVE")
+        threading.Timer(0.1, locker.execute, ["COMMIT"]).start()
+
+        with bdb.transaction():
+            assert bdb.add_rec("https://new.example.com/", fetch=False, delay_commit=True) == 1
+        assert bdb.get_rec_id("https://new.example.com/") == 1
+
+    def test_transaction_rolled_back(self, tmp_path):
+        bdb = BukuDb(dbfile=str(tmp_path / "bm.db"))
+        with pytest.raises(ValueError):
+            with bdb.transaction():
+                bdb.add_rec("https://new.example.com/", fetch=False, delay_commit=True)
+                raise ValueError
+        assert bdb.get_rec_all() == []
+
+    def test_retry_busy(self, monkeypatch):
+        monkeypatch.setattr(buku, "DB_BUSY_BACKOFF", 0)
+        calls = []
+
+        def busy(fail):
+            calls.append(fail)
+            if len(calls) <= fail:
+                raise sqlite3.OperationalError("database is locked")
+            return len(calls)
+
+        assert buku.retry_busy(lambda: busy(2)) == 3
+        calls.clear()
+        with pytest.raises(sqlite3.OperationalError):
+            buku.retry_busy(lambda: busy(2), retries=1)
+        assert len(calls) == 2
+
+    def test_other_errors_not_retried(self):
+        calls = []
+
+        def fail():
+            calls.append(1)
+            raise sqlite3.OperationalError("no such table: x")
+
+        with pytest.raises(sqlite3.OperationalError):
+            buku.retry_busy(fail)
+        assert calls == [1]
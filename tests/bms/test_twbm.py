@@ -1,6 +1,8 @@
+import threading
+
 import pytest
 
-from vimania_uri.bms.handler import delete_twbm
+from vimania_uri.bms.handler import TwbmPool, TwbmWriter, delete_twbm, delete_twbms, pool
 from vimania_uri.md import open_uri
 from vimania_uri.md.mdnav import URI
 
@@ -20,7 +22,7 @@ class TestSaveTwbm:
     )
     def test_do_vimania_without_twbm(self, mocker, uri):
         mocker.patch("vimania_uri.environment.config.twbm_db_url", new=None)
-        mocked = mocker.patch("vimania_uri.md.mdnav.add_twbm", return_value=9999)
+        mocked = mocker.patch("vimania_uri.md.mdnav.enqueue_twbm")
         open_uri(URI(uri))
         mocked.assert_not_called()
 
@@ -30,19 +32,167 @@ class TestSaveTwbm:
     )
     def test_do_vimania_with_twbm(self, mocker, uri):
         mocker.patch("vimania_uri.environment.config.twbm_db_url", new="some_uri")
-        mocked = mocker.patch("vimania_uri.md.mdnav.add_twbm", return_value=9999)
+        mocked = mocker.patch("vimania_uri.md.mdnav.enqueue_twbm")
         open_uri(URI(uri), save_twbm=True, twbm_integrated=True)
         mocked.assert_called_once()
 
-    def test_delete_twbm_not_managed_by_vimania(self, mocker):
-        mocker.patch("vimania_uri.environment.config.twbm_db_url", new="test_vimania_uri_twbm.db")
-        # mocked_buku = mocker.patch("vimania_uri.bms.handler.BukuDb", autospec=True)
-        mocked_buku = mocker.patch("vimania_uri.bms.handler.BukuDb.get_rec_id", return_value=1)
-        mocked_buku = mocker.patch("vimania_uri.bms.handler.BukuDb.get_rec_by_id", return_value=(
-            1, 'http://example.com', 'example title', ',not-managed,', 'randomdesc', 0))
+    def test_delete_twbm_not_managed_by_vimania(self, mocker, tmp_path):
+        mocker.patch("vimania_uri.environment.config.twbm_db_url", new=f"sqlite:///{tmp_path}/bm.db")
+        with pool.session() as bdb:
+            bdb.add_rec("http://example.com", "example title", ",not-managed,", "randomdesc", fetch=False)
         urls = delete_twbm("http://example.com")
         assert len(urls) == 1
         assert urls[0][0] == 1
         assert 'http://example.com' in urls[0][1]
         assert 'no deletion' in urls[0][1]
-        _ = None
+
+    def test_delete_twbms_batch(self, mocker, tmp_path):
+        mocker.patch("vimania_uri.environment.config.twbm_db_url", new=f"sqlite:///{tmp_path}/bm.db")
+        with pool.session() as bdb:
+            for url, tags in (
+                ("http://a.com", ",vimania,"),
+                ("http://b.com", ",other,"),
+                ("http://c.com", ",vimania,"),
+                ("http://d.com", ",vimania,"),
+            ):
+                bdb.add_rec(url, tags_in=tags, fetch=False)
+
+        urls = delete_twbms(["http://c.com", "http://b.com", "http://a.com", "http://x.com", "http://a.com"])
+        assert [u[1] for u in urls] == [
+            "http://c.com",
+            "http://b.com not managed by vimania, no deletion.",
+            "http://a.com",
+        ]
+        with pool.session() as bdb:
+            remaining = sorted(row[1] for row in bdb.get_rec_all())
+        assert remaining == ["http://b.com", "http://d.com"]
+
+    def test_delete_twbm_multi_line(self, mocker, tmp_path):
+        mocker.patch("vimania_uri.environment.config.twbm_db_url", new=f"sqlite:///{tmp_path}/bm.db")
+        with pool.session() as bdb:
+            bdb.add_rec("http://a.com", tags_in=",vimania,", fetch=False)
+            bdb.add_rec("http://b.com", tags_in=",vimania,", fetch=False)
+        urls = delete_twbm("[a]: http://a.com\n[b]: http://b.com")
+        assert {u[1] for u in urls} == {"http://a.com", "http://b.com"}
+
+
+class TestTwbmPool:
+    def test_connection_is_reused(self, mocker, tmp_path):
+        mocker.patch("vimania_uri.environment.config.twbm_db_url", new=f"sqlite:///{tmp_path}/bm.db")
+        pool = TwbmPool()
+        with pool.session() as bdb1:
+            pass
+        with pool.session() as bdb2:
+            pass
+        assert bdb1 is bdb2
+        pool.close()
+
+    def test_reconnect_on_path_change(self, mocker, tmp_path):
+        mocker.patch("vimania_uri.environment.config.twbm_db_url", new=f"sqlite:///{tmp_path}/bm.db")
+        pool = TwbmPool()
+        with pool.session() as bdb1:
+            pass
+        mocker.patch("vimania_uri.environment.config.twbm_db_url", new=f"sqlite:///{tmp_path}/other.db")
+        with pool.session() as bdb2:
+            pass
+        assert bdb1 is not bdb2
+        pool.close()
+
+    def test_reconnect_on_file_replaced(self, mocker, tmp_path):
+        mocker.patch("vimania_uri.environment.config.twbm_db_url", new=f"sqlite:///{tmp_path}/bm.db")
+        pool = TwbmPool()
+        with pool.session() as bdb1:
+            bdb1.add_rec("http://example.com", tags_in=",vimania,", fetch=False)
+        (tmp_path / "bm.db").unlink()
+        with pool.session() as bdb2:
+            assert bdb2.get_rec_id("http://example.com") == -1
+        assert bdb1 is not bdb2
+        pool.close()
+
+
+class TestTwbmWriter:
+    def test_submit_persists_and_fetches(self, mocker, tmp_path):
+        mocker.patch("vimania_uri.environment.config.twbm_db_url", new=f"sqlite:///{tmp_path}/bm.db")
+        mocker.patch(
+            "vimania_uri.bms.handler.network_handler",
+            return_value=("Example", "a description", None, 0, 0),
+        )
+        writer = TwbmWriter()
+        writer.submit("http://example.com")
+        assert writer.join(timeout=5)
+
+        with pool.session() as bdb:
+            rec = bdb.get_rec_by_id(bdb.get_rec_id("http://example.com"))
+        assert rec[2] == "Example"
+        assert rec[3] == ",vimania,"
+        assert rec[4] == "a description"
+        assert list(writer.messages) == ["twbm added: 1 http://example.com", "twbm title: 1 Example"]
+
+    def test_flush_persists_without_fetch(self, mocker, tmp_path):
+        mocker.patch("vimania_uri.environment.config.twbm_db_url", new=f"sqlite:///{tmp_path}/bm.db")
+        mocked_fetch = mocker.patch("vimania_uri.bms.handler.network_handler")
+        writer = TwbmWriter()
+        writer._skip_fetch.set()
+        for i in range(10):
+            writer.submit(f"http://example{i}.com")
+        assert writer.flush(timeout=5)
+
+        with pool.session() as bdb:
+            assert len(bdb.get_rec_all()) == 10
+        mocked_fetch.assert_not_called()
+
+    def test_queue_full_saves_synchronously(self, mocker, tmp_path):
+        mocker.patch("vimania_uri.environment.config.twbm_db_url", new=f"sqlite:///{tmp_path}/bm.db")
+        mocker.patch("vimania_uri.bms.handler.TWBM_QUEUE_TIMEOUT", new=0.01)
+        writer = TwbmWriter(maxsize=1)
+        mocker.patch.object(writer, "_ensure_started")  # no worker: queue stays full
+        writer.submit("http://a.com")
+        writer.submit("http://b.com")
+
+        with pool.session() as bdb:
+            assert [row[1] for row in bdb.get_rec_all()] == ["http://b.com"]
+
+    def test_flush_not_blocked_by_slow_fetch(self, mocker, tmp_path):
+        mocker.patch("vimania_uri.environment.config.twbm_db_url", new=f"sqlite:///{tmp_path}/bm.db")
+        fetching, released = threading.Event(), threading.Event()
+
+        def slow_fetch(url):
+            fetching.set()
+            released.wait(10)
+            return "Title", "", None, 0, 0
+
+        mocker.patch("vimania_uri.bms.handler.network_handler", side_effect=slow_fetch)
+        writer = TwbmWriter()
+        writer.submit("http://a.com")
+        assert fetching.wait(5)
+        writer.submit("http://b.com")
+        try:
+            assert writer.flush(timeout=5)
+            with pool.session() as bdb:
+                assert sorted(row[1] for row in bdb.get_rec_all()) == ["http://a.com", "http://b.com"]
+        finally:
+            released.set()
+        assert writer.join(timeout=5)
+
+    def test_fetch_updates_by_url(self, mocker, tmp_path):
+        mocker.patch("vimania_uri.environment.config.twbm_db_url", new=f"sqlite:///{tmp_path}/bm.db")
+        released = threading.Event()
+        mocker.patch(
+            "vimania_uri.bms.handler.network_handler",
+            side_effect=lambda url: released.wait(10) and (f"title of {url}", "", None, 0, 0),
+        )
+        with pool.session() as bdb:
+            bdb.add_rec("http://first.com", tags_in=",vimania,", fetch=False)
+            bdb.add_rec("http://last.com", tags_in=",other,", fetch=False)
+        writer = TwbmWriter()
+        writer.submit("http://goo.com")
+        writer._queue.join()  # persisted, fetch pending
+
+        # compaction moves http://goo.com (id 3) into the freed id 1
+        delete_twbms(["http://first.com"])
+        released.set()
+        assert writer.join(timeout=5)
+
+        with pool.session() as bdb:
+            rows = {row[1]: row[2] for row in bdb.get_rec_all()}
+        assert rows == {"http://last.com": "", "http://goo.com": "title of http://goo.com"}
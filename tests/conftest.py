@@ -1,6 +1,66 @@
+import collections
 import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
 
 _log = logging.getLogger(__name__)
 log_fmt = r"%(asctime)-15s %(levelname)s %(name)s %(funcName)s:%(lineno)d %(message)s"
 datefmt = "%Y-%m-%d %H:%M:%S"
 logging.basicConfig(format=log_fmt, level=logging.DEBUG, datefmt=datefmt)
+
+
+class TitleHandler(BaseHTTPRequestHandler):
+    """Serves `<title>{host} {path}</title>` with keep-alive, records concurrency"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        host = self.headers["Host"].split(":")[0]
+        etag = f'"{self.path}"'
+        with server.lock:
+            server.connections.add(self.client_address)
+            server.in_flight[host] += 1
+            server.max_in_flight[host] = max(server.max_in_flight[host], server.in_flight[host])
+            server.requests += 1
+        time.sleep(server.delay)
+        if self.headers["If-None-Match"] == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            with server.lock:
+                server.not_modified += 1
+        else:
+            body = f"<html><head><title>{host} {self.path}</title></head></html>".encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+        with server.lock:
+            server.in_flight[host] -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TitleHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = set()
+    server.in_flight = collections.Counter()
+    server.max_in_flight = collections.Counter()
+    server.requests = 0
+    server.delay = 0.01
+    server.not_modified = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
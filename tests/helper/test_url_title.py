@@ -0,0 +1,61 @@
+import socket
+import time
+
+import pytest
+import urllib3
+
+from vimania_uri.helper.url_title import TitleResolver
+
+
+@pytest.fixture
+def resolver():
+    resolver = TitleResolver(timeout=urllib3.Timeout(connect=0.5, read=0.2))
+    yield resolver
+    resolver.close()
+
+
+def wait_idle(resolver, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not resolver.idle and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert resolver.idle
+
+
+def test_resolve_from_memory(http_server, resolver):
+    url = f"http://127.0.0.1:{http_server.server_address[1]}/a"
+    assert resolver.resolve(url) == "127.0.0.1 /a"
+    assert resolver.resolve(url) == "127.0.0.1 /a"
+    assert http_server.requests == 1
+
+
+def test_memory_bounded(http_server, resolver):
+    resolver.maxsize = 2
+    urls = [f"http://127.0.0.1:{http_server.server_address[1]}/{i}" for i in range(3)]
+    for url in urls:
+        resolver.resolve(url)
+    assert resolver.cached(urls[0]) is None
+    assert resolver.cached(urls[2]) == "127.0.0.1 /2"
+
+
+def test_falls_back_to_url():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    url = f"http://127.0.0.1:{port}/closed"
+    assert TitleResolver().resolve(url) == url
+
+
+def test_read_timeout(http_server, resolver):
+    http_server.delay = 2
+    url = f"http://127.0.0.1:{http_server.server_address[1]}/slow"
+    start = time.monotonic()
+    assert resolver.resolve(url) == url
+    assert time.monotonic() - start < 1
+
+
+def test_resolve_async(http_server, resolver):
+    url = f"http://127.0.0.1:{http_server.server_address[1]}/a"
+    assert resolver.resolve_async(url, (1, 0)) is None
+    wait_idle(resolver)
+    assert list(resolver.results) == [((1, 0), url, "127.0.0.1 /a")]
+    assert resolver.resolve_async(url) == "127.0.0.1 /a"
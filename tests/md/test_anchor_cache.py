@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+from vimania_uri.md import anchor_cache
+from vimania_uri.md.anchor_cache import AnchorCache
+
+
+@pytest.fixture
+def notes(tmp_path):
+    root = tmp_path / "notes"
+    (root / "sub").mkdir(parents=True)
+    (root / "a.md").write_text("# Intro\ntext\n## Second Section\n")
+    (root / "sub" / "b.md").write_text("x\n### Foo Bar {: #custom-id } \n")
+    return root
+
+
+class TestAnchorCache:
+    def test_resolve(self, tmp_path, notes):
+        cache = AnchorCache(str(tmp_path / "cache" / "anchors.db"))
+        assert cache.resolve(notes / "a.md", "second-section") == 2
+        assert cache.resolve(notes / "a.md", "#Second Section") == 2
+        assert cache.resolve(notes / "sub" / "b.md", "custom-id") == 1
+        assert cache.resolve(notes / "a.md", "missing") is None
+        assert cache.resolve(notes / "missing.md", "intro") is None
+
+    def test_reparse_only_on_change(self, tmp_path, notes, mocker):
+        cache = AnchorCache(str(tmp_path / "anchors.db"))
+        spy = mocker.spy(anchor_cache, "read_lines")
+        assert cache.resolve(notes / "a.md", "intro") == 0
+        assert cache.resolve(notes / "a.md", "intro") == 0
+        assert spy.call_count == 1
+
+        (notes / "a.md").write_text("new first line\n# Intro\n")
+        st = (notes / "a.md").stat()
+        os.utime(notes / "a.md", ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+        assert cache.resolve(notes / "a.md", "intro") == 1
+        assert spy.call_count == 2
+
+    def test_persistent(self, tmp_path, notes, mocker):
+        dbfile = str(tmp_path / "anchors.db")
+        AnchorCache(dbfile).index_tree(notes)
+        spy = mocker.spy(anchor_cache, "read_lines")
+        assert AnchorCache(dbfile).resolve(notes / "sub" / "b.md", "foo-bar") == 1
+        spy.assert_not_called()
+
+    def test_index_tree_drops_removed_files(self, tmp_path, notes):
+        cache = AnchorCache(str(tmp_path / "anchors.db"))
+        assert cache.index_tree(notes) == 2
+        (notes / "a.md").unlink()
+        assert cache.index_tree(notes) == 1
+        assert cache.conn.execute("SELECT count(*) FROM anchor_tables").fetchone()[0] == 1
+
+
+def test_resolve_anchor_only_below_notes_root(tmp_path, notes, mocker):
+    mocker.patch("vimania_uri.environment.config.vimania_cache_dir", new=str(tmp_path / "cache"))
+    mocker.patch.object(anchor_cache, "_cache", new=None)
+
+    mocker.patch("vimania_uri.environment.config.vimania_notes_root", new=None)
+    assert anchor_cache.resolve_anchor(str(notes / "a.md"), "intro") is None
+
+    mocker.patch("vimania_uri.environment.config.vimania_notes_root", new=str(notes))
+    assert anchor_cache.resolve_anchor(str(notes / "a.md"), "intro") == 0
+    outside = tmp_path / "outside.md"
+    outside.write_text("# Intro\n")
+    assert anchor_cache.resolve_anchor(str(outside), "intro") is None
@@ -0,0 +1,111 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from typer.testing import CliRunner
+
+from vimania_uri.cli import app
+from vimania_uri.environment import config
+from vimania_uri.md import anchor_cache
+from vimania_uri.md.anchor_cache import AnchorCache
+from vimania_uri.md.link_checker import BrokenLink, check_links, urllib3_fetcher
+
+
+@pytest.fixture
+def notes(tmp_path):
+    root = tmp_path / "notes"
+    (root / "sub").mkdir(parents=True)
+    (root / "a.md").write_text(
+        "[ok](sub/b.md)\n"
+        "[missing](nope.md)\n"
+        "[anchor ok](sub/b.md#intro)\n"
+        "[anchor missing](sub/b.md#outro)\n"
+        "[self](#top)\n"
+        "https://example.com\n"
+    )
+    (root / "sub" / "b.md").write_text("# Intro\n[up](../a.md)\n")
+    return root
+
+
+@pytest.fixture
+def http_server():
+    class Handler(BaseHTTPRequestHandler):
+        def do_HEAD(self):
+            self.send_response(200 if self.path == "/ok" else 404)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_check_links_offline(notes):
+    broken = check_links(notes)
+    assert [(b.line, b.target, b.message) for b in broken] == [
+        (1, "nope.md", "file not found"),
+        (3, "sub/b.md#outro", "anchor #outro not found"),
+        (4, "#top", "anchor #top not found"),
+    ]
+    assert broken[0].quickfix() == f"{notes / 'a.md'}:2: nope.md: file not found"
+
+
+def test_check_links_non_markdown_anchors(tmp_path):
+    (tmp_path / "doc.pdf").write_bytes(b"%PDF-1.4 \x00\xff")
+    (tmp_path / "script.py").write_text("print()\n")
+    (tmp_path / "a.md").write_text("[pdf](doc.pdf#page=2) [py](script.py#L1) [gone](nope.pdf#page=1)\n")
+    cache = AnchorCache(str(tmp_path / "anchors.db"))
+
+    broken = check_links(tmp_path, anchor_cache=cache)
+    assert [(b.target, b.message) for b in broken] == [("nope.pdf#page=1", "file not found")]
+    assert cache.conn.execute("SELECT COUNT(*) FROM anchor_tables").fetchone()[0] == 0
+
+
+def test_check_links_anchor_cache(tmp_path, notes, mocker):
+    cache = AnchorCache(str(tmp_path / "anchors.db"))
+    spy = mocker.spy(anchor_cache, "read_lines")
+    broken = check_links(notes, anchor_cache=cache)
+    assert broken == check_links(notes)
+    assert spy.call_count == 2  # anchored targets a.md (#top) and sub/b.md
+
+    spy.reset_mock()
+    assert check_links(notes, anchor_cache=cache) == broken
+    assert spy.call_count == 0
+
+
+def test_check_links_http(tmp_path, http_server):
+    (tmp_path / "urls.md").write_text(f"[a]({http_server}/ok) and {http_server}/gone\n")
+    broken = check_links(tmp_path, fetcher=urllib3_fetcher(timeout=2))
+    assert broken == [BrokenLink(str(tmp_path / "urls.md"), 0, f"{http_server}/gone", "HTTP 404")]
+
+
+def test_check_links_pluggable_fetcher(notes):
+    fetched = []
+
+    def fetcher(url):
+        fetched.append(url)
+        return "down"
+
+    broken = check_links(notes, fetcher=fetcher)
+    assert fetched == ["https://example.com"]
+    assert broken[-1].message == "down"
+
+
+def test_cli(tmp_path, notes, monkeypatch):
+    monkeypatch.setattr(config, "vimania_cache_dir", str(tmp_path / "cache"))
+    monkeypatch.setattr(anchor_cache, "_cache", None)
+    runner = CliRunner()
+    result = runner.invoke(app, ["check-links", str(notes)])
+    assert result.exit_code == 1
+    assert result.output.splitlines()[0] == f"{notes / 'a.md'}:2: nope.md: file not found"
+
+    assert (tmp_path / "cache" / "anchors.db").exists()
+
+    result = runner.invoke(app, ["check-links", "--format", "json", str(notes / "sub")])
+    assert result.exit_code == 0
+    assert json.loads(result.output) == []
@@ -0,0 +1,86 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from vimania_uri.md import mdnav
+from vimania_uri.md.link_graph import Link, LinkGraph, extract_links, resolve_target
+
+
+@pytest.fixture
+def notes(tmp_path):
+    root = tmp_path / "notes"
+    (root / "sub").mkdir(parents=True)
+    (root / "a.md").write_text(
+        "see [b](sub/b.md#intro) and https://example.com\n"
+        "[ref]: ./c.md\n"
+        "[web](https://www.google.com)\n"
+    )
+    (root / "sub" / "b.md").write_text("# Intro\nback to [a](../a.md) or [self](#intro)\n")
+    (root / "c.md").write_text("[b again](sub/b.md)\n")
+    return root
+
+
+def test_extract_links(tmp_path):
+    src = tmp_path / "x.md"
+    lines = ["[a](a.md) https://example.com/x", "[r]: /abs/r.md", "[u](http://u.org)", "[t][r]"]
+    assert list(extract_links(src, lines)) == [
+        Link(str(src), 0, "a.md", str(tmp_path / "a.md")),
+        Link(str(src), 0, "https://example.com/x"),
+        Link(str(src), 1, "/abs/r.md", "/abs/r.md"),
+        Link(str(src), 2, "http://u.org"),
+    ]
+
+
+@pytest.mark.parametrize("target", ["b.md", "../a.md", "./c.md#intro", "b.md:3", "{filename}b.md"])
+def test_resolve_target_like_navigation(tmp_path, monkeypatch, target):
+    (tmp_path / "sub").mkdir()
+    src = tmp_path / "sub" / "x.md"
+    nav_target = target.replace("{filename}", "")  # stripped by open_uri
+
+    # navigation resolves against vim's cwd: same result from the linking file's directory
+    monkeypatch.chdir(src.parent)
+    assert resolve_target(src, target) == mdnav.parse_uri(nav_target).fullpath
+
+    # from anywhere else they diverge, the graph keeps resolving against the source
+    monkeypatch.chdir(tmp_path)
+    assert resolve_target(src, target) != mdnav.parse_uri(nav_target).fullpath
+    assert resolve_target(src, target) == mdnav.parse_uri(nav_target).resolve(src.parent)
+
+
+class TestLinkGraph:
+    def test_backlinks(self, tmp_path, notes):
+        graph = LinkGraph(str(tmp_path / "links.db"))
+        assert graph.update(notes) == 3
+
+        links = graph.backlinks(notes / "sub" / "b.md")
+        assert [(Path(link.source).name, link.line, link.anchor) for link in links] == [
+            ("a.md", 0, "intro"),
+            ("c.md", 0, None),
+            ("b.md", 1, "intro"),  # self reference via #intro
+        ]
+        assert [link.target for link in graph.backlinks(notes / "c.md")] == ["./c.md"]
+
+    def test_forward_links(self, tmp_path, notes):
+        graph = LinkGraph(str(tmp_path / "links.db"))
+        graph.update(notes)
+        assert [link.target for link in graph.forward_links(notes / "a.md")] == [
+            "sub/b.md#intro",
+            "https://example.com",
+            "./c.md",
+            "https://www.google.com",
+        ]
+
+    def test_incremental_update(self, tmp_path, notes):
+        graph = LinkGraph(str(tmp_path / "links.db"))
+        graph.update(notes)
+        assert graph.update(notes) == 0
+
+        (notes / "c.md").write_text("no links anymore\n")
+        st = (notes / "c.md").stat()
+        os.utime(notes / "c.md", ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+        (notes / "a.md").unlink()
+        assert graph.update(notes) == 1
+
+        assert [Path(link.source).name for link in graph.backlinks(notes / "sub" / "b.md")] == ["b.md"]
+        assert graph.conn.execute("SELECT count(*) FROM files").fetchone()[0] == 2
@@ -0,0 +1,61 @@
+import random
+
+import pytest
+
+from vimania_uri.md import mdnav
+from vimania_uri.md.link_index import LinkIndex
+
+
+class TestLinkIndex:
+    def test_resolve(self):
+        index = LinkIndex(["foo [bar][baz]", "[baz]: target.md ", "[bar]: other.md"])
+        assert index.resolve("baz") == "target.md"
+        assert index.resolve("bar") == "other.md"
+        assert index.resolve("xxx") is None
+
+    def test_first_definition_wins(self):
+        index = LinkIndex(["[a]: first.md", "[b]: b.md", "[a]: second.md"])
+        assert index.resolve("a") == "first.md"
+        index.update(0, 1, [])
+        assert index.resolve("a") == "second.md"
+
+    def test_update(self):
+        index = LinkIndex(["[a]: a.md", "text", "[b]: b.md"])
+        index.update(1, 2, ["[c]: c.md", "[d](d.md)"])  # replace one line by two
+        assert len(index) == 4
+        assert index.resolve("c") == "c.md"
+
+        index.update(0, 1, [])  # delete first line
+        assert index.resolve("a") is None
+        assert index.resolve("b") == "b.md"
+        assert len(index) == 3
+
+    def test_incremental_update_equals_rebuild(self):
+        rnd = random.Random(42)
+        pool = ["text", "[a]: a.md", "[b]: b.md", "x [t][a] y", "[t](direct.md)", ""]
+        lines = [rnd.choice(pool) for _ in range(50)]
+        index = LinkIndex(lines)
+        for _ in range(200):
+            start = rnd.randrange(len(lines) + 1)
+            end = rnd.randrange(start, min(len(lines), start + 3) + 1)
+            new = [rnd.choice(pool) for _ in range(rnd.randrange(3))]
+            lines[start:end] = new
+            index.update(start, end, new)
+
+        rebuilt = LinkIndex(lines)
+        assert len(index) == len(rebuilt)
+        for label in ("a", "b", "t"):
+            assert index.resolve(label) == rebuilt.resolve(label)
+
+
+@pytest.mark.parametrize(
+    "lines, cursor, expected",
+    (
+        (["foo [bar][bar]", "[bar]: baz.md"], (0, 6), "baz.md"),
+        (["foo [bar][]", "[bar]: baz.md"], (0, 6), "baz.md"),
+        (["foo [bar][nope]", "[bar]: baz.md"], (0, 6), None),
+    ),
+)
+def test_parse_line_with_index(lines, cursor, expected):
+    assert mdnav.parse_line(cursor, lines, index=LinkIndex(lines)) == expected
+    assert mdnav.parse_line(cursor, lines) == expected
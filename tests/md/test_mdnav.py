@@ -200,6 +200,30 @@ def test_jump_to_anchor(target, buffer, expected):
     assert actual == expected
 
 
+def test_anchor_table_prefix_lookup():
+    table = mdnav.AnchorTable(["# foo bar", "## foo", "# abc", "x {: #foo } ", "## foo baz"])
+    assert table.find("foo") == 0
+    assert table.find("foo-baz") == 4
+    assert table.find("ab") == 2
+    assert table.find("zzz") is None
+    assert table.find("") == 0
+
+
+def test_anchor_table_cached_per_changedtick(mocker):
+    buffer = mocker.MagicMock()
+    buffer.number = 4711
+    buffer.__iter__.return_value = iter(["# foo"])
+    spy = mocker.spy(mdnav, "AnchorTable")
+
+    table = mdnav.JumpToAnchor.anchor_table(buffer, changedtick=1)
+    assert mdnav.JumpToAnchor.anchor_table(buffer, changedtick=1) is table
+    assert spy.call_count == 1
+
+    buffer.__iter__.return_value = iter(["x", "# foo"])
+    assert mdnav.JumpToAnchor.anchor_table(buffer, changedtick=2).find("foo") == 1
+    assert spy.call_count == 2
+
+
 class TestParseUri:
     @pytest.mark.parametrize(
         "path, expected_path, expected_line, expected_anchor, expected_scheme, expected_fullpath",
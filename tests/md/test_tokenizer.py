@@ -0,0 +1,105 @@
+import random
+import timeit
+
+import pytest
+
+from vimania_uri.md import mdnav
+from vimania_uri.md.tokenizer import Token, TokenKind, tokenize
+from vimania_uri.pattern import LINK_PATTERN
+
+
+def probe_line(line, column):
+    """The former probe sequence of parse_line, without reference resolution"""
+    link_text, _ = mdnav.check_url(line, column)
+    if link_text is not None:
+        return "url", link_text.strip()
+    link_text, _ = mdnav.check_reference_link(line, column)
+    if link_text is not None:
+        return "ref", link_text.strip()
+    link_text, _ = mdnav.check_path(line, column)
+    if link_text is not None:
+        return "path", link_text
+    link_text, rel_column = mdnav.select_from_start_of_link(line, column)
+    if not link_text:
+        return None
+    m = LINK_PATTERN.match(link_text)
+    if not m or m.end("link") <= rel_column:
+        return None
+    return "link", m.group("text"), m.group("direct"), m.group("indirect")
+
+
+def token_line(line, column):
+    token = tokenize(line).at(column)
+    if token is None:
+        return None
+    if token.kind == TokenKind.URL:
+        return "url", token.text.strip()
+    if token.kind == TokenKind.REFERENCE_DEFINITION:
+        return "ref", token.text.strip()
+    if token.kind == TokenKind.PATH:
+        return "path", token.text
+    return "link", token.text, token.direct, token.indirect
+
+
+@pytest.mark.parametrize(
+    ("line", "column", "expected"),
+    (
+        ("see https://x.org/a b", 6, Token(4, 19, TokenKind.URL, "https://x.org/a")),
+        ("[ref]: target.md", 1, Token(0, 16, TokenKind.REFERENCE_DEFINITION, " target.md")),
+        ("a $HOME/dir b", 4, Token(2, 11, TokenKind.PATH, "$HOME/dir")),
+        ("x [a b](c) y", 4, Token(2, 10, TokenKind.LINK, "a b", direct="c")),
+        ("x [a][b] y", 6, Token(5, 8, TokenKind.LINK, "a", indirect="b")),
+        ("x [a](b) y", 8, None),
+        ("x\t[a](b)", 1, None),
+    ),
+)
+def test_tokenize_at(line, column, expected):
+    assert tokenize(line).at(column) == expected
+
+
+SNIPPETS = [
+    "foo",
+    "[bar](baz.md)",
+    "[bar][ref]",
+    "[bar][]",
+    "[ref]:",
+    "https://example.com/a?b=c",
+    "[x](https://example.com)",
+    "$HOME/dir",
+    "'quoted'",
+    "[",
+    "]",
+    "(",
+    ")",
+    "\t",
+    " ",
+    "*.md",
+]
+
+
+def test_tokenize_matches_probe_sequence():
+    rnd = random.Random(42)
+    for _ in range(500):
+        line = "".join(rnd.choice(SNIPPETS) for _ in range(rnd.randint(0, 8)))
+        for column in range(len(line) + 2):
+            assert token_line(line, column) == probe_line(line, column), (line, column)
+
+
+def test_parse_line_per_keystroke_cost():
+    """Cursor moves on one line: tokenized lookup beats the four regex probes"""
+    line = " ".join(
+        ["text [link](target.md) https://example.com/path [ref][label] $HOME/dir"] * 4
+    )
+    columns = range(len(line))
+
+    def probes():
+        for column in columns:
+            probe_line(line, column)
+
+    def tokens():
+        for column in columns:
+            token_line(line, column)
+
+    probe_time = min(timeit.repeat(probes, number=5, repeat=3))
+    token_time = min(timeit.repeat(tokens, number=5, repeat=3))
+    assert token_time < probe_time
@@ -73,6 +73,21 @@ class TestVimaniaUriManager:
         vm.get_url_title("https://www.google.com")
         assert "Google" in caplog.text
 
+    def test_poll_url_title(self, mocker, mock_vim):
+        import vimania_uri.vim_.vimania_manager as module_under_test
+
+        buffer = ["first", "see [https://x.org](https://x.org) here"]
+        mock_vim.buffers = {3: buffer}
+        mocker.patch.object(module_under_test.resolver, "_pending", 0)
+        results = module_under_test.resolver.results
+        results.append(((3, 0), "https://x.org", "X Org"))  # line moved down
+        results.append(((9, 0), "https://y.org", "Y Org"))  # buffer wiped
+
+        module_under_test.VimaniaUriManager.poll_url_title("7")
+        assert buffer[1] == "see [X Org](https://x.org) here"
+        assert not results
+        mock_vim.command.assert_called_with("call timer_stop(7)")
+
 
 @pytest.mark.parametrize(
     ("args", "path", "suffix"),